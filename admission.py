@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 回调请求的准入控制
+包在 Flask 的 WSGI 应用外层，只处理 /_dash-update-component 中开销大的事件和人物时间轴重绘：
+    1. 同时执行的重绘数有上限，其余按到达顺序排队；每个会话的重绘按令牌桶限速，桶空的会话在队列中让后面的请求先执行
+    2. 排队期间同一会话对同一时间轴发来了更新的请求时，旧请求直接返回 HTTP 204（Dash 当作不更新处理），
+       新请求接替旧请求在队列中的位置，连续平移不会一次次被排到队尾
+    3. 队列已满或等待超过 MAX_WAIT_SECONDS 时立即返回 HTTP 429（带 Retry-After），
+       assets/admission.js 在该时间轴没有更新的请求时按 Retry-After 重试，最后一次交互仍会显示；
+       被拒绝的会话时间轴按先后登记（不占线程），重试时先登记的先进入队列，持续过载时也不会有会话一直轮不到
+排队和执行中的重绘最多占用 MAX_IN_FLIGHT + MAX_QUEUED 个线程，Procfile 的线程数比它多出的部分留给
+可见范围、朝代时间轴和详情面板点击等不受限制的回调，时间轴积压时点击也不必等待线程。
+没有会话Cookie的请求不参与合并，也不限速，只受并发上限、队列长度和等待时间的约束。
+"""
+
+import io
+import json
+import time
+import itertools
+import threading
+from collections import Counter
+
+from werkzeug.http import parse_cookie
+from werkzeug.wsgi import ClosingIterator
+
+from coalesce import SESSION_COOKIE
+
+DASH_UPDATE_PATH = '/_dash-update-component'
+
+# 需要限流的回调输出：按筛选条件查询并构建图表的事件、人物时间轴；
+# 可见范围（驱动全部时间轴）和朝代时间轴开销很小，不限流
+THROTTLED_OUTPUTS = ('events-timeline.figure', 'figures-timeline.figure')
+
+# 同时执行的时间轴重绘数上限；重绘受 GIL 限制，多个同时计算只会互相拖慢
+MAX_IN_FLIGHT = 2
+
+# 排队等待的重绘数上限和最长等待时间（秒），超出时返回 429
+MAX_QUEUED = 16
+MAX_WAIT_SECONDS = 2.0
+
+# 429 响应建议的重试间隔（秒，Retry-After 只能是整数）
+RETRY_AFTER_SECONDS = 1
+
+# 被拒绝后登记的排队顺序保留的秒数（超过时客户端已不再重试）和登记数上限
+TICKET_SECONDS = RETRY_AFTER_SECONDS + 1
+MAX_TICKETS = 256
+
+# 每个会话时间轴重绘的令牌桶：每秒补充的令牌数和桶容量（一次平移会触发两个时间轴各一次请求）
+BUCKET_RATE = 6.0
+BUCKET_BURST = 12
+
+# 超过该时间（秒）未活动的会话令牌桶被清除
+BUCKET_IDLE_SECONDS = 60
+
+
+class TokenBuckets:
+    """按会话ID记录令牌数，取令牌时按经过的时间补充"""
+
+    def __init__(self, rate=BUCKET_RATE, burst=BUCKET_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._last_prune = time.monotonic()
+
+    def reserve(self, session_id):
+        """有令牌时取走一个并返回 0，否则返回还需等待的秒数（不取令牌）"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune > BUCKET_IDLE_SECONDS:
+                self._prune(now)
+            tokens, last = self._buckets.get(session_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                self._buckets[session_id] = (tokens - 1, now)
+                return 0
+            self._buckets[session_id] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        self._buckets = {key: value for key, value in self._buckets.items()
+                         if now - value[1] <= BUCKET_IDLE_SECONDS}
+        self._last_prune = now
+
+
+class _QueueEntry:
+    """队列中的一个位置；被更新的请求接替时 token 换成新请求的序号"""
+
+    __slots__ = ('token', 'session_id', 'admitted')
+
+    def __init__(self, token, session_id):
+        self.token = token
+        self.session_id = session_id
+        self.admitted = False
+
+
+class AdmissionMiddleware:
+    """Dash 回调请求的准入控制，stats 记录各类处理结果的次数"""
+
+    def __init__(self, app, max_in_flight=MAX_IN_FLIGHT, max_queued=MAX_QUEUED,
+                 max_wait=MAX_WAIT_SECONDS, buckets=None):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.buckets = buckets or TokenBuckets()
+        self._condition = threading.Condition()
+        # (回调输出, 会话ID) -> 队列位置，按到达顺序排列；没有会话的请求各占一个位置
+        self._queue = {}
+        # 被拒绝的 (回调输出, 会话ID) -> 登记的过期时刻，按被拒绝的先后排列
+        self._tickets = {}
+        self._tokens = itertools.count()
+        self._in_flight = 0
+        self.stats = Counter()
+
+    @staticmethod
+    def _throttled_output(body):
+        """需要限流的回调返回其输出（Dash 请求体中的 output 字段），其余返回 None"""
+        try:
+            output = json.loads(body).get('output', '')
+        except (ValueError, AttributeError):
+            return None
+        return output if any(name in output for name in THROTTLED_OUTPUTS) else None
+
+    def _dispatch(self):
+        """按到达顺序把空出的执行名额分给队列中有令牌的请求，返回最早需要重新检查令牌的秒数"""
+        retry = None
+        for key, entry in list(self._queue.items()):
+            if self._in_flight >= self.max_in_flight:
+                break
+            delay = self.buckets.reserve(entry.session_id) if entry.session_id else 0
+            if delay > 0:
+                retry = delay if retry is None else min(retry, delay)
+                continue
+            del self._queue[key]
+            entry.admitted = True
+            self._in_flight += 1
+            self._condition.notify_all()
+        return retry
+
+    def _reject(self, key, session_id, now):
+        """登记（或保留）被拒绝请求的排队顺序，返回 'overloaded'"""
+        if session_id and (key in self._tickets or len(self._tickets) < MAX_TICKETS):
+            self._tickets[key] = now + TICKET_SECONDS
+        return 'overloaded'
+
+    def _tickets_ahead(self, key, now):
+        """排在该请求之前、仍会重试的被拒绝请求数（先清除过期的登记）"""
+        if any(expiry <= now for expiry in self._tickets.values()):
+            self._tickets = {ticket: expiry for ticket, expiry in self._tickets.items() if expiry > now}
+        if key not in self._tickets:
+            return len(self._tickets)
+        return next(index for index, ticket in enumerate(self._tickets) if ticket == key)
+
+    def _admit(self, key, session_id):
+        """排队等待执行名额，返回 'admitted'、'superseded' 或 'overloaded'"""
+        with self._condition:
+            token = next(self._tokens)
+            now = time.monotonic()
+            entry = self._queue.get(key)
+            if entry is not None:
+                # 接替旧请求的位置，唤醒旧请求让其返回 204
+                entry.token = token
+                self._condition.notify_all()
+            elif len(self._queue) + self._tickets_ahead(key, now) >= self.max_queued:
+                return self._reject(key, session_id, now)
+            else:
+                self._tickets.pop(key, None)
+                entry = self._queue[key] = _QueueEntry(token, session_id)
+
+            deadline = now + self.max_wait
+            while True:
+                retry = self._dispatch()
+                if entry.admitted:
+                    return 'admitted'
+                if entry.token != token:
+                    return 'superseded'
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    del self._queue[key]
+                    return self._reject(key, session_id, now)
+                self._condition.wait(remaining if retry is None else min(remaining, retry))
+
+    def _release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != DASH_UPDATE_PATH or environ.get('REQUEST_METHOD') != 'POST':
+            return self.app(environ, start_response)
+
+        # 读出请求体判断类别，再放回去交给 Dash
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else b''
+        environ['wsgi.input'] = io.BytesIO(body)
+        output = self._throttled_output(body)
+        if output is None:
+            return self.app(environ, start_response)
+
+        session_id = parse_cookie(environ).get(SESSION_COOKIE)
+        key = (output, session_id) if session_id else object()
+        outcome = self._admit(key, session_id)
+        with self._condition:
+            self.stats[outcome] += 1
+
+        if outcome == 'superseded':
+            start_response('204 No Content', [])
+            return []
+        if outcome == 'overloaded':
+            # assets/admission.js 按 Retry-After 重试该时间轴的最新请求
+            start_response('429 Too Many Requests', [('Retry-After', str(RETRY_AFTER_SECONDS)),
+                                                     ('Content-Type', 'application/json')])
+            return [json.dumps({'error': '时间轴请求过多，请稍后重试'}, ensure_ascii=False).encode('utf-8')]
+
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._release()
+            raise
+        # 响应内容发送完毕后才释放名额
+        return ClosingIterator(response, [self._release])
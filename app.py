@@ -7,14 +7,27 @@
 """
 
 import os
-import json
+from urllib.parse import urlencode
 import dash
-from dash import dcc, html, Input, Output, State, callback, ctx
+from dash import dcc, html, Input, Output, State, ALL, callback, ctx, Patch
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.graph_objects as go
+from flask import Response, request, jsonify, send_from_directory
 import pandas as pd
 import numpy as np
 
+from storage import load_store
+from density import load_density
+from suggest import SuggestIndex
+from related import load_related
+from export import EXPORT_FORMATS, export_rows, format_available, iter_export
+from columnar import encode_tables
+from images import PREFETCH_IMPORTANCE_LEVELS, PREFETCH_LIMIT, image_attributes, load_image_manifest
+from coalesce import CallbackCoalescer, init_session_cookie
+from admission import AdmissionMiddleware
+from figure_builder import (colors, build_dynasty_figure, build_events_figure, build_figures_figure,
+                            with_xaxis_range, build_density_figure, selection_shape)
+
 # 初始化Dash应用
 app = dash.Dash(
     __name__,
@@ -24,31 +37,111 @@ app = dash.Dash(
 server = app.server
 app.title = '中国历史年表'
 
+# 同一会话的新请求到达后放弃旧的时间轴计算
+init_session_cookie(server)
+coalescer = CallbackCoalescer()
+
+# 回调请求的准入控制：限制同时执行的事件、人物时间轴重绘数并按会话限速，等待中被新请求取代的重绘直接跳过（TIMELINE_ADMISSION=0 关闭）
+if os.environ.get('TIMELINE_ADMISSION', '1') != '0':
+    admission = AdmissionMiddleware(server.wsgi_app)
+    server.wsgi_app = admission
+else:
+    admission = None
+
+# 搜索框停止输入多少毫秒后才触发时间轴更新
+SEARCH_DEBOUNCE_MS = 400
+
+# 密度缩略图每个柱子覆盖的年数
+DENSITY_BIN_YEARS = 25
+
 # 加载数据
 current_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(current_dir, 'data')
 
-# 读取处理后的时间轴数据
-with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
-    timeline_data = json.load(f)
+# 读取处理后的时间轴数据（数据后端由 TIMELINE_BACKEND 环境变量选择，默认 json）
+store = load_store(data_dir)
+
+# 按年份累计的条目数，拖动滑块时只用它计算范围内的条目数，不查询数据
+density = load_density(data_dir, store)
+
+# 预先计算的相关条目（详情面板使用）
+related = load_related(data_dir, store)
+
+# 搜索联想索引（拼音键由 process_data.py 生成，需要安装 pypinyin）
+suggestions = SuggestIndex.from_store(store, os.path.join(data_dir, 'search_keys.json'))
+
+# 搜索框中的完整拼音或首字母（如 qsh）换成对应的中文词再筛选时间轴，其余关键词原样做子串匹配
+def search_keyword(search_term):
+    return suggestions.resolve(search_term) if search_term else search_term
+
+# process_images.py 生成的缩略图清单（原图文件名 -> 各尺寸缩略图），未生成时为空
+image_manifest = load_image_manifest(data_dir)
+thumbs_dir = os.path.join(data_dir, 'thumbs')
+
+# 缩略图文件名包含内容哈希，内容变化时文件名随之变化，因此可以永久缓存
+@server.route('/images/<path:filename>')
+def serve_image(filename):
+    response = send_from_directory(thumbs_dir, filename, max_age=365 * 24 * 3600)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# 搜索联想接口：输入框每次按键由 assets/suggest.js 请求，不经过 Dash 回调
+@server.route('/api/suggest')
+def api_suggest():
+    response = jsonify(suggestions.suggest(request.args.get('q', '')))
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+# 接口的筛选参数：start、end、search、category、importance，与时间轴的筛选条件相同
+def filter_args():
+    """返回 (时间范围, 关键词, 分类, 最低重要性)，参数无效时抛出 ValueError"""
+    try:
+        year_range = [int(request.args['start']), int(request.args['end'])] if 'start' in request.args else None
+        min_importance = int(request.args['importance']) if request.args.get('importance') else None
+    except (KeyError, ValueError):
+        raise ValueError('时间范围或重要性参数无效') from None
+    if year_range and year_range[0] > year_range[1]:
+        raise ValueError('起始年份不能晚于结束年份')
+    return year_range, search_keyword(request.args.get('search')) or None, request.args.get('category'), min_importance
+
+# 导出接口：结果边查询边发送，不在内存中生成完整文件
+@server.route('/api/export')
+def api_export():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的导出格式: {export_format}'}), 400
+    if not format_available(export_format):
+        return jsonify({'error': '服务器未安装 xlsxwriter，无法导出 Excel'}), 501
+
+    try:
+        rows = export_rows(store, *filter_args())
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(iter_export(export_format, rows), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=timeline_export.{extension}'})
+
+# 列式二进制接口：筛选后的事件和人物按 columnar.py 的格式编码，静态版本用 ?api= 指定服务器时由 columnar.js 解码；
+# 静态页面可能部署在其他域名，因此允许跨域读取
+@server.route('/api/timeline.bin')
+def api_timeline_binary():
+    try:
+        year_range, search_term, event_category, min_importance = filter_args()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    payload = encode_tables({
+        'events': store.iter_events(year_range, search_term, event_category, min_importance),
+        'figures': store.iter_figures(year_range, search_term, min_importance)
+    })
+    return Response(payload, mimetype='application/octet-stream',
+                    headers={'Access-Control-Allow-Origin': '*'})
 
 # 提取数据
-dynasties = timeline_data['dynasties']
-events = timeline_data['events']
-figures = timeline_data['figures']
-time_range = timeline_data['time_range']
-
-# 定义颜色和样式
-colors = {
-    'background': '#111111',
-    'text': '#FFFFFF',
-    'primary': '#375A7F',
-    'secondary': '#444444',
-    'accent': '#00bc8c',
-    'danger': '#E74C3C'
-}
+dynasties = store.dynasties
+time_range = store.time_range
 
-# 自定义CSS样式
+# 自定义CSS样式（颜色定义见 figure_builder.py）
 styles = {
     'container': {
         'backgroundColor': colors['background'],
@@ -119,266 +212,74 @@ styles = {
     }
 }
 
+# 朝代数据不随筛选条件变化，图表只构建一次
+dynasty_figure = build_dynasty_figure(dynasties, [time_range['min_year'], time_range['max_year']])
+
 # 创建朝代时间轴数据
-def create_dynasty_timeline():
+def create_dynasty_timeline(xaxis_range=None):
     """创建朝代时间轴图表"""
-    fig = go.Figure()
-    
-    # 添加朝代条带
-    for dynasty in dynasties:
-        fig.add_trace(go.Scatter(
-            x=[dynasty['start_year'], dynasty['end_year'], dynasty['end_year'], dynasty['start_year'], dynasty['start_year']],
-            y=[0, 0, 1, 1, 0],
-            fill="toself",
-            fillcolor=dynasty['color'],
-            line=dict(width=0),
-            name=dynasty['id'],
-            text=f"{dynasty['id']} ({dynasty['start_year']}年 - {dynasty['end_year']}年)",
-            hoverinfo="text",
-            hoverlabel=dict(
-                bgcolor=dynasty['color'],
-                font_size=16,
-                font_family='"ZCOOL XiaoWei", serif'
-            ),
-            showlegend=False
-        ))
-    
-    # 添加朝代标签
-    for dynasty in dynasties:
-        # 计算朝代中间位置
-        mid_year = (dynasty['start_year'] + dynasty['end_year']) / 2
-        
-        # 只为持续时间较长的朝代添加标签
-        if dynasty['duration'] > 50:
-            fig.add_annotation(
-                x=mid_year,
-                y=0.5,
-                text=dynasty['id'],
-                showarrow=False,
-                font=dict(
-                    family='"ZCOOL XiaoWei", serif',
-                    size=14,
-                    color='black'
-                ),
-                align="center",
-                bgcolor="rgba(255, 255, 255, 0.7)",
-                bordercolor="black",
-                borderwidth=1,
-                borderpad=4,
-                opacity=0.8
-            )
-    
-    # 设置布局
-    fig.update_layout(
-        plot_bgcolor=colors['background'],
-        paper_bgcolor=colors['background'],
-        font=dict(
-            family='"ZCOOL XiaoWei", serif',
-            size=14,
-            color=colors['text']
-        ),
-        margin=dict(l=20, r=20, t=0, b=20),
-        xaxis=dict(
-            title="年份",
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
-            zeroline=False,
-            showline=True,
-            linecolor='rgba(255, 255, 255, 0.5)',
-            tickfont=dict(size=12),
-            tickformat=".0f",  # 显示整数年份
-            range=[time_range['min_year'], time_range['max_year']]
-        ),
-        yaxis=dict(
-            showticklabels=False,
-            showgrid=False,
-            zeroline=False,
-            range=[-0.1, 1.1]
-        ),
-        hovermode="closest",
-        dragmode="pan",
-        height=250
-    )
-    
-    # 添加年份标记线
-    for year in range(time_range['min_year'], time_range['max_year'] + 1, 100):
-        if year == 0:
-            # 公元元年特殊标记
-            fig.add_shape(
-                type="line",
-                x0=year,
-                y0=0,
-                x1=year,
-                y1=1,
-                line=dict(
-                    color="red",
-                    width=2,
-                    dash="dash",
-                ),
-            )
-        else:
-            # 每100年添加一条垂直标记线
-            fig.add_shape(
-                type="line",
-                x0=year,
-                y0=0,
-                x1=year,
-                y1=1,
-                line=dict(
-                    color="rgba(255, 255, 255, 0.2)",
-                    width=1,
-                ),
-            )
-    
-    return fig
+    if xaxis_range is None:
+        return dynasty_figure
+    return with_xaxis_range(dynasty_figure, xaxis_range)
 
 # 创建事件时间轴数据
-def create_events_timeline():
+def create_events_timeline(filtered_events=None, xaxis_range=None):
     """创建历史事件时间轴图表"""
-    fig = go.Figure()
-    
-    # 按重要性排序事件
-    sorted_events = sorted(events, key=lambda x: x['importance'], reverse=True)
-    
-    # 添加事件标记
-    for event in sorted_events:
-        size = event['importance'] * 8  # 根据重要性调整大小
-        fig.add_trace(go.Scatter(
-            x=[event['year']],
-            y=[0.5],
-            mode='markers',
-            marker=dict(
-                size=size,
-                color=colors['danger'],
-                line=dict(width=2, color='white'),
-                symbol='diamond',
-                opacity=0.8
-            ),
-            name=event['title'],
-            text=f"{event['title']} ({event['year']}年)<br>{event['description']}",
-            hoverinfo="text",
-            hoverlabel=dict(
-                bgcolor=colors['secondary'],
-                font_size=14,
-                font_family='"ZCOOL XiaoWei", serif'
-            ),
-            customdata=[event['id']],  # 存储事件ID用于回调
-            showlegend=False
-        ))
-    
-    # 设置布局
-    fig.update_layout(
-        plot_bgcolor=colors['background'],
-        paper_bgcolor=colors['background'],
-        font=dict(
-            family='"ZCOOL XiaoWei", serif',
-            size=14,
-            color=colors['text']
-        ),
-        margin=dict(l=20, r=20, t=0, b=20),
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
-            zeroline=False,
-            showline=True,
-            linecolor='rgba(255, 255, 255, 0.5)',
-            tickfont=dict(size=12),
-            tickformat=".0f",  # 显示整数年份
-            range=[time_range['min_year'], time_range['max_year']]
-        ),
-        yaxis=dict(
-            showticklabels=False,
-            showgrid=False,
-            zeroline=False,
-            range=[-0.1, 1.1]
-        ),
-        hovermode="closest",
-        height=150
-    )
+    if filtered_events is None:
+        filtered_events = store.query_events()
+    if xaxis_range is None:
+        xaxis_range = [time_range['min_year'], time_range['max_year']]
     
-    return fig
+    return build_events_figure(filtered_events, xaxis_range)
 
 # 创建人物时间轴数据
-def create_figures_timeline():
+def create_figures_timeline(filtered_figures=None, xaxis_range=None):
     """创建历史人物时间轴图表"""
-    fig = go.Figure()
-    
-    # 按重要性排序人物
-    sorted_figures = sorted(figures, key=lambda x: x['importance'], reverse=True)
-    
-    # 添加人物生命线
-    for i, figure in enumerate(sorted_figures):
-        # 计算y位置，使人物分布在不同高度
-        y_pos = 0.2 + (i % 3) * 0.3  # 分成3层显示
-        
-        # 添加人物生命线
-        fig.add_trace(go.Scatter(
-            x=[figure['birth_year'], figure['death_year']],
-            y=[y_pos, y_pos],
-            mode='lines',
-            line=dict(
-                color=colors['primary'],
-                width=figure['importance'] * 1.5,  # 根据重要性调整宽度
-                dash='solid'
-            ),
-            name=figure['name'],
-            text=f"{figure['name']} ({figure['birth_year']}年 - {figure['death_year']}年)<br>{figure['description']}",
-            hoverinfo="text",
-            hoverlabel=dict(
-                bgcolor=colors['secondary'],
-                font_size=14,
-                font_family='"ZCOOL XiaoWei", serif'
-            ),
-            customdata=[figure['id']],  # 存储人物ID用于回调
-            showlegend=False
-        ))
-        
-        # 添加人物标记点
-        fig.add_trace(go.Scatter(
-            x=[figure['birth_year']],
-            y=[y_pos],
-            mode='markers',
-            marker=dict(
-                size=figure['importance'] * 4,
-                color=colors['primary'],
-                line=dict(width=1, color='white'),
-                symbol='circle'
-            ),
-            showlegend=False,
-            hoverinfo="skip"
-        ))
-    
-    # 设置布局
-    fig.update_layout(
-        plot_bgcolor=colors['background'],
-        paper_bgcolor=colors['background'],
-        font=dict(
-            family='"ZCOOL XiaoWei", serif',
-            size=14,
-            color=colors['text']
-        ),
-        margin=dict(l=20, r=20, t=0, b=20),
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
-            zeroline=False,
-            showline=True,
-            linecolor='rgba(255, 255, 255, 0.5)',
-            tickfont=dict(size=12),
-            tickformat=".0f",  # 显示整数年份
-            range=[time_range['min_year'], time_range['max_year']]
-        ),
-        yaxis=dict(
-            showticklabels=False,
-            showgrid=False,
-            zeroline=False,
-            range=[-0.1, 1.1]
-        ),
-        hovermode="closest",
-        height=200
-    )
+    if filtered_figures is None:
+        filtered_figures = store.query_figures()
+    if xaxis_range is None:
+        xaxis_range = [time_range['min_year'], time_range['max_year']]
     
-    return fig
+    return build_figures_figure(filtered_figures, xaxis_range)
+
+# 创建时间范围密度缩略图
+def create_density_minimap(selected_range, event_category=None, min_importance=None):
+    """创建时间范围滑块上方的条目密度缩略图"""
+    bin_starts, event_counts, figure_counts = density.histogram(DENSITY_BIN_YEARS, event_category, min_importance)
+    return build_density_figure(bin_starts, DENSITY_BIN_YEARS, event_counts, figure_counts, selected_range)
+
+def format_range_count(selected_range, event_category, min_importance, search_term):
+    """选中范围内的事件和人物数量"""
+    text = (f"{selected_range[0]}年 至 {selected_range[1]}年：事件 "
+            f"{density.count_events(selected_range, event_category, min_importance)} 条，人物 "
+            f"{density.count_figures(selected_range, min_importance)} 位")
+    # 关键词匹配无法预先累计，计数只反映分类和重要性条件
+    return text + '（未计入搜索关键词）' if search_term else text
+
+# 详情面板中按年份换算的所属朝代
+def reign_names(item):
+    """朝代编号转换为朝代名称"""
+    return '、'.join(dynasties[i]['id'] for i in item.get('dynasty_ids') or ())
+
+# 导出链接：参数与时间轴当前的筛选条件一致
+EXPORT_LINKS = [('csv', 'CSV'), ('ndjson', 'NDJSON'), ('xlsx', 'Excel')]
+
+def export_href(export_format, xaxis_range, search_term, event_category, min_importance):
+    params = {'format': export_format, 'start': int(xaxis_range[0]), 'end': int(xaxis_range[1]),
+              'category': event_category or 'all', 'importance': min_importance or 1}
+    if search_term:
+        params['search'] = search_term
+    return '/api/export?' + urlencode(params)
+
+# 各时间轴只依赖自己的输入，渲染时记录这些输入，输入未变化时跳过重算
+def layer_state(layer, xaxis_range, *filters):
+    """时间轴渲染所依据的条件"""
+    return [layer, list(xaxis_range), *[value or None for value in filters]]
+
+def check_layer(layer, display_options, rendered_state, state):
+    """隐藏的时间轴推迟到重新显示时再计算，条件未变化的时间轴不重算"""
+    if layer not in (display_options or []) or rendered_state == state:
+        raise PreventUpdate
 
 # 应用布局
 app.layout = html.Div(style=styles['container'], children=[
@@ -395,11 +296,16 @@ app.layout = html.Div(style=styles['container'], children=[
             # 搜索功能
             dbc.Col([
                 html.Label('搜索'),
-                dbc.InputGroup([
-                    dbc.Input(id='search-input', placeholder='输入关键词搜索朝代、事件或人物', type='text'),
-                    dbc.InputGroupText(
-                        html.I(className="fas fa-search")
-                    ),
+                html.Div(style={'position': 'relative'}, children=[
+                    dbc.InputGroup([
+                        dbc.Input(id='search-input', placeholder='输入关键词或拼音搜索朝代、事件或人物', type='text',
+                                  debounce=SEARCH_DEBOUNCE_MS, autoComplete='off'),
+                        dbc.InputGroupText(
+                            html.I(className="fas fa-search")
+                        ),
+                    ]),
+                    # 联想列表由 assets/suggest.js 填充
+                    html.Ul(id='search-suggestions', className='search-suggestions')
                 ])
             ], width=6),
             
@@ -443,13 +349,21 @@ app.layout = html.Div(style=styles['container'], children=[
         dbc.Row([
             dbc.Col([
                 html.Label('时间范围'),
+                html.Span(id='range-count', style={'marginLeft': '10px', 'fontSize': '0.9rem'},
+                          children=format_range_count([time_range['min_year'], time_range['max_year']], 'all', 1, None)),
+                dcc.Graph(
+                    id='density-minimap',
+                    figure=create_density_minimap([time_range['min_year'], time_range['max_year']], 'all', 1),
+                    config={'displayModeBar': False, 'staticPlot': True}
+                ),
                 dcc.RangeSlider(
                     id='time-range-slider',
                     min=time_range['min_year'],
                     max=time_range['max_year'],
                     value=[time_range['min_year'], time_range['max_year']],
                     marks={year: str(year) for year in range(time_range['min_year'], time_range['max_year'] + 1, 500)},
-                    step=10
+                    step=10,
+                    updatemode='mouseup'  # 拖动结束后才触发时间轴更新
                 )
             ], width=8),
             dbc.Col([
@@ -464,7 +378,14 @@ app.layout = html.Div(style=styles['container'], children=[
                     value=['dynasties', 'events', 'figures'],
                     inline=True,
                     switch=True
-                )
+                ),
+                html.Div(className='mt-2', children=[
+                    html.Label('导出当前结果'),
+                    *[html.A(label, id=f'export-{export_format}', className='ms-2',
+                             href=export_href(export_format, [time_range['min_year'], time_range['max_year']],
+                                              None, 'all', 1))
+                      for export_format, label in EXPORT_LINKS if format_available(export_format)]
+                ])
             ], width=4)
         ])
     ]),
@@ -508,228 +429,195 @@ app.layout = html.Div(style=styles['container'], children=[
     # 存储当前选中项的隐藏元素
     dcc.Store(id='selected-item-store'),
     
+    # 可见范围内最可能被点击的条目图片，由 assets/images.js 在空闲时预取
+    html.Div(id='image-prefetch', hidden=True),
+    
+    # 当前可见的时间范围，以及各时间轴最近一次渲染时所依据的条件
+    dcc.Store(id='view-range-store', data=[time_range['min_year'], time_range['max_year']]),
+    dcc.Store(id='dynasty-timeline-state', data=layer_state('dynasties', [time_range['min_year'], time_range['max_year']])),
+    dcc.Store(id='events-timeline-state', data=layer_state('events', [time_range['min_year'], time_range['max_year']], None, 'all', 1)),
+    dcc.Store(id='figures-timeline-state', data=layer_state('figures', [time_range['min_year'], time_range['max_year']], None, 1)),
+    
     # 页脚
     html.Footer(style=styles['footer'], children=[
         html.P('中国历史年表 © 2025')
     ])
 ])
 
-# 回调函数：更新时间轴
+# 回调函数：根据滑块和时间轴缩放确定可见时间范围，实现各时间轴联动
 @app.callback(
-    [Output('dynasty-timeline', 'figure'),
-     Output('events-timeline', 'figure'),
-     Output('figures-timeline', 'figure')],
+    Output('view-range-store', 'data'),
     [Input('time-range-slider', 'value'),
-     Input('search-input', 'value'),
-     Input('event-category-filter', 'value'),
-     Input('importance-filter', 'value'),
      Input('dynasty-timeline', 'relayoutData'),
      Input('events-timeline', 'relayoutData'),
-     Input('figures-timeline', 'relayoutData')]
+     Input('figures-timeline', 'relayoutData')],
+    [State('view-range-store', 'data')]
 )
-def update_timelines(time_range_value, search_term, event_category, min_importance, 
-                     dynasty_relayout, events_relayout, figures_relayout):
+def update_view_range(time_range_value, dynasty_relayout, events_relayout, figures_relayout, current_range):
     # 确定触发回调的组件
     trigger_id = ctx.triggered_id
+    xaxis_range = time_range_value
     
-    # 如果是通过时间轴缩放触发的回调，实现联动
-    xaxis_range = None
+    # 如果是通过时间轴缩放触发的回调，使用该时间轴的缩放范围
     if trigger_id in ['dynasty-timeline', 'events-timeline', 'figures-timeline']:
-        # 获取触发时间轴的缩放范围
         relayout_data = dynasty_relayout if trigger_id == 'dynasty-timeline' else \
                         events_relayout if trigger_id == 'events-timeline' else figures_relayout
         
         if relayout_data and 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
             xaxis_range = [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+        elif not (relayout_data and 'xaxis.autorange' in relayout_data):
+            # 重新显示时的 autosize 等与横轴无关的变化，保持当前范围
+            raise PreventUpdate
     
-    # 如果没有通过时间轴缩放触发，使用滑块范围
-    if xaxis_range is None:
-        xaxis_range = time_range_value
-    
-    # 过滤搜索条件
-    filtered_events = events
-    filtered_figures = figures
+    if xaxis_range == current_range:
+        raise PreventUpdate
     
-    # 根据搜索关键词过滤
-    if search_term:
-        search_term = search_term.lower()
-        # 过滤事件
-        filtered_events = [event for event in events if 
-                          search_term in event['title'].lower() or 
-                          search_term in event['description'].lower() or
-                          search_term in event['dynasty'].lower()]
+    return xaxis_range
+
+# 回调函数：导出链接跟随当前可见范围和筛选条件
+@app.callback(
+    [Output(f'export-{export_format}', 'href')
+     for export_format, _ in EXPORT_LINKS if format_available(export_format)],
+    [Input('view-range-store', 'data'),
+     Input('search-input', 'value'),
+     Input('event-category-filter', 'value'),
+     Input('importance-filter', 'value')],
+    prevent_initial_call=True
+)
+def update_export_links(xaxis_range, search_term, event_category, min_importance):
+    return [export_href(export_format, xaxis_range, search_term, event_category, min_importance)
+            for export_format, _ in EXPORT_LINKS if format_available(export_format)]
+
+# 回调函数：可见范围或筛选条件变化后，预取范围内重要性最高的若干条目的图片
+def update_image_prefetch(xaxis_range, search_term, event_category, min_importance, display_options):
+    # 按重要性从高到低逐级读取（数据后端逐条返回），凑满 PREFETCH_LIMIT 张即停止；
+    # 最坏情况下（范围内高重要性条目大多没有图片）仍要读完该等级在范围内的全部条目
+    search_term = search_keyword(search_term)
+    image_urls = []
+    for level in PREFETCH_IMPORTANCE_LEVELS:
+        if min_importance and level < min_importance:
+            break
+        sources = []
+        if 'events' in display_options:
+            sources.append(store.iter_events(xaxis_range, search_term, event_category, level))
+        if 'figures' in display_options:
+            sources.append(store.iter_figures(xaxis_range, search_term, level))
         
-        # 过滤人物
-        filtered_figures = [figure for figure in figures if 
-                           search_term in figure['name'].lower() or 
-                           search_term in figure['description'].lower() or
-                           search_term in figure['dynasty'].lower()]
-    
-    # 根据事件分类过滤
-    if event_category and event_category != 'all':
-        filtered_events = [event for event in filtered_events if event['category'] == event_category]
-    
-    # 根据重要性过滤
-    if min_importance:
-        filtered_events = [event for event in filtered_events if event['importance'] >= min_importance]
-        filtered_figures = [figure for figure in filtered_figures if figure['importance'] >= min_importance]
-    
-    # 更新朝代时间轴
-    dynasty_fig = create_dynasty_timeline()
-    dynasty_fig.update_layout(xaxis=dict(range=xaxis_range))
-    
-    # 创建并更新过滤后的事件时间轴
-    events_fig = go.Figure()
-    
-    # 按重要性排序事件
-    sorted_events = sorted(filtered_events, key=lambda x: x['importance'], reverse=True)
+        for records in sources:
+            for item in records:
+                # 更高等级的条目已在上一轮处理；同一张图片只预取一次
+                if item['importance'] != level or item['image_url'] not in image_manifest \
+                        or item['image_url'] in image_urls:
+                    continue
+                image_urls.append(item['image_url'])
+                if len(image_urls) >= PREFETCH_LIMIT:
+                    return [html.Span(**image_attributes(image_manifest[url])) for url in image_urls]
+    
+    return [html.Span(**image_attributes(image_manifest[url])) for url in image_urls]
+
+# 没有缩略图清单时不注册，视图变化时不多一次空的回调请求
+if image_manifest:
+    app.callback(
+        Output('image-prefetch', 'children'),
+        [Input('view-range-store', 'data'),
+         Input('search-input', 'value'),
+         Input('event-category-filter', 'value'),
+         Input('importance-filter', 'value'),
+         Input('display-options', 'value')]
+    )(update_image_prefetch)
+
+# 回调函数：拖动滑块时实时更新条目数（只查前缀和，不重算时间轴）
+@app.callback(
+    Output('range-count', 'children'),
+    [Input('time-range-slider', 'drag_value'),
+     Input('event-category-filter', 'value'),
+     Input('importance-filter', 'value'),
+     Input('search-input', 'value')],
+    [State('time-range-slider', 'value')],
+    prevent_initial_call=True
+)
+def update_range_count(drag_value, event_category, min_importance, search_term, time_range_value):
+    return format_range_count(drag_value or time_range_value, event_category, min_importance, search_term)
+
+# 回调函数：更新密度缩略图，拖动滑块时只移动选中范围的矩形
+@app.callback(
+    Output('density-minimap', 'figure'),
+    [Input('time-range-slider', 'drag_value'),
+     Input('event-category-filter', 'value'),
+     Input('importance-filter', 'value')],
+    [State('time-range-slider', 'value')],
+    prevent_initial_call=True
+)
+def update_density_minimap(drag_value, event_category, min_importance, time_range_value):
+    selected_range = drag_value or time_range_value
+    if ctx.triggered_id == 'time-range-slider':
+        minimap = Patch()
+        minimap['layout']['shapes'][0] = selection_shape(selected_range)
+        return minimap
+    
+    return create_density_minimap(selected_range, event_category, min_importance)
+
+# 回调函数：更新朝代时间轴（只依赖可见时间范围）
+@app.callback(
+    [Output('dynasty-timeline', 'figure'),
+     Output('dynasty-timeline-state', 'data')],
+    [Input('view-range-store', 'data'),
+     Input('display-options', 'value')],
+    [State('dynasty-timeline-state', 'data')]
+)
+def update_dynasty_timeline(xaxis_range, display_options, rendered_state):
+    state = layer_state('dynasties', xaxis_range)
+    check_layer('dynasties', display_options, rendered_state, state)
     
-    # 添加事件标记
-    for event in sorted_events:
-        size = event['importance'] * 8  # 根据重要性调整大小
-        # 根据分类设置颜色
-        category_colors = {
-            '政治': '#FF5733',  # 红色
-            '军事': '#C70039',  # 深红色
-            '文化': '#FFC300',  # 黄色
-            '经济': '#DAF7A6',  # 浅绿色
-            '科技': '#3498DB',  # 蓝色
-            '其他': '#9B59B6'   # 紫色
-        }
-        color = category_colors.get(event['category'], colors['danger'])
+    return create_dynasty_timeline(xaxis_range), state
+
+# 回调函数：更新事件时间轴
+@app.callback(
+    [Output('events-timeline', 'figure'),
+     Output('events-timeline-state', 'data')],
+    [Input('view-range-store', 'data'),
+     Input('search-input', 'value'),
+     Input('event-category-filter', 'value'),
+     Input('importance-filter', 'value'),
+     Input('display-options', 'value')],
+    [State('events-timeline-state', 'data')]
+)
+def update_events_timeline(xaxis_range, search_term, event_category, min_importance, display_options,
+                           rendered_state):
+    state = layer_state('events', xaxis_range, search_term, event_category, min_importance)
+    check_layer('events', display_options, rendered_state, state)
+    with coalescer.track('update_events_timeline') as token:
+        # 按可见时间范围、搜索关键词（拼音先换成中文词）、事件分类和重要性过滤
+        filtered_events = store.query_events(xaxis_range, search_keyword(search_term), event_category, min_importance)
+        coalescer.check(token)
         
-        events_fig.add_trace(go.Scatter(
-            x=[event['year']],
-            y=[0.5],
-            mode='markers',
-            marker=dict(
-                size=size,
-                color=color,
-                line=dict(width=2, color='white'),
-                symbol='diamond',
-                opacity=0.8
-            ),
-            name=event['title'],
-            text=f"{event['title']} ({event['year']}年)<br>{event['description']}<br>分类: {event['category']}",
-            hoverinfo="text",
-            hoverlabel=dict(
-                bgcolor=colors['secondary'],
-                font_size=14,
-                font_family='"ZCOOL XiaoWei", serif'
-            ),
-            customdata=[event['id']],  # 存储事件ID用于回调
-            showlegend=False
-        ))
+        events_fig = create_events_timeline(filtered_events, xaxis_range)
+        coalescer.check(token)
     
-    # 设置事件时间轴布局
-    events_fig.update_layout(
-        plot_bgcolor=colors['background'],
-        paper_bgcolor=colors['background'],
-        font=dict(
-            family='"ZCOOL XiaoWei", serif',
-            size=14,
-            color=colors['text']
-        ),
-        margin=dict(l=20, r=20, t=0, b=20),
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
-            zeroline=False,
-            showline=True,
-            linecolor='rgba(255, 255, 255, 0.5)',
-            tickfont=dict(size=12),
-            tickformat=".0f",  # 显示整数年份
-            range=xaxis_range
-        ),
-        yaxis=dict(
-            showticklabels=False,
-            showgrid=False,
-            zeroline=False,
-            range=[-0.1, 1.1]
-        ),
-        hovermode="closest",
-        height=150
-    )
-    
-    # 创建并更新过滤后的人物时间轴
-    figures_fig = go.Figure()
-    
-    # 按重要性排序人物
-    sorted_figures = sorted(filtered_figures, key=lambda x: x['importance'], reverse=True)
-    
-    # 添加人物生命线
-    for i, figure in enumerate(sorted_figures):
-        # 计算y位置，使人物分布在不同高度
-        y_pos = 0.2 + (i % 3) * 0.3  # 分成3层显示
-        
-        # 添加人物生命线
-        figures_fig.add_trace(go.Scatter(
-            x=[figure['birth_year'], figure['death_year']],
-            y=[y_pos, y_pos],
-            mode='lines',
-            line=dict(
-                color=colors['primary'],
-                width=figure['importance'] * 1.5,  # 根据重要性调整宽度
-                dash='solid'
-            ),
-            name=figure['name'],
-            text=f"{figure['name']} ({figure['birth_year']}年 - {figure['death_year']}年)<br>{figure['description']}",
-            hoverinfo="text",
-            hoverlabel=dict(
-                bgcolor=colors['secondary'],
-                font_size=14,
-                font_family='"ZCOOL XiaoWei", serif'
-            ),
-            customdata=[figure['id']],  # 存储人物ID用于回调
-            showlegend=False
-        ))
+    return events_fig, state
+
+# 回调函数：更新人物时间轴（不受事件分类影响）
+@app.callback(
+    [Output('figures-timeline', 'figure'),
+     Output('figures-timeline-state', 'data')],
+    [Input('view-range-store', 'data'),
+     Input('search-input', 'value'),
+     Input('importance-filter', 'value'),
+     Input('display-options', 'value')],
+    [State('figures-timeline-state', 'data')]
+)
+def update_figures_timeline(xaxis_range, search_term, min_importance, display_options, rendered_state):
+    state = layer_state('figures', xaxis_range, search_term, min_importance)
+    check_layer('figures', display_options, rendered_state, state)
+    with coalescer.track('update_figures_timeline') as token:
+        # 按可见时间范围、搜索关键词和重要性过滤
+        filtered_figures = store.query_figures(xaxis_range, search_keyword(search_term), min_importance)
+        coalescer.check(token)
         
-        # 添加人物标记点
-        figures_fig.add_trace(go.Scatter(
-            x=[figure['birth_year']],
-            y=[y_pos],
-            mode='markers',
-            marker=dict(
-                size=figure['importance'] * 4,
-                color=colors['primary'],
-                line=dict(width=1, color='white'),
-                symbol='circle'
-            ),
-            showlegend=False,
-            hoverinfo="skip"
-        ))
-    
-    # 设置人物时间轴布局
-    figures_fig.update_layout(
-        plot_bgcolor=colors['background'],
-        paper_bgcolor=colors['background'],
-        font=dict(
-            family='"ZCOOL XiaoWei", serif',
-            size=14,
-            color=colors['text']
-        ),
-        margin=dict(l=20, r=20, t=0, b=20),
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255, 255, 255, 0.1)',
-            zeroline=False,
-            showline=True,
-            linecolor='rgba(255, 255, 255, 0.5)',
-            tickfont=dict(size=12),
-            tickformat=".0f",  # 显示整数年份
-            range=xaxis_range
-        ),
-        yaxis=dict(
-            showticklabels=False,
-            showgrid=False,
-            zeroline=False,
-            range=[-0.1, 1.1]
-        ),
-        hovermode="closest",
-        height=200
-    )
+        figures_fig = create_figures_timeline(filtered_figures, xaxis_range)
+        coalescer.check(token)
     
-    return dynasty_fig, events_fig, figures_fig
+    return figures_fig, state
 
 # 回调函数：显示/隐藏时间轴组件
 @app.callback(
@@ -746,15 +634,84 @@ def toggle_timeline_display(display_options):
     
     return dynasty_style, events_style, figures_style
 
-# 回调函数：点击事件或人物时更新详情面板
+# 创建相关条目列表
+def create_related_list(record_id):
+    """详情面板底部的相关条目，点击后切换到该条目"""
+    items = []
+    for related_id, _ in related.related(record_id):
+        if related_id.startswith('event_'):
+            record = store.get_event(related_id)
+            label = f"{record['title']} ({record['year']}年)" if record else None
+        else:
+            record = store.get_figure(related_id)
+            label = f"{record['name']} ({record['birth_year']}-{record['death_year']})" if record else None
+        
+        if label:
+            items.append(html.Li(html.Button(
+                label,
+                id={'type': 'related-item', 'id': related_id},
+                className='btn btn-link p-0',
+                style={'color': colors['accent'], 'textAlign': 'left'}
+            )))
+    
+    if not items:
+        return None
+    return html.Div([
+        html.H5('相关条目', style={'color': colors['accent'], 'marginTop': '15px'}),
+        html.Ul(items)
+    ])
+
+# 详情面板图片：有缩略图时输出 WebP/JPEG 两种 srcset，由 assets/images.js 在进入视口时加载
+def create_detail_image(image_url):
+    entry = image_manifest.get(image_url)
+    if entry is None:
+        return html.Img(src=image_url, style=styles['detail-image'])
+    
+    # 宽高属性预留出图片的位置，加载完成时页面不跳动
+    return html.Picture(className='lazy-image', **image_attributes(entry), children=[
+        html.Source(type='image/webp'),
+        html.Img(width=entry['width'], height=entry['height'],
+                 style=dict(styles['detail-image'], height='auto', objectFit='contain'))
+    ])
+
+# 创建事件详情内容
+def create_event_detail(event):
+    """事件详情：标题、图片、描述、朝代和相关条目"""
+    return [
+        html.H3(f"{event['title']} ({event['year']}年)", style={'color': colors['accent']}),
+        html.Div([
+            create_detail_image(event['image_url']) if event['image_url'] else None,
+            html.P(event['description']),
+            html.P(f"朝代: {event['dynasty']}", style={'fontStyle': 'italic'}),
+            html.P(f"所属朝代: {reign_names(event)}", style={'fontStyle': 'italic'}) if event.get('dynasty_ids') else None
+        ]),
+        create_related_list(event['id'])
+    ]
+
+# 创建人物详情内容
+def create_figure_detail(figure):
+    """人物详情：姓名、图片、描述、朝代和相关条目"""
+    return [
+        html.H3(f"{figure['name']} ({figure['birth_year']}-{figure['death_year']})", style={'color': colors['accent']}),
+        html.Div([
+            create_detail_image(figure['image_url']) if figure['image_url'] else None,
+            html.P(figure['description']),
+            html.P(f"朝代: {figure['dynasty']}", style={'fontStyle': 'italic'}),
+            html.P(f"历经朝代: {reign_names(figure)}", style={'fontStyle': 'italic'}) if figure.get('dynasty_ids') else None
+        ]),
+        create_related_list(figure['id'])
+    ]
+
+# 回调函数：点击事件、人物或相关条目时更新详情面板
 @app.callback(
     [Output('detail-content', 'children'),
      Output('selected-item-store', 'data')],
     [Input('events-timeline', 'clickData'),
-     Input('figures-timeline', 'clickData')],
+     Input('figures-timeline', 'clickData'),
+     Input({'type': 'related-item', 'id': ALL}, 'n_clicks')],
     [State('selected-item-store', 'data')]
 )
-def update_detail_panel(events_click, figures_click, selected_item):
+def update_detail_panel(events_click, figures_click, related_clicks, selected_item):
     # 确定触发回调的组件
     trigger_id = ctx.triggered_id
     
@@ -762,78 +719,54 @@ def update_detail_panel(events_click, figures_click, selected_item):
     detail_content = []
     selected_data = selected_item or {}
     
-    # 如果点击了事件
+    # 确定要显示的条目ID
+    item_id = None
     if trigger_id == 'events-timeline' and events_click:
-        event_id = events_click['points'][0]['customdata'][0]
-        
+        item_id = events_click['points'][0]['customdata'][0]
+    elif trigger_id == 'figures-timeline' and figures_click:
+        item_id = figures_click['points'][0]['customdata'][0]
+    elif isinstance(trigger_id, dict):
+        # 相关条目按钮刚渲染出来时也会触发一次，只响应真正的点击
+        if not ctx.triggered[0]['value']:
+            raise PreventUpdate
+        item_id = trigger_id['id']
+    
+    # 如果点击了事件
+    if item_id and item_id.startswith('event_'):
         # 查找对应事件
-        for event in events:
-            if event['id'] == event_id:
-                # 更新选中项
-                selected_data = {
-                    'type': 'event',
-                    'id': event_id,
-                    'data': event
-                }
-                
-                # 创建详情内容
-                detail_content = [
-                    html.H3(f"{event['title']} ({event['year']}年)", style={'color': colors['accent']}),
-                    html.Div([
-                        html.Img(src=event['image_url'], style=styles['detail-image']) if event['image_url'] else None,
-                        html.P(event['description']),
-                        html.P(f"朝代: {event['dynasty']}", style={'fontStyle': 'italic'})
-                    ])
-                ]
-                break
+        event = store.get_event(item_id)
+        if event:
+            # 更新选中项
+            selected_data = {
+                'type': 'event',
+                'id': item_id,
+                'data': event.to_dict()
+            }
+            
+            # 创建详情内容
+            detail_content = create_event_detail(event)
     
     # 如果点击了人物
-    elif trigger_id == 'figures-timeline' and figures_click:
-        figure_id = figures_click['points'][0]['customdata'][0]
-        
+    elif item_id and item_id.startswith('figure_'):
         # 查找对应人物
-        for figure in figures:
-            if figure['id'] == figure_id:
-                # 更新选中项
-                selected_data = {
-                    'type': 'figure',
-                    'id': figure_id,
-                    'data': figure
-                }
-                
-                # 创建详情内容
-                detail_content = [
-                    html.H3(f"{figure['name']} ({figure['birth_year']}-{figure['death_year']})", style={'color': colors['accent']}),
-                    html.Div([
-                        html.Img(src=figure['image_url'], style=styles['detail-image']) if figure['image_url'] else None,
-                        html.P(figure['description']),
-                        html.P(f"朝代: {figure['dynasty']}", style={'fontStyle': 'italic'})
-                    ])
-                ]
-                break
+        figure = store.get_figure(item_id)
+        if figure:
+            # 更新选中项
+            selected_data = {
+                'type': 'figure',
+                'id': item_id,
+                'data': figure.to_dict()
+            }
+            
+            # 创建详情内容
+            detail_content = create_figure_detail(figure)
     
     # 如果没有点击事件，但有已选中项，保持当前显示
     elif selected_item:
         if selected_item['type'] == 'event':
-            event = selected_item['data']
-            detail_content = [
-                html.H3(f"{event['title']} ({event['year']}年)", style={'color': colors['accent']}),
-                html.Div([
-                    html.Img(src=event['image_url'], style=styles['detail-image']) if event['image_url'] else None,
-                    html.P(event['description']),
-                    html.P(f"朝代: {event['dynasty']}", style={'fontStyle': 'italic'})
-                ])
-            ]
+            detail_content = create_event_detail(selected_item['data'])
         elif selected_item['type'] == 'figure':
-            figure = selected_item['data']
-            detail_content = [
-                html.H3(f"{figure['name']} ({figure['birth_year']}-{figure['death_year']})", style={'color': colors['accent']}),
-                html.Div([
-                    html.Img(src=figure['image_url'], style=styles['detail-image']) if figure['image_url'] else None,
-                    html.P(figure['description']),
-                    html.P(f"朝代: {figure['dynasty']}", style={'fontStyle': 'italic'})
-                ])
-            ]
+            detail_content = create_figure_detail(selected_item['data'])
     
     # 如果没有点击事件且没有已选中项，显示默认消息
     else:
@@ -0,0 +1,75 @@
+// 事件、人物时间轴回调的合并与重试（服务器端见 admission.py，只处理与其 THROTTLED_OUTPUTS 相同的回调）：
+//   1. 每个回调输出同时只有一个请求在发送，期间的新请求只保留最新的一个，旧的返回 204（Dash 当作不更新处理），
+//      拖动再快，每个时间轴也只占服务器一个请求
+//   2. 服务器过载时返回 429，没有更新的请求时按 Retry-After 重新发送，保证最后一次交互的结果仍会显示
+// Dash 通过 window.fetch 发送回调请求，本脚本在渲染器初始化前加载，因此包装 fetch 即可
+
+(function() {
+    const TIMELINE_OUTPUTS = ['events-timeline.figure', 'figures-timeline.figure'];
+    const nativeFetch = window.fetch.bind(window);
+    const states = new Map(); // 回调输出 -> {busy: 是否有请求在发送, pending: 等待发送的最新请求}
+
+    function callbackOutput(input, init) {
+        const url = typeof input === 'string' ? input : input.url;
+        if (!url.includes('/_dash-update-component') || !init || typeof init.body !== 'string') {
+            return null;
+        }
+        try {
+            const output = JSON.parse(init.body).output;
+            return TIMELINE_OUTPUTS.some(name => output.includes(name)) ? output : null;
+        } catch (error) {
+            return null;
+        }
+    }
+
+    function noUpdate() {
+        return new Response(null, {status: 204});
+    }
+
+    // 结束当前请求，接着发送期间到达的最新请求
+    function finish(state, job, result) {
+        job.resolve(result);
+        const next = state.pending;
+        state.pending = null;
+        if (next) {
+            send(state, next);
+        } else {
+            state.busy = false;
+        }
+    }
+
+    function send(state, job) {
+        nativeFetch(job.input, job.init).then(response => {
+            if (response.status === 429 && !state.pending) {
+                const delay = (parseFloat(response.headers.get('Retry-After')) || 1) * 1000;
+                setTimeout(() => state.pending ? finish(state, job, noUpdate()) : send(state, job), delay);
+            } else {
+                finish(state, job, response.status === 429 ? noUpdate() : response);
+            }
+        }, error => finish(state, job, Promise.reject(error)));
+    }
+
+    window.fetch = function(input, init) {
+        const output = callbackOutput(input, init);
+        if (!output) {
+            return nativeFetch(input, init);
+        }
+        if (!states.has(output)) {
+            states.set(output, {busy: false, pending: null});
+        }
+        const state = states.get(output);
+
+        return new Promise(resolve => {
+            const job = {input, init, resolve};
+            if (!state.busy) {
+                state.busy = true;
+                send(state, job);
+                return;
+            }
+            if (state.pending) {
+                state.pending.resolve(noUpdate());
+            }
+            state.pending = job;
+        });
+    };
+})();
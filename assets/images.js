@@ -0,0 +1,102 @@
+// 详情面板图片的延迟加载，以及可见范围内条目图片的预取
+// Dash 的 html.Img 没有 loading 属性，图片地址放在 data-* 属性中，由本脚本在需要时写入 srcset
+// 预取与详情面板使用相同的 sizes，浏览器会挑选同一尺寸的缩略图，打开详情时直接命中缓存
+
+(function() {
+    const supportsWebp = document.createElement('canvas').toDataURL('image/webp').startsWith('data:image/webp');
+    const prefetched = new Set();
+    const observed = new WeakSet();
+    let scheduled = false;
+
+    // 把 data-* 中的地址写入 <picture> 内的 <source> 和 <img>
+    function loadPicture(picture) {
+        const source = picture.querySelector('source');
+        const img = picture.querySelector('img');
+        if (source) {
+            source.sizes = picture.dataset.sizes;
+            source.srcset = picture.dataset.webp;
+        }
+        if (img) {
+            img.sizes = picture.dataset.sizes;
+            img.srcset = picture.dataset.jpeg;
+            img.src = picture.dataset.src;
+        }
+        picture.dataset.loaded = picture.dataset.src;
+    }
+
+    // 进入视口前 200px 开始加载；不支持 IntersectionObserver 时立即加载
+    const observer = 'IntersectionObserver' in window ? new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            const picture = entry.target;
+            if (entry.isIntersecting && picture.dataset.loaded !== picture.dataset.src) {
+                loadPicture(picture);
+            }
+        });
+    }, {rootMargin: '200px'}) : null;
+
+    function prefetchImages() {
+        const container = document.getElementById('image-prefetch');
+        if (!container) {
+            return;
+        }
+        container.querySelectorAll('[data-src]').forEach(item => {
+            const candidates = supportsWebp ? item.dataset.webp : item.dataset.jpeg;
+            if (prefetched.has(candidates)) {
+                return;
+            }
+            prefetched.add(candidates);
+            const img = new Image();
+            img.fetchPriority = 'low';
+            img.decoding = 'async';
+            img.sizes = item.dataset.sizes;
+            img.srcset = candidates;
+        });
+    }
+
+    function scan() {
+        scheduled = false;
+        // 切换详情时 React 可能复用同一个 <picture> 元素，只更新 data-* 属性，因此按地址判断是否需要重新加载
+        document.querySelectorAll('picture.lazy-image').forEach(picture => {
+            if (picture.dataset.loaded === picture.dataset.src) {
+                return;
+            }
+            if (!observer) {
+                loadPicture(picture);
+            } else if (observed.has(picture)) {
+                // 已在视口内的元素不会再次触发回调，重新观察一次以取得当前状态
+                observer.unobserve(picture);
+                observer.observe(picture);
+            } else {
+                observed.add(picture);
+                observer.observe(picture);
+            }
+        });
+        // 预取放在浏览器空闲时，不与时间轴渲染争抢带宽
+        (window.requestIdleCallback || (callback => setTimeout(callback, 200)))(prefetchImages);
+    }
+
+    // 详情面板和预取列表由 Dash 回调渲染，只观察这两个容器，变化合并到下一帧统一检查
+    const mutations = new MutationObserver(() => {
+        if (!scheduled) {
+            scheduled = true;
+            requestAnimationFrame(scan);
+        }
+    });
+    const watched = new Set();
+
+    // 脚本执行时 Dash 可能还没有渲染布局，容器未全部出现前每帧重试
+    function watchContainers() {
+        ['detail-content', 'image-prefetch'].forEach(id => {
+            const container = document.getElementById(id);
+            if (container && !watched.has(id)) {
+                watched.add(id);
+                mutations.observe(container, {childList: true, subtree: true, attributes: true, attributeFilter: ['data-src']});
+                scan();
+            }
+        });
+        if (watched.size < 2) {
+            requestAnimationFrame(watchContainers);
+        }
+    }
+    watchContainers();
+})();
@@ -0,0 +1,130 @@
+// 搜索联想：输入时请求 /api/suggest，在输入框下方显示联想列表
+// Dash 会自动加载 assets 目录下的脚本，组件由 React 渲染，因此通过事件委托绑定
+
+(function() {
+    const cache = new Map(); // 已请求的前缀 -> 联想结果
+    const typeLabels = {dynasty: '朝代', event: '事件', figure: '人物'};
+    let controller = null; // 用于取消过期的请求
+    let activeIndex = -1;
+
+    function suggestionList() {
+        return document.getElementById('search-suggestions');
+    }
+
+    function hideSuggestions() {
+        const list = suggestionList();
+        if (list) {
+            list.style.display = 'none';
+            list.innerHTML = '';
+        }
+        activeIndex = -1;
+    }
+
+    // React 受控输入框需要通过原生 setter 赋值并派发 input 事件，Dash 才能收到新值
+    function selectSuggestion(input, label) {
+        const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+        setter.call(input, label);
+        input.dispatchEvent(new Event('input', {bubbles: true}));
+        hideSuggestions();
+    }
+
+    function renderSuggestions(input, items) {
+        const list = suggestionList();
+        if (!list) {
+            return;
+        }
+        list.innerHTML = '';
+        activeIndex = -1;
+        if (items.length === 0) {
+            list.style.display = 'none';
+            return;
+        }
+
+        items.forEach(item => {
+            const option = document.createElement('li');
+            option.textContent = item.label;
+            const type = document.createElement('span');
+            type.className = 'suggestion-type';
+            type.textContent = typeLabels[item.type] || '';
+            option.appendChild(type);
+            // mousedown 先于输入框的 blur 触发
+            option.addEventListener('mousedown', event => {
+                event.preventDefault();
+                selectSuggestion(input, item.label);
+            });
+            list.appendChild(option);
+        });
+        list.style.display = 'block';
+    }
+
+    function fetchSuggestions(input) {
+        const query = input.value.trim();
+        if (!query) {
+            hideSuggestions();
+            return;
+        }
+        if (cache.has(query)) {
+            renderSuggestions(input, cache.get(query));
+            return;
+        }
+
+        if (controller) {
+            controller.abort();
+        }
+        controller = new AbortController();
+        fetch(`/api/suggest?q=${encodeURIComponent(query)}`, {signal: controller.signal})
+            .then(response => response.json())
+            .then(items => {
+                cache.set(query, items);
+                // 只显示与输入框当前内容对应的结果
+                if (input.value.trim() === query) {
+                    renderSuggestions(input, items);
+                }
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('获取搜索联想失败:', error);
+                }
+            });
+    }
+
+    // 上下键选择、回车确认、Esc 关闭
+    function handleKeydown(input, event) {
+        const list = suggestionList();
+        if (!list || list.style.display !== 'block') {
+            return;
+        }
+        const options = list.querySelectorAll('li');
+
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            event.preventDefault();
+            const step = event.key === 'ArrowDown' ? 1 : -1;
+            activeIndex = (activeIndex + step + options.length) % options.length;
+            options.forEach((option, i) => option.classList.toggle('active', i === activeIndex));
+        } else if (event.key === 'Enter' && activeIndex >= 0) {
+            event.preventDefault();
+            selectSuggestion(input, options[activeIndex].firstChild.textContent);
+        } else if (event.key === 'Escape') {
+            hideSuggestions();
+        }
+    }
+
+    document.addEventListener('input', event => {
+        // 选中联想时派发的 input 事件不再重新请求
+        if (event.target.id === 'search-input' && event.isTrusted) {
+            fetchSuggestions(event.target);
+        }
+    });
+
+    document.addEventListener('keydown', event => {
+        if (event.target.id === 'search-input') {
+            handleKeydown(event.target, event);
+        }
+    });
+
+    document.addEventListener('focusout', event => {
+        if (event.target.id === 'search-input') {
+            hideSuggestions();
+        }
+    });
+})();
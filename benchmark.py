@@ -0,0 +1,1537 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 性能基准脚本
+对数据加载、筛选和渲染相关的优化进行测量，用法：python benchmark.py <场景>
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import random
+import argparse
+import statistics
+import shutil
+import subprocess
+import tempfile
+import threading
+import urllib.request
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(current_dir, 'data')
+static_dir = os.path.join(current_dir, 'static_version')
+
+
+def file_size(path):
+    """返回文件的原始大小和gzip压缩后的大小"""
+    with open(path, 'rb') as f:
+        content = f.read()
+    return len(content), len(gzip.compress(content))
+
+
+def current_rss_mb():
+    """读取当前进程的常驻内存（MB），仅支持Linux"""
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def load_sample_data():
+    """读取真实数据，作为合成数据的模板"""
+    with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def synthetic_events(count, seed=0):
+    """按真实事件模板生成指定数量的合成事件（生成器，不占用额外内存）
+
+    与真实CSV一样按年份先后排列，年份在整个时间范围内均匀分布
+    """
+    sample = load_sample_data()
+    rng = random.Random(seed)
+    min_year, max_year = sample['time_range']['min_year'], sample['time_range']['max_year']
+    for i in range(count):
+        template = sample['events'][i % len(sample['events'])]
+        yield dict(template, id=f"event_{i}", year=min_year + (max_year - min_year) * i // count,
+                   importance=rng.randint(1, 5))
+
+
+def synthetic_figures(count, seed=1):
+    """按真实人物模板生成指定数量的合成人物，按出生年份先后排列"""
+    sample = load_sample_data()
+    rng = random.Random(seed)
+    min_year, max_year = sample['time_range']['min_year'], sample['time_range']['max_year'] - 100
+    for i in range(count):
+        template = sample['figures'][i % len(sample['figures'])]
+        birth = min_year + (max_year - min_year) * i // count
+        yield dict(template, id=f"figure_{i}", birth_year=birth, death_year=birth + rng.randint(20, 90),
+                   importance=rng.randint(1, 5))
+
+
+def bench_shards(args):
+    """对比静态版本窄范围访问时分片加载与单一JSON文件的传输量"""
+    shard_dir = os.path.join(static_dir, 'shards')
+    with open(os.path.join(shard_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    # 与 main.js 相同的分片选择规则：可见分片加上两侧各一个预取分片
+    shards = manifest['shards']
+    visible = [i for i, shard in enumerate(shards)
+               if shard['min_year'] <= args.end and shard['max_year'] >= args.start]
+    prefetch = [i for i in (visible[0] - 1, visible[-1] + 1) if 0 <= i < len(shards)] if visible else []
+
+    first_render = [os.path.join(shard_dir, 'manifest.json')]
+    first_render += [os.path.join(shard_dir, shards[i]['file']) for i in visible]
+
+    raw, gz = zip(*(file_size(path) for path in first_render))
+    prefetch_raw = sum(file_size(os.path.join(shard_dir, shards[i]['file']))[0] for i in prefetch)
+    mono_raw, mono_gz = file_size(os.path.join(static_dir, 'timeline_data.json'))
+
+    # 解析耗时作为浏览器端首次渲染前数据准备时间的近似
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for path in first_render:
+            with open(path, 'r', encoding='utf-8') as f:
+                json.load(f)
+    shard_parse = (time.perf_counter() - start) / args.repeat * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        with open(os.path.join(static_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+            json.load(f)
+    mono_parse = (time.perf_counter() - start) / args.repeat * 1000
+
+    print(f"时间范围: {args.start} ~ {args.end}，可见分片 {len(visible)} 个，预取 {len(prefetch)} 个")
+    print(f"{'方式':<12}{'原始字节':>10}{'gzip字节':>10}{'解析(ms)':>10}")
+    print(f"{'单一JSON':<12}{mono_raw:>10}{mono_gz:>10}{mono_parse:>10.3f}")
+    print(f"{'分片':<12}{sum(raw):>10}{sum(gz):>10}{shard_parse:>10.3f}")
+    print(f"首次渲染后的空闲预取: {prefetch_raw} 字节")
+
+
+def build_storage_data(work_dir, rows, backends):
+    """在临时目录中生成指定规模的JSON文件和SQLite数据库"""
+    import process_data
+
+    sample = load_sample_data()
+    figures_count = max(rows // 10, 1)
+
+    if 'sqlite' in backends:
+        start = time.perf_counter()
+        process_data.save_sqlite_database({
+            'dynasties': sample['dynasties'],
+            'events': synthetic_events(rows),
+            'figures': synthetic_figures(figures_count),
+            'time_range': sample['time_range']
+        }, os.path.join(work_dir, 'timeline.db'))
+        print(f"  SQLite 构建耗时 {time.perf_counter() - start:.1f}s，"
+              f"文件 {os.path.getsize(os.path.join(work_dir, 'timeline.db')) / 2**20:.0f}MB")
+
+    if 'json' in backends:
+        with open(os.path.join(work_dir, 'timeline_data.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'dynasties': sample['dynasties'],
+                'events': list(synthetic_events(rows)),
+                'figures': list(synthetic_figures(figures_count)),
+                'time_range': sample['time_range']
+            }, f, ensure_ascii=False)
+
+
+def bench_storage_worker(args):
+    """在独立进程中载入数据后端，测量常驻内存和典型回调查询的延迟"""
+    from storage import load_store
+
+    base_rss = current_rss_mb()
+    start = time.perf_counter()
+    store = load_store(args.data_dir, args.backend)
+    load_time = time.perf_counter() - start
+    rss = current_rss_mb() - base_rss
+
+    rng = random.Random(42)
+    min_year, max_year = store.time_range['min_year'], store.time_range['max_year']
+
+    def window():
+        start_year = rng.randint(min_year, max_year - args.window)
+        return [start_year, start_year + args.window]
+
+    queries = {
+        '时间范围': lambda: (store.query_events(window()), store.query_figures(window())),
+        '范围+分类+重要性': lambda: (store.query_events(window(), None, '军事', 4),
+                               store.query_figures(window(), None, 4)),
+        '范围+搜索': lambda: (store.query_events(window(), '秦始皇'), store.query_figures(window(), '秦始皇')),
+    }
+
+    result = {'backend': args.backend, 'rss_mb': rss, 'load_s': load_time, 'latency_ms': {}}
+    for name, query in queries.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        result['latency_ms'][name] = statistics.median(timings)
+
+    # 查询过程中页缓存和结果集也会占用内存，一并记录
+    result['rss_after_queries_mb'] = current_rss_mb() - base_rss
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def bench_storage(args):
+    """对比JSON和SQLite数据后端在大规模数据下的内存占用和查询延迟"""
+    backends = args.backends.split(',')
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+            print(f"事件 {rows} 条，人物 {max(rows // 10, 1)} 条")
+            build_storage_data(work_dir, rows, backends)
+
+            for backend in backends:
+                proc = subprocess.run(
+                    [sys.executable, __file__, 'storage-worker', '--backend', backend,
+                     '--data-dir', work_dir, '--window', str(args.window), '--repeat', str(args.repeat)],
+                    capture_output=True, text=True
+                )
+                if proc.returncode != 0:
+                    print(f"  {backend}: 失败（退出码 {proc.returncode}）{proc.stderr.strip()[-200:]}")
+                    continue
+
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                latency = '，'.join(f"{name} {value:.2f}ms" for name, value in result['latency_ms'].items())
+                print(f"  {backend}: 内存 {result['rss_mb']:.0f}MB（查询后 {result['rss_after_queries_mb']:.0f}MB），载入 {result['load_s']:.1f}s，{latency}")
+
+
+def recorded_trace():
+    """一次典型会话的交互记录：(毫秒时间戳, 组件, 值)
+
+    包括用拼音输入法输入关键词、滚轮缩放事件时间轴、拖动时间范围滑块、切换筛选条件
+    """
+    trace = []
+    t = 0
+
+    # 输入法组字过程中每次按键都会改变输入框的值
+    for value in ['q', 'qi', 'qin', '秦', '秦s', '秦sh', '秦shi', '秦始', '秦始h', '秦始hu',
+                  '秦始hua', '秦始huan', '秦始huang', '秦始皇']:
+        t += 120
+        trace.append((t, 'search-input', value))
+
+    # 滚轮缩放：每个滚轮刻度触发一次 relayoutData
+    t += 1500
+    for i in range(30):
+        t += 30
+        trace.append((t, 'events-timeline', {'xaxis.range[0]': -400 + i * 5, 'xaxis.range[1]': 200 - i * 5}))
+
+    # 拖动时间范围滑块：拖动过程中产生 40 个中间位置
+    t += 1500
+    for i in range(40):
+        t += 30
+        trace.append((t, 'time-range-slider', [-2100 + i * 20, 2025], i == 39))
+
+    # 切换分类和重要性
+    t += 1000
+    trace.append((t, 'event-category-filter', '军事'))
+    for value in (2, 3):
+        t += 400
+        trace.append((t, 'importance-filter', value))
+
+    # 删除关键词重新输入
+    t += 1500
+    for value in ['秦始', '秦', '', 't', 'ta', 'tan', 'tang', '唐']:
+        t += 100
+        trace.append((t, 'search-input', value))
+
+    return trace
+
+
+def client_requests(trace, debounce_ms, slider_mouseup):
+    """按前端的防抖和滑块更新方式，计算交互记录实际发出的回调请求（时间戳, 完整输入状态）"""
+    state = {
+        'time-range-slider': [-2100, 2025], 'search-input': None, 'event-category-filter': 'all',
+        'importance-filter': 1, 'events-timeline': None
+    }
+    requests_out = []
+
+    for i, entry in enumerate(trace):
+        t, component, value = entry[:3]
+
+        if component == 'time-range-slider' and slider_mouseup and not entry[3]:
+            continue
+
+        if component == 'search-input' and debounce_ms:
+            # 只有停止输入超过防抖时间（或之后没有再输入）才发出请求
+            following = [e[0] for e in trace[i + 1:] if e[1] == 'search-input']
+            if following and following[0] - t < debounce_ms:
+                continue
+            t += debounce_ms
+
+        state[component] = value
+        requests_out.append((t, component, dict(state)))
+
+    return requests_out
+
+
+class DashSession:
+    """进程内模拟 Dash 前端：输入变化时按依赖关系调用回调，并把输出传给下游回调"""
+
+    def __init__(self, dash_app):
+        from collections import Counter
+
+        self.client = dash_app.server.test_client()
+        self.callbacks = dash_app.callback_map
+        self.no_initial_call = {spec['output'] for spec in dash_app._callback_list if spec.get('prevent_initial_call')}
+        self.props = {}
+        for component in dash_app.layout._traverse_ids():
+            for name in component._prop_names:
+                value = getattr(component, name, None)
+                if value is not None:
+                    self.props[(component.id, name)] = value
+
+        self.executed = Counter()
+        self.prevented = Counter()
+        self.cpu_ms = 0.0
+
+    def payload(self, key, changed):
+        """构造 /_dash-update-component 请求体"""
+        spec = self.callbacks[key]
+
+        def dependency(item):
+            return {'id': item['id'], 'property': item['property'],
+                    'value': self.props.get((item['id'], item['property']))}
+
+        outputs = spec['output']
+        if isinstance(outputs, list):
+            outputs = [{'id': o.component_id, 'property': o.component_property} for o in outputs]
+        else:
+            outputs = {'id': outputs.component_id, 'property': outputs.component_property}
+
+        return {
+            'output': key,
+            'outputs': outputs,
+            'inputs': [dependency(item) for item in spec['inputs']],
+            'changedPropIds': list(changed),
+            'state': [dependency(item) for item in spec['state']]
+        }
+
+    def call(self, key, changed):
+        """调用一个回调，返回它更新的属性"""
+        name = self.callbacks[key]['callback'].__name__
+        start = time.process_time()
+        response = self.client.post('/_dash-update-component', json=self.payload(key, changed))
+        # 与真实服务器一样在响应结束时关闭，准入控制据此释放并发名额
+        response.close()
+        self.cpu_ms += (time.process_time() - start) * 1000
+
+        if response.status_code == 204:
+            self.prevented[name] += 1
+            return []
+
+        self.executed[name] += 1
+        updated = []
+        for component_id, props in response.get_json()['response'].items():
+            for prop, value in props.items():
+                # Patch 只修改图表的一部分，这里不需要还原完整图表
+                if not (isinstance(value, dict) and '__dash_patch_update' in value):
+                    self.props[(component_id, prop)] = value
+                updated.append(f'{component_id}.{prop}')
+        return updated
+
+    def propagate(self, changed):
+        """依次调用依赖已变化属性的回调，直到没有新的变化"""
+        while changed:
+            updated = []
+            for key, spec in self.callbacks.items():
+                triggered = [f"{item['id']}.{item['property']}" for item in spec['inputs']]
+                if any(prop in changed for prop in triggered):
+                    updated.extend(self.call(key, [prop for prop in triggered if prop in changed]))
+            changed = updated
+
+    def load(self):
+        """页面加载时所有回调各调用一次"""
+        updated = []
+        for key in [key for key in self.callbacks if key not in self.no_initial_call]:
+            updated.extend(self.call(key, []))
+        self.propagate(updated)
+
+    def set(self, component_id, prop, value):
+        """模拟用户修改一个组件属性"""
+        self.props[(component_id, prop)] = value
+        self.propagate([f'{component_id}.{prop}'])
+
+
+def replay(base_url, dash_app, requests_out, session):
+    """按时间戳并发回放事件和人物时间轴的回调请求，返回每个请求的HTTP状态码"""
+    statuses = []
+    lock = threading.Lock()
+    dash_session = DashSession(dash_app)
+
+    def send(body):
+        req = urllib.request.Request(f'{base_url}/_dash-update-component', data=body, headers={
+            'Content-Type': 'application/json', 'Cookie': f'timeline_session={session}'
+        })
+        with urllib.request.urlopen(req) as response:
+            response.read()
+            with lock:
+                statuses.append(response.status)
+
+    threads = []
+    start = time.perf_counter()
+    for t, component, state in requests_out:
+        # 可见范围由滑块或时间轴缩放决定，渲染记录置空以强制重算
+        relayout = state['events-timeline']
+        view_range = [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']] \
+            if component == 'events-timeline' else state['time-range-slider']
+        dash_session.props[('view-range-store', 'data')] = view_range
+        for prop in ('search-input', 'event-category-filter', 'importance-filter'):
+            dash_session.props[(prop, 'value')] = state[prop]
+
+        bodies = []
+        for layer in ('events', 'figures'):
+            dash_session.props[(f'{layer}-timeline-state', 'data')] = None
+            key = f'..{layer}-timeline.figure...{layer}-timeline-state.data..'
+            bodies.append(json.dumps(dash_session.payload(key, [f'{component}.value'])).encode('utf-8'))
+
+        delay = t / 1000 - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        for body in bodies:
+            thread = threading.Thread(target=send, args=(body,))
+            thread.start()
+            threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def bench_coalesce(args):
+    """回放一次交互记录，对比防抖和请求合并前后实际执行的回调次数"""
+    import logging
+    from werkzeug.serving import make_server
+    import app as timeline_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, timeline_app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    trace = recorded_trace()
+    print(f"交互记录: {len(trace)} 次输入变化")
+
+    # 原来的配置：输入框每次按键都触发，滑块默认 mouseup，服务端不合并
+    before = client_requests(trace, debounce_ms=0, slider_mouseup=True)
+    print(f"  优化前: 发出请求 {len(before)} 次，每次重算事件和人物时间轴")
+
+    after = client_requests(trace, debounce_ms=timeline_app.SEARCH_DEBOUNCE_MS, slider_mouseup=True)
+    timeline_app.coalescer.stats.clear()
+    statuses = replay(base_url, timeline_app.app, after, session='benchmark')
+    stats = timeline_app.coalescer.stats
+    print(f"  优化后: 发出请求 {len(after)} 次（事件、人物各一个回调），完成计算 {stats['completed']} 次，"
+          f"中途放弃 {stats['dropped']} 次（HTTP 204: {statuses.count(204)}）")
+
+    server.shutdown()
+
+
+def scripted_session():
+    """脚本化的一次会话：(说明, 组件, 属性, 值)"""
+    return [
+        ('切换分类', 'event-category-filter', 'value', '军事'),
+        ('切换分类', 'event-category-filter', 'value', '文化'),
+        ('调整重要性', 'importance-filter', 'value', 3),
+        ('搜索', 'search-input', 'value', '秦'),
+        ('隐藏朝代', 'display-options', 'value', ['events', 'figures']),
+        ('隐藏人物', 'display-options', 'value', ['events']),
+        ('缩放事件时间轴', 'events-timeline', 'relayoutData', {'xaxis.range[0]': -400, 'xaxis.range[1]': 200}),
+        ('缩放事件时间轴', 'events-timeline', 'relayoutData', {'xaxis.range[0]': -300, 'xaxis.range[1]': 100}),
+        ('切换分类', 'event-category-filter', 'value', 'all'),
+        ('显示人物', 'display-options', 'value', ['events', 'figures']),
+        ('人物时间轴 autosize', 'figures-timeline', 'relayoutData', {'autosize': True}),
+        ('显示朝代', 'display-options', 'value', ['dynasties', 'events', 'figures']),
+        ('拖动滑块', 'time-range-slider', 'value', [-1000, 1000]),
+        ('清空搜索', 'search-input', 'value', ''),
+    ]
+
+
+def bench_layers(args):
+    """按依赖拆分时间轴回调后，统计脚本化会话中每次交互执行的回调数和CPU耗时"""
+    import plotly.io as pio
+    import app as timeline_app
+
+    def monolithic_rebuild(props):
+        """原来的单一回调：任何输入变化都重算并序列化三个时间轴"""
+        xaxis_range = props[('view-range-store', 'data')]
+        search_term = props.get(('search-input', 'value'))
+        min_importance = props[('importance-filter', 'value')]
+        figs = (
+            timeline_app.create_dynasty_timeline(xaxis_range),
+            timeline_app.create_events_timeline(timeline_app.store.query_events(
+                xaxis_range, search_term, props[('event-category-filter', 'value')], min_importance), xaxis_range),
+            timeline_app.create_figures_timeline(timeline_app.store.query_figures(
+                xaxis_range, search_term, min_importance), xaxis_range),
+        )
+        return [pio.to_json(fig, validate=False) for fig in figs]
+
+    # 换成较大的合成数据，使时间轴重算的开销明显高于请求处理本身
+    from storage import JsonStore
+    sample = load_sample_data()
+    timeline_app.store = JsonStore({
+        'dynasties': sample['dynasties'], 'events': list(synthetic_events(args.rows)),
+        'figures': list(synthetic_figures(args.rows // 10)), 'time_range': sample['time_range']
+    })
+    print(f"事件 {args.rows} 条，人物 {args.rows // 10} 条")
+
+    session = DashSession(timeline_app.app)
+    session.load()
+
+    layer_callbacks = ('update_dynasty_timeline', 'update_events_timeline', 'update_figures_timeline')
+    print(f"{'交互':<18}{'原回调CPU(ms)':>14}{'时间轴重算':>10}{'回调数':>8}{'CPU(ms)':>10}")
+    total_before = total_after = total_layers = total_calls = 0
+    for name, component_id, prop, value in scripted_session():
+        executed_before = sum(session.executed.values())
+        layers_before = sum(session.executed[callback] for callback in layer_callbacks)
+        cpu_before = session.cpu_ms
+
+        session.set(component_id, prop, value)
+
+        calls = sum(session.executed.values()) - executed_before
+        layers = sum(session.executed[callback] for callback in layer_callbacks) - layers_before
+        cpu = session.cpu_ms - cpu_before
+
+        # 原来的单一回调在相同状态下的耗时；显示/隐藏只切换样式，不会触发它
+        old_cpu = 0.0
+        if component_id != 'display-options':
+            start = time.process_time()
+            for _ in range(args.repeat):
+                monolithic_rebuild(session.props)
+            old_cpu = (time.process_time() - start) * 1000 / args.repeat
+
+        total_before += old_cpu
+        total_after += cpu
+        total_layers += layers
+        total_calls += calls
+        print(f"{name:<18}{old_cpu:>14.2f}{layers:>10}{calls:>8}{cpu:>10.2f}")
+
+    print(f"{'合计':<18}{total_before:>14.2f}{total_layers:>10}{total_calls:>8}{total_after:>10.2f}")
+    print("原回调CPU：单一回调重算并序列化三个时间轴的耗时（不含请求处理）；"
+          "CPU：拆分后实际执行的回调经完整请求处理的耗时")
+
+
+def bench_density(args):
+    """在大规模事件上对比前缀和计数与掩码扫描计数的耗时，并测量拖动滑块时的计数回调"""
+    import numpy as np
+    from density import MAX_IMPORTANCE, DensityIndex, cumulative_counts
+
+    sample = load_sample_data()
+    min_year, max_year = sample['time_range']['min_year'], sample['time_range']['max_year']
+    n_years = max_year - min_year + 1
+    categories = ['政治', '军事', '文化', '经济', '科技']
+
+    # 直接生成列数组：与合成事件一样按年份先后排列，分类和重要性随机
+    rng = np.random.default_rng(0)
+    years = min_year + (np.arange(args.rows, dtype=np.int64) * (n_years - 1)) // args.rows
+    importance = rng.integers(1, MAX_IMPORTANCE + 1, args.rows)
+    groups = rng.integers(1, len(categories) + 1, args.rows)
+    births = np.sort(rng.integers(min_year, max_year - 100, args.rows // 10))
+    deaths = births + rng.integers(20, 90, len(births))
+    figure_importance = rng.integers(1, MAX_IMPORTANCE + 1, len(births))
+
+    start = time.perf_counter()
+    events = cumulative_counts(years, importance, groups, len(categories) + 1, min_year, n_years)
+    events[0] = events[1:].sum(axis=0)
+    no_groups = np.zeros(len(births), dtype=np.int64)
+    index = DensityIndex({
+        'min_year': min_year,
+        'categories': np.array(categories),
+        'events': events,
+        'figure_births': cumulative_counts(births, figure_importance, no_groups, 1, min_year, n_years)[0],
+        'figure_deaths': cumulative_counts(deaths, figure_importance, no_groups, 1, min_year, n_years)[0]
+    })
+    print(f"事件 {args.rows} 条，人物 {len(births)} 位，生成前缀和耗时 {time.perf_counter() - start:.2f}s，"
+          f"数组大小 {(events.nbytes + 2 * index._figure_births.nbytes) / 2**20:.1f}MB")
+
+    # 对照：JsonStore 的做法，二分查找年份区间后对分类和重要性掩码计数
+    category_masks = {category: groups == i + 1 for i, category in enumerate(categories)}
+    importance_masks = {level: importance >= level for level in range(1, MAX_IMPORTANCE + 1)}
+
+    def count_with_masks(year_range, category, min_importance):
+        lo = np.searchsorted(years, year_range[0], side='left')
+        hi = np.searchsorted(years, year_range[1], side='right')
+        mask = importance_masks[min_importance][lo:hi]
+        if category != 'all':
+            mask = mask & category_masks[category][lo:hi]
+        return int(np.count_nonzero(mask))
+
+    query_rng = random.Random(0)
+    queries = []
+    for _ in range(args.queries):
+        start_year = query_rng.randint(min_year, max_year)
+        queries.append(([start_year, min(start_year + query_rng.randint(10, 2000), max_year)],
+                        query_rng.choice(['all'] + categories), query_rng.randint(1, MAX_IMPORTANCE)))
+
+    timings = {}
+    for label, count, repeat in (('masks', count_with_masks, max(1, args.queries // 100)),
+                                 ('density', index.count_events, args.queries)):
+        start = time.perf_counter()
+        results = [count(*query) for query in queries[:repeat]]
+        timings[label] = (time.perf_counter() - start) * 1e6 / repeat
+        if label == 'masks':
+            expected = results
+    mismatches = sum(index.count_events(*query) != value for query, value in zip(queries, expected))
+    print(f"  掩码计数: {timings['masks']:.1f}µs/次，前缀和计数: {timings['density']:.2f}µs/次，"
+          f"结果不一致 {mismatches} 次")
+
+    start = time.perf_counter()
+    for year_range, _, min_importance in queries:
+        index.count_figures(year_range, min_importance)
+    print(f"  人物计数: {(time.perf_counter() - start) * 1e6 / len(queries):.2f}µs/次")
+
+    # 拖动滑块：每次 drag_value 变化只触发计数和缩略图矩形两个回调
+    import app as timeline_app
+    timeline_app.density = index
+    session = DashSession(timeline_app.app)
+    session.load()
+    session.executed.clear()
+    cpu_before = session.cpu_ms
+    steps = list(range(max_year - 60 * 10, max_year + 1, 10))
+    for end_year in steps:
+        session.set('time-range-slider', 'drag_value', [min_year, end_year])
+    cpu = session.cpu_ms - cpu_before
+    print(f"  拖动滑块 {len(steps)} 步：执行回调 {dict(session.executed)}，"
+          f"平均每步CPU {cpu / len(steps):.2f}ms（含请求处理）")
+
+
+def synthetic_suggest_entries(count, seed=2):
+    """生成指定数量的联想条目及拼音键：文本取真实标题加序号，拼音由随机音节组成"""
+    sample = load_sample_data()
+    rng = random.Random(seed)
+    syllables = ['qin', 'shi', 'huang', 'han', 'wu', 'di', 'tang', 'song', 'ming', 'qing', 'li', 'bai', 'du',
+                 'fu', 'zhu', 'yuan', 'zhang', 'kong', 'zi', 'sun', 'cao', 'liu', 'bang', 'guo', 'jian', 'zhan']
+    texts = [(event['title'], 'event') for event in sample['events']] + \
+            [(figure['name'], 'figure') for figure in sample['figures']]
+    entries, pinyin_keys = [], {}
+    for i in range(count):
+        text, item_type = texts[i % len(texts)]
+        label = f"{text}{i}"
+        parts = [rng.choice(syllables) for _ in range(rng.randint(2, 4))]
+        entries.append((label, item_type, rng.randint(1, 5)))
+        pinyin_keys[label] = [''.join(parts) + str(i), ''.join(part[0] for part in parts)]
+    return entries, pinyin_keys
+
+
+def bench_suggest(args):
+    """在大规模条目上测量搜索联想的建索引耗时和单次查询耗时"""
+    from suggest import SuggestIndex
+
+    entries, pinyin_keys = synthetic_suggest_entries(args.rows)
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    index = SuggestIndex(entries, pinyin_keys)
+    print(f"条目 {args.rows} 条，建索引耗时 {time.perf_counter() - start:.1f}s，"
+          f"内存增加 {current_rss_mb() - rss_before:.0f}MB")
+
+    # 单字前缀匹配数万条，首字母前缀匹配数十万条，最能体现分层取前 N 条的效果
+    prefixes = ['秦', '李白', '孔子诞生12', 'q', 'qsh', 'zhangli', 'xyz', '唐朝建立99999']
+    print(f"{'前缀':<14}{'中位数(µs)':>12}{'P99(µs)':>10}{'结果数':>8}")
+    for prefix in prefixes:
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results = index.suggest(prefix)
+            samples.append((time.perf_counter() - start) * 1e6)
+        samples.sort()
+        print(f"{prefix:<14}{statistics.median(samples):>12.1f}{samples[int(len(samples) * 0.99)]:>10.1f}"
+              f"{len(results):>8}")
+
+    # 经过 Flask 路由的完整请求（含JSON序列化）
+    import app as timeline_app
+    timeline_app.suggestions = index
+    client = timeline_app.server.test_client()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        client.get('/api/suggest', query_string={'q': 'qsh'})
+    print(f"/api/suggest 完整请求: {(time.perf_counter() - start) * 1000 / args.repeat:.2f}ms/次")
+
+
+def bench_reigns(args):
+    """在大规模事件和人物上测量年份到朝代编号的批量换算吞吐量，以及按朝代筛选的耗时"""
+    import numpy as np
+    from reigns import ReignIndex
+
+    sample = load_sample_data()
+    dynasties = sample['dynasties']
+    index = ReignIndex(dynasties)
+    min_year, max_year = sample['time_range']['min_year'], sample['time_range']['max_year']
+
+    rng = np.random.default_rng(0)
+    years = np.sort(rng.integers(min_year, max_year + 1, args.rows))
+    births = rng.integers(min_year, max_year - 100, args.rows)
+    deaths = births + rng.integers(20, 90, args.rows)
+
+    def naive_resolve(start, end):
+        """逐条记录遍历朝代列表的换算方式，作为对照"""
+        return sum(1 << i for i, dynasty in enumerate(dynasties)
+                   if dynasty['start_year'] <= end and dynasty['end_year'] >= start)
+
+    print(f"记录 {args.rows} 条，朝代 {len(dynasties)} 个")
+    print(f"{'换算':<12}{'逐条遍历(百万条/s)':>20}{'searchsorted(百万条/s)':>24}{'不一致':>8}")
+    for name, starts, ends, resolve in (
+        ('事件年份', years, years, lambda: index.resolve_years(years)),
+        ('人物生卒年', births, deaths, lambda: index.resolve_spans(births, deaths)),
+    ):
+        sample_size = min(args.naive_rows, args.rows)
+        start = time.perf_counter()
+        expected = [naive_resolve(int(a), int(b)) for a, b in zip(starts[:sample_size], ends[:sample_size])]
+        naive_rate = sample_size / (time.perf_counter() - start) / 1e6
+
+        start = time.perf_counter()
+        masks = resolve()
+        rate = args.rows / (time.perf_counter() - start) / 1e6
+        mismatches = sum(int(mask) != value for mask, value in zip(masks[:sample_size], expected))
+        print(f"{name:<12}{naive_rate:>20.2f}{rate:>24.1f}{mismatches:>8}")
+
+    # 按朝代筛选：朝代名称字符串比较、编号位掩码、按起止年份二分查找切片
+    # 字符串对照列：每条事件记为所属朝代中的第一个
+    event_masks = index.resolve_years(years)
+    unique_masks, inverse = np.unique(event_masks, return_inverse=True)
+    names = [dynasties[ids[0]]['id'] if ids else '' for ids in map(index.mask_to_ids, unique_masks)]
+    dynasty_text = np.array(names, dtype=object)[inverse]
+
+    tang = index.position('唐朝')
+    timings = {}
+    for label, query in (
+        ('字符串比较', lambda: np.flatnonzero(dynasty_text == '唐朝')),
+        ('编号位掩码', lambda: np.flatnonzero(event_masks & np.uint64(1 << tang))),
+        ('年份切片', lambda: np.arange(*np.searchsorted(years, [dynasties[tang]['start_year'],
+                                                              dynasties[tang]['end_year'] + 1]))),
+    ):
+        start = time.perf_counter()
+        result = query()
+        timings[label] = ((time.perf_counter() - start) * 1000, len(result))
+    print("唐朝的全部事件: " + "，".join(f"{label} {ms:.1f}ms（{count}条）" for label, (ms, count) in timings.items()))
+
+
+def bench_related(args):
+    """测量相关条目的离线计算耗时和详情面板按ID取出相关条目的耗时"""
+    import numpy as np
+    from related import RelatedIndex, build_related_arrays
+
+    print(f"{'记录数':>10}{'计算耗时(s)':>14}{'内存增加(MB)':>14}{'取出耗时(µs)':>14}")
+    for rows in args.rows:
+        events = list(synthetic_events(rows - rows // 10))
+        figures = list(synthetic_figures(rows // 10))
+        rss_before = current_rss_mb()
+
+        start = time.perf_counter()
+        arrays = build_related_arrays(events, figures)
+        elapsed = time.perf_counter() - start
+        rss = current_rss_mb() - rss_before
+
+        index = RelatedIndex(arrays)
+        rng = random.Random(0)
+        ids = [rng.choice(events)['id'] if rng.random() < 0.9 else rng.choice(figures)['id']
+               for _ in range(args.repeat)]
+        start = time.perf_counter()
+        for record_id in ids:
+            index.related(record_id)
+        lookup = (time.perf_counter() - start) * 1e6 / len(ids)
+
+        print(f"{rows:>10}{elapsed:>14.1f}{rss:>14.0f}{lookup:>14.1f}")
+        del events, figures, arrays, index
+
+    # 实际数据上一次点击生成相关条目列表（含按ID查找记录）
+    import app as timeline_app
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        timeline_app.create_related_list('figure_13')
+    print(f"真实数据详情面板相关条目列表: {(time.perf_counter() - start) * 1e6 / args.repeat:.1f}µs/次")
+
+
+def bench_export_worker(args):
+    """在独立进程中通过导出接口下载全部结果，边读取边采样常驻内存"""
+    import app as timeline_app
+    from storage import SqliteStore
+    from export import export_rows
+
+    timeline_app.store = SqliteStore(os.path.join(args.data_dir, 'timeline.db'))
+    client = timeline_app.server.test_client()
+    url = f'/api/export?format={args.format}'
+    if args.start is not None:
+        url += f'&start={args.start}&end={args.end}'
+
+    base_rss = peak_rss = current_rss_mb()
+    total_bytes = 0
+    start = time.perf_counter()
+    if args.buffered:
+        # 对照：先取出全部记录再一次性生成整个文件（导出接口出现之前的做法）
+        import csv
+        import io
+        year_range = [args.start, args.end] if args.start is not None else None
+        records = list(export_rows(timeline_app.store, year_range))
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(records)
+        total_bytes = len(buffer.getvalue().encode('utf-8'))
+        rows = len(records)
+        peak_rss = current_rss_mb()
+    else:
+        response = client.get(url, buffered=False)
+        rows = 0
+        for count, chunk in enumerate(response.response):
+            total_bytes += len(chunk)
+            rows += chunk.count(b'\n')
+            if count % 100 == 0:
+                peak_rss = max(peak_rss, current_rss_mb())
+        peak_rss = max(peak_rss, current_rss_mb())
+        response.close()
+        if args.format == 'csv':
+            rows -= 1  # 表头
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({'rows': rows, 'bytes': total_bytes, 'seconds': elapsed,
+                      'rss_growth_mb': peak_rss - base_rss}))
+
+
+def bench_export(args):
+    """以 SQLite 后端导出大规模数据，确认常驻内存不随结果条数增长，并测量吞吐量"""
+    from export import format_available
+
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        print(f"事件 {args.rows} 条，人物 {max(args.rows // 10, 1)} 条")
+        build_storage_data(work_dir, args.rows, ['sqlite'])
+
+        scenarios = [(export_format, False) for export_format in args.formats]
+        if args.compare:
+            scenarios.append(('csv', True))
+
+        failed = False
+        print(f"{'格式':>16}{'行数':>10}{'大小(MB)':>10}{'耗时(s)':>10}{'行/秒':>10}{'MB/秒':>8}{'内存增加(MB)':>14}")
+        for export_format, buffered in scenarios:
+            label = export_format + ('（整体生成）' if buffered else '')
+            if not format_available(export_format):
+                print(f"{label:>16}  跳过：缺少依赖")
+                continue
+
+            command = [sys.executable, __file__, 'export-worker', '--data-dir', work_dir, '--format', export_format]
+            if args.start is not None:
+                command += ['--start', str(args.start), '--end', str(args.end)]
+            if buffered:
+                command.append('--buffered')
+            proc = subprocess.run(command, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"{label:>16}  失败（退出码 {proc.returncode}）{proc.stderr.strip()[-200:]}")
+                failed = True
+                continue
+
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            megabytes = result['bytes'] / 2**20
+            print(f"{label:>16}{result['rows']:>10}{megabytes:>10.1f}{result['seconds']:>10.1f}"
+                  f"{result['rows'] / result['seconds']:>10.0f}{megabytes / result['seconds']:>8.1f}"
+                  f"{result['rss_growth_mb']:>14.1f}")
+            if not buffered and result['rss_growth_mb'] > args.max_rss_mb:
+                print(f"{'':>16}  内存增加超过上限 {args.max_rss_mb}MB")
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+# 设备配置：(名称, 视口宽度, 设备像素比)
+IMAGE_DEVICES = [('手机 375px@3x', 375, 3), ('平板 768px@2x', 768, 2), ('桌面 1440px@1x', 1440, 1)]
+
+
+def chosen_variant(entry, viewport_width, dpr):
+    """按 DETAIL_IMAGE_SIZES 的规则模拟浏览器从 srcset 中挑选的缩略图：不小于所需像素宽度的最窄一张"""
+    display_width = viewport_width if viewport_width <= 576 else 480
+    needed = display_width * dpr
+    return next((variant for variant in entry['variants'] if variant['width'] >= needed), entry['variants'][-1])
+
+
+def synthetic_source_images(source_dir, count, size=(2400, 1600), seed=3):
+    """生成带渐变和噪声的大尺寸JPEG原图，接近照片的压缩率"""
+    from PIL import Image
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[None, :, None] + \
+        np.linspace(0, 55, height, dtype=np.float32)[:, None, None]
+    names = []
+    for i in range(count):
+        pixels = gradient + rng.normal(0, 12, (height, width, 3)).astype(np.float32) + rng.integers(0, 40, 3)
+        name = f"source_{i}.jpg"
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(os.path.join(source_dir, name), quality=92)
+        names.append(name)
+    return names
+
+
+def bench_images(args):
+    """缩略图生成的并行加速，以及详情面板图片在各设备上的传输量和估计显示耗时"""
+    from process_images import Image, build_image_manifest
+    from images import load_image_manifest
+
+    manifest = load_image_manifest(data_dir)
+    if Image is None:
+        print("未安装 Pillow，跳过缩略图生成耗时的测量")
+    else:
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+            source_dir = os.path.join(work_dir, 'images')
+            os.makedirs(source_dir)
+            names = synthetic_source_images(source_dir, args.images)
+            print(f"合成原图 {len(names)} 张")
+            for workers in sorted({1, os.cpu_count() or 1}):
+                output_dir = os.path.join(work_dir, f'thumbs_{workers}')
+                start = time.perf_counter()
+                synthetic_manifest, _ = build_image_manifest(names, source_dir, output_dir, workers)
+                print(f"  {workers} 个进程: {time.perf_counter() - start:.1f}s")
+            if not manifest:
+                manifest = synthetic_manifest
+
+    if not manifest:
+        print("没有 data/image_manifest.json，请先运行 process_images.py")
+        return
+
+    # 没有浏览器，按 sizes 规则模拟挑选结果，显示耗时按 往返延迟 + 传输时间 估计
+    originals = sum(entry['bytes'] for entry in manifest.values())
+    print(f"图片 {len(manifest)} 张，带宽 {args.mbps}Mbps，往返延迟 {args.rtt_ms}ms")
+    print(f"{'设备':>16}{'原图(KB)':>12}{'WebP(KB)':>12}{'JPEG(KB)':>12}{'原图显示(ms)':>14}{'WebP显示(ms)':>14}")
+    for label, viewport_width, dpr in IMAGE_DEVICES:
+        webp = [chosen_variant(entry, viewport_width, dpr)['webp_bytes'] for entry in manifest.values()]
+        jpeg = [chosen_variant(entry, viewport_width, dpr)['jpeg_bytes'] for entry in manifest.values()]
+
+        def display_ms(sizes):
+            return args.rtt_ms + statistics.median(sizes) * 8 / (args.mbps * 1000)
+
+        print(f"{label:>16}{originals / len(manifest) / 1024:>12.0f}{statistics.mean(webp) / 1024:>12.0f}"
+              f"{statistics.mean(jpeg) / 1024:>12.0f}"
+              f"{display_ms([entry['bytes'] for entry in manifest.values()]):>14.0f}{display_ms(webp):>14.0f}")
+    print("预取命中时图片已在缓存中，显示耗时只剩解码")
+
+
+# 在 node（V8，与 Chrome 相同的 JavaScript 引擎）中测量 JSON.parse 与 columnar.js 的解码耗时，取中位数
+NODE_PARSE_SCRIPT = """
+const {decodeColumnar} = require(process.argv[1]);
+const fs = require('fs');
+const toBuffer = data => data.buffer.slice(data.byteOffset, data.byteOffset + data.length);
+const json = toBuffer(fs.readFileSync(process.argv[2]));
+const binary = toBuffer(fs.readFileSync(process.argv[3]));
+const repeat = parseInt(process.argv[4]);
+const decoder = new TextDecoder();
+function median(parse) {
+    const timings = [];
+    for (let i = 0; i < repeat; i++) {
+        const start = process.hrtime.bigint();
+        parse();
+        timings.push(Number(process.hrtime.bigint() - start) / 1e6);
+    }
+    return timings.sort((a, b) => a - b)[Math.floor(repeat / 2)];
+}
+console.log(JSON.stringify({
+    json: median(() => JSON.parse(decoder.decode(json))),
+    binary: median(() => decodeColumnar(binary))
+}));
+"""
+
+
+def bench_binary(args):
+    """对比 JSON（原来的 indent=2 格式和紧凑格式）与列式二进制编码的大小、压缩后大小、编码耗时和浏览器端解析耗时"""
+    from columnar import encode_tables, decode_tables
+
+    node = shutil.which('node')
+    if node is None:
+        print("未找到 node，跳过解析耗时的测量")
+
+    sample = load_sample_data()
+    datasets = [('真实数据', sample['events'], sample['figures'])]
+    datasets.extend((f"合成 {rows}", list(synthetic_events(rows)), list(synthetic_figures(max(rows // 10, 1))))
+                    for rows in args.rows)
+
+    print(f"{'数据':>12}{'缩进JSON(KB)':>14}{'gzip':>8}{'JSON(KB)':>10}{'gzip':>8}{'二进制(KB)':>12}{'gzip':>8}{'编码(ms)':>10}"
+          f"{'JSON解析(ms)':>14}{'二进制解析(ms)':>16}")
+    for label, events, figures in datasets:
+        tables = {'events': events, 'figures': figures}
+        indented = json.dumps(tables, ensure_ascii=False, indent=2).encode('utf-8')
+        json_bytes = json.dumps(tables, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        start = time.perf_counter()
+        binary = encode_tables(tables)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        # 编码必须可以无损还原
+        decoded = decode_tables(binary)
+        if any(decoded[name] != [dict(record, dynasty_ids=list(record['dynasty_ids'])) for record in records]
+               for name, records in tables.items()):
+            print(f"{label:>12}  解码结果与原数据不一致")
+            sys.exit(1)
+
+        json_ms = binary_ms = float('nan')
+        if node is not None:
+            with tempfile.TemporaryDirectory() as work_dir:
+                json_path, binary_path = os.path.join(work_dir, 'data.json'), os.path.join(work_dir, 'data.bin')
+                with open(json_path, 'wb') as f:
+                    f.write(json_bytes)
+                with open(binary_path, 'wb') as f:
+                    f.write(binary)
+                proc = subprocess.run([node, '-e', NODE_PARSE_SCRIPT, os.path.join(static_dir, 'columnar.js'),
+                                       json_path, binary_path, str(args.repeat)],
+                                      capture_output=True, text=True, check=True)
+                timings = json.loads(proc.stdout)
+                json_ms, binary_ms = timings['json'], timings['binary']
+
+        print(f"{label:>12}{len(indented) / 1024:>14.0f}{len(gzip.compress(indented)) / 1024:>8.0f}"
+              f"{len(json_bytes) / 1024:>10.0f}{len(gzip.compress(json_bytes)) / 1024:>8.0f}"
+              f"{len(binary) / 1024:>12.0f}{len(gzip.compress(binary)) / 1024:>8.0f}{encode_ms:>10.1f}"
+              f"{json_ms:>14.2f}{binary_ms:>16.2f}")
+
+
+def bench_admission_server(args):
+    """在独立进程中启动应用：固定线程数的线程池（与 gunicorn gthread 一样，空闲线程不足时连接排队）"""
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+    import app as timeline_app
+
+    # 换成较大的合成数据，使时间轴重算的开销明显高于请求处理本身
+    if args.rows:
+        from storage import JsonStore
+        sample = load_sample_data()
+        timeline_app.store = JsonStore({
+            'dynasties': sample['dynasties'], 'events': list(synthetic_events(args.rows)),
+            'figures': list(synthetic_figures(args.rows // 10)), 'time_range': sample['time_range']
+        })
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledServer(BaseWSGIServer):
+        request_queue_size = 1024
+
+        def __init__(self):
+            super().__init__('127.0.0.1', 0, timeline_app.server, handler=QuietHandler)
+            self.pool = ThreadPoolExecutor(args.threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledServer()
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+def admission_payloads(count, seed=5):
+    """时间轴平移（事件、人物两个回调）和详情面板点击的请求体"""
+    import app as timeline_app
+
+    session = DashSession(timeline_app.app)
+    keys = {spec['callback'].__name__: key for key, spec in timeline_app.app.callback_map.items()}
+    rng = random.Random(seed)
+    min_year, max_year = timeline_app.time_range['min_year'], timeline_app.time_range['max_year']
+
+    pans = []
+    for _ in range(count):
+        start_year = rng.randint(min_year, max_year - 300)
+        session.props[('view-range-store', 'data')] = [start_year, start_year + rng.randint(100, 1500)]
+        pans.append([json.dumps(session.payload(keys[name], ['view-range-store.data'])).encode()
+                     for name in ('update_events_timeline', 'update_figures_timeline')])
+
+    clicks = []
+    for event in timeline_app.store.query_events()[:count]:
+        session.props[('events-timeline', 'clickData')] = {'points': [{'customdata': [event['id']]}]}
+        clicks.append(json.dumps(session.payload(keys['update_detail_panel'], ['events-timeline.clickData'])).encode())
+    return pans, clicks
+
+
+def post_callback(port, body, session_id):
+    """发送一次回调请求，返回状态码（连接失败为0）和 Retry-After 秒数"""
+    import http.client
+
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('POST', '/_dash-update-component', body,
+                           {'Content-Type': 'application/json', 'Cookie': f'timeline_session=s{session_id}'})
+        response = connection.getresponse()
+        response.read()
+        return response.status, float(response.getheader('Retry-After') or 0)
+    except OSError:
+        return 0, 0
+    finally:
+        connection.close()
+
+
+def offered_load(port, pans, clicks, pan_rate, args, seed, client_merge):
+    """开环施加负载：平移和点击按泊松过程到达，时间从计划到达时刻算起（不受客户端排队影响）
+
+    client_merge 为真时时间轴请求按 assets/admission.js 的方式发送：每个会话的每个时间轴同时只发送一个请求，
+    期间的平移只保留最新的一个，其余当作 204；收到 429 且没有更新的平移时按 Retry-After 重试。
+    返回 (类别, 会话, 时间轴序号, 计划时刻, 完成时刻, 状态码, 重试次数) 列表，点击的时间轴序号为 None
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    rng = random.Random(seed)
+    arrivals = []
+    for kind, rate in (('pan', pan_rate), ('click', args.click_rate)):
+        t = rng.expovariate(rate)
+        while t < args.seconds:
+            arrivals.append((t, kind, rng.randrange(args.sessions)))
+            t += rng.expovariate(rate)
+    arrivals.sort()
+
+    results = []
+    lock = threading.Lock()
+    pending = {}  # (会话, 时间轴序号) -> 等待发送的最新平移 (计划时刻, 请求体)；键存在表示有请求在发送
+
+    def send(kind, session_id, layer, scheduled, body):
+        status, _ = post_callback(port, body, session_id)
+        results.append((kind, session_id, layer, scheduled, time.perf_counter(), status, 0))
+
+    def send_merged(session_id, layer, scheduled, body):
+        key = (session_id, layer)
+        retries = 0
+        while True:
+            status, retry_after = post_callback(port, body, session_id)
+            if status == 429 and pending[key] is None:
+                time.sleep(retry_after)
+            with lock:
+                if status == 429 and pending[key] is None:
+                    retries += 1
+                    continue
+                results.append(('timeline', session_id, layer, scheduled, time.perf_counter(),
+                                204 if status == 429 else status, retries))
+                if pending[key] is None:
+                    del pending[key]
+                    return
+                (scheduled, body), pending[key], retries = pending[key], None, 0
+
+    def submit_timeline(executor, session_id, layer, scheduled, body):
+        if not client_merge:
+            executor.submit(send, 'timeline', session_id, layer, scheduled, body)
+            return
+        key = (session_id, layer)
+        with lock:
+            if key in pending:
+                if pending[key] is not None:
+                    results.append(('timeline', session_id, layer, pending[key][0], time.perf_counter(), 204, 0))
+                pending[key] = (scheduled, body)
+                return
+            pending[key] = None
+        executor.submit(send_merged, session_id, layer, scheduled, body)
+
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        origin = time.perf_counter()
+        for offset, kind, session_id in arrivals:
+            scheduled = origin + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if kind == 'pan':
+                for layer, body in enumerate(rng.choice(pans)):
+                    submit_timeline(executor, session_id, layer, scheduled, body)
+            else:
+                executor.submit(send, 'click', session_id, None, scheduled, rng.choice(clicks))
+    return results
+
+
+def display_latencies(results):
+    """每次平移后对应时间轴显示出该次或更新状态的耗时（毫秒），以及最终停留在过期状态的时间轴数
+
+    被更新的请求取代（204）的平移按取代它的请求完成的时刻计算；之后没有任何请求成功的平移
+    从未显示出来，耗时记为无穷大。同一会话同一时间轴最后一次平移从未显示时，该时间轴停留在过期状态
+    """
+    groups = {}
+    for kind, session_id, layer, scheduled, completed, status, _ in results:
+        if kind == 'timeline':
+            groups.setdefault((session_id, layer), []).append((scheduled, completed, status))
+
+    latencies, stale = [], 0
+    for requests in groups.values():
+        requests.sort()
+        shown = float('inf')
+        for i, (scheduled, completed, status) in enumerate(reversed(requests)):
+            if status == 200:
+                shown = min(shown, completed)
+            latencies.append((shown - scheduled) * 1000)
+            if i == 0 and shown == float('inf'):
+                stale += 1
+    return latencies, stale
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * q / 100), len(values) - 1)]
+
+
+def bench_admission(args):
+    """教室场景：多个会话同时平移时间轴，负载逐级翻倍，对比准入控制开启前后从平移到显示的延迟
+
+    开启时客户端同时按 assets/admission.js 合并请求、重试 429；关闭时每次平移都发送请求（原来的 Dash 客户端）。
+    204、429 和失败的请求不单独计算延迟：每次平移都要等到该次或之后的请求成功才算显示，从未显示的计为无穷大
+    """
+    pans, clicks = admission_payloads(50)
+    capacity = None
+    print(f"事件 {args.rows} 条，人物 {args.rows // 10} 条，{args.sessions} 个会话，"
+          f"点击 {args.click_rate}/秒，每级 {args.seconds}s，服务线程 {args.threads}")
+
+    for enabled in (False, True):
+        proc = subprocess.Popen([sys.executable, __file__, 'admission-server', '--threads', str(args.threads),
+                                 '--rows', str(args.rows)],
+                                stdout=subprocess.PIPE, text=True,
+                                env=dict(os.environ, TIMELINE_ADMISSION='1' if enabled else '0'))
+        try:
+            port = int(proc.stdout.readline())
+
+            # 关闭准入控制时以单个会话顺序平移估计服务能力（每秒可完成的平移次数），两种配置使用相同的负载
+            if capacity is None:
+                start = time.perf_counter()
+                for i in range(args.calibrate):
+                    for body in pans[i % len(pans)]:
+                        post_callback(port, body, 'calibrate')
+                capacity = args.calibrate / (time.perf_counter() - start)
+                print(f"单会话顺序平移 {capacity:.1f} 次/秒")
+
+            print(f"准入控制{'开启' if enabled else '关闭'}")
+            print(f"{'负载':>6}{'平移/秒':>9}{'显示p50':>9}{'p99(ms)':>9}{'未显示':>8}{'停在过期':>10}"
+                  f"{'200':>6}{'204':>6}{'失败':>6}{'429重试':>9}{'点击p50':>9}{'p99(ms)':>9}{'失败':>6}")
+            for i, multiple in enumerate(args.loads):
+                results = offered_load(port, pans, clicks, multiple * capacity, args, seed=i, client_merge=enabled)
+                latencies, stale = display_latencies(results)
+                statuses = [r[5] for r in results if r[0] == 'timeline']
+                click = [r for r in results if r[0] == 'click']
+                click_ms = [(r[4] - r[3]) * 1000 for r in click if r[5] == 200]
+                print(f"{multiple:>5}x{multiple * capacity:>9.0f}{percentile(latencies, 50):>9.0f}"
+                      f"{percentile(latencies, 99):>9.0f}{latencies.count(float('inf')):>8}{stale:>10}"
+                      f"{statuses.count(200):>6}{statuses.count(204):>6}{len(statuses) - statuses.count(200) - statuses.count(204):>6}"
+                      f"{sum(r[6] for r in results):>9}"
+                      f"{percentile(click_ms, 50):>9.0f}{percentile(click_ms, 99):>9.0f}{len(click) - len(click_ms):>6}")
+                # 等待上一级的积压处理完
+                time.sleep(1)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def filter_with_comprehensions(events, year_range, search_term, category, min_importance):
+    """原来 update_timelines 中逐条件链式列表推导的筛选方式，作为对照"""
+    result = [event for event in events if year_range[0] <= event['year'] <= year_range[1]]
+    if search_term:
+        search_term = search_term.lower()
+        result = [event for event in result if
+                  search_term in event['title'].lower() or
+                  search_term in event['description'].lower() or
+                  search_term in event['dynasty'].lower()]
+    if category and category != 'all':
+        result = [event for event in result if event['category'] == category]
+    if min_importance:
+        result = [event for event in result if event['importance'] >= min_importance]
+    return result
+
+
+def bench_filters(args):
+    """对比预计算掩码与链式列表推导在大规模事件上的筛选耗时"""
+    from storage import JsonStore
+
+    sample = load_sample_data()
+    events = list(synthetic_events(args.rows))
+
+    start = time.perf_counter()
+    store = JsonStore({'dynasties': sample['dynasties'], 'events': events, 'figures': [],
+                       'time_range': sample['time_range']})
+    print(f"事件 {args.rows} 条，建立掩码耗时 {time.perf_counter() - start:.2f}s")
+
+    min_year, max_year = sample['time_range']['min_year'], sample['time_range']['max_year']
+    cases = {
+        '全部范围+分类+重要性': ([min_year, max_year], None, '军事', 4),
+        '百年范围+分类+重要性': ([600, 700], None, '文化', 3),
+        '百年范围+搜索': ([600, 700], '秦始皇', 'all', 1),
+    }
+
+    print(f"{'条件':<16}{'列表推导(ms)':>14}{'掩码(ms)':>12}{'结果数':>10}")
+    for name, (year_range, search_term, category, importance) in cases.items():
+        timings = {}
+        for label, query in (
+            ('old', lambda: filter_with_comprehensions(events, year_range, search_term, category, importance)),
+            ('new', lambda: store.query_events(year_range, search_term, category, importance)),
+        ):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = query()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = (statistics.median(samples), result)
+
+        # 两种方式的结果必须一致
+        assert [event['id'] for event in timings['old'][1]] == [event.id for event in timings['new'][1]], name
+        print(f"{name:<16}{timings['old'][0]:>14.2f}{timings['new'][0]:>12.2f}{len(timings['new'][1]):>10}")
+
+
+def legacy_events_figure(events):
+    """原来每个事件一条轨迹的构建方式，作为对照"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for event in sorted(events, key=lambda x: x['importance'], reverse=True):
+        fig.add_trace(go.Scatter(
+            x=[event['year']], y=[0.5], mode='markers',
+            marker=dict(size=event['importance'] * 8, symbol='diamond', opacity=0.8),
+            name=event['title'], text=f"{event['title']} ({event['year']}年)<br>{event['description']}",
+            hoverinfo="text", customdata=[event['id']], showlegend=False
+        ))
+    return fig
+
+
+def bench_render(args):
+    """对比逐条轨迹与合并轨迹（超过阈值改用WebGL）的轨迹数、负载大小和构建耗时"""
+    import plotly.io as pio
+    import figure_builder
+    import app as timeline_app
+
+    print(f"WebGL 阈值: {figure_builder.WEBGL_THRESHOLD}")
+    print(f"{'条目数':>8}{'方式':>10}{'轨迹数':>8}{'轨迹类型':>12}{'负载KB':>10}{'构建(ms)':>10}{'序列化(ms)':>12}")
+    for rows in args.rows:
+        events = list(synthetic_events(rows))
+        figures = list(synthetic_figures(rows))
+
+        builders = [('事件/逐条', lambda: legacy_events_figure(events))] if rows <= args.legacy_max else []
+        builders += [
+            ('事件/合并', lambda: timeline_app.create_events_timeline(events)),
+            ('人物/合并', lambda: timeline_app.create_figures_timeline(figures)),
+        ]
+        for name, build in builders:
+            start = time.perf_counter()
+            fig = build()
+            build_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            payload = pio.to_json(fig, validate=False)
+            serialize_ms = (time.perf_counter() - start) * 1000
+
+            traces = fig.data if hasattr(fig, 'data') else fig['data']
+            trace_types = sorted({trace['type'] for trace in traces})
+            print(f"{rows:>8}{name:>10}{len(traces):>8}{','.join(trace_types):>12}"
+                  f"{len(payload) / 1024:>10.0f}{build_ms:>10.0f}{serialize_ms:>12.0f}")
+
+            # 点击详情面板依赖每个点的 customdata，合并后不能丢失
+            if name.endswith('合并'):
+                ids = {point[0] for trace in traces for point in trace.get('customdata') or [] if point}
+                expected = {item['id'] for item in (events if name.startswith('事件') else figures)}
+                assert ids == expected, name
+
+
+def bench_records_worker(args):
+    """在独立进程中按指定方式载入JSON，测量常驻内存"""
+    import gc
+
+    from storage import JsonStore
+
+    base_rss = current_rss_mb()
+    json_path = os.path.join(args.data_dir, 'timeline_data.json')
+    if args.mode == 'dicts':
+        # 原来的方式：字典列表，外加按ID查找用的字典
+        with open(json_path, 'r', encoding='utf-8') as f:
+            timeline_data = json.load(f)
+        events, figures = timeline_data['events'], timeline_data['figures']
+        by_id = ({event['id']: event for event in events}, {figure['id']: figure for figure in figures})
+    else:
+        store = JsonStore.from_file(json_path)
+    gc.collect()
+
+    print(json.dumps({'rss_mb': current_rss_mb() - base_rss}))
+
+
+def bench_records(args):
+    """对比字典记录与 __slots__ 记录在大规模数据下的内存占用"""
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work_dir:
+        build_storage_data(work_dir, args.rows, ['json'])
+        total = args.rows + max(args.rows // 10, 1)
+        print(f"事件 {args.rows} 条，人物 {total - args.rows} 条")
+
+        for mode, label in (('dicts', '字典'), ('records', '__slots__记录+掩码')):
+            proc = subprocess.run(
+                [sys.executable, __file__, 'records-worker', '--mode', mode, '--data-dir', work_dir],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"  {label}: 失败 {proc.stderr.strip()[-200:]}")
+                continue
+            rss = json.loads(proc.stdout.strip().splitlines()[-1])['rss_mb']
+            print(f"  {label}: 常驻内存 {rss:.0f}MB，每条记录 {rss * 2**20 / total:.0f} 字节")
+
+
+def bench_figures(args):
+    """对比 go.Figure 和直接生成字典两种方式每次回调的构建和序列化耗时（输出一致性见 tests/test_figure_builder.py）"""
+    import plotly.io as pio
+    import plotly.graph_objects as go
+    import figure_builder
+    import app as timeline_app
+
+    full_range = [timeline_app.time_range['min_year'], timeline_app.time_range['max_year']]
+    print(f"序列化引擎: {pio.json.config.default_engine}（实际使用 {'orjson' if figure_builder.orjson else 'json'}）")
+
+    print(f"{'条目数':>8}{'graph_objects(ms)':>20}{'字典(ms)':>12}{'负载KB':>10}")
+    for rows in args.rows:
+        events = list(synthetic_events(rows))
+        figures = list(synthetic_figures(rows))
+        xaxis_range = full_range
+
+        def build_dicts():
+            return (figure_builder.build_dynasty_figure(timeline_app.dynasties, full_range, xaxis_range),
+                    figure_builder.build_events_figure(events, xaxis_range),
+                    figure_builder.build_figures_figure(figures, xaxis_range))
+
+        # 原来的方式：相同内容经过 go.Figure 校验后再序列化
+        def graph_objects_path():
+            return [pio.to_json(go.Figure(fig)) for fig in build_dicts()]
+
+        def dict_path():
+            return [pio.to_json(fig, validate=False) for fig in build_dicts()]
+
+        timings = {}
+        for name, path in (('go', graph_objects_path), ('dict', dict_path)):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                payload = path()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[name] = statistics.median(samples)
+
+        size = sum(len(part) for part in payload) / 1024
+        print(f"{rows:>8}{timings['go']:>20.1f}{timings['dict']:>12.1f}{size:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='中国历史年表性能基准')
+    subparsers = parser.add_subparsers(dest='scenario', required=True)
+
+    shards_parser = subparsers.add_parser('shards', help='静态版本分片加载的传输量')
+    shards_parser.add_argument('--start', type=int, default=-300)
+    shards_parser.add_argument('--end', type=int, default=-200)
+    shards_parser.add_argument('--repeat', type=int, default=200)
+    shards_parser.set_defaults(func=bench_shards)
+
+    storage_parser = subparsers.add_parser('storage', help='JSON与SQLite数据后端的内存和查询延迟')
+    storage_parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000])
+    storage_parser.add_argument('--backends', default='json,sqlite')
+    storage_parser.add_argument('--window', type=int, default=100, help='查询的时间窗口（年）')
+    storage_parser.add_argument('--repeat', type=int, default=20)
+    storage_parser.add_argument('--work-dir', default=None, help='生成临时数据的目录')
+    storage_parser.set_defaults(func=bench_storage)
+
+    worker_parser = subparsers.add_parser('storage-worker')
+    worker_parser.add_argument('--backend', required=True)
+    worker_parser.add_argument('--data-dir', required=True)
+    worker_parser.add_argument('--window', type=int, default=100)
+    worker_parser.add_argument('--repeat', type=int, default=20)
+    worker_parser.set_defaults(func=bench_storage_worker)
+
+    filters_parser = subparsers.add_parser('filters', help='预计算掩码与列表推导的筛选耗时')
+    filters_parser.add_argument('--rows', type=int, default=1_000_000)
+    filters_parser.add_argument('--repeat', type=int, default=5)
+    filters_parser.set_defaults(func=bench_filters)
+
+    render_parser = subparsers.add_parser('render', help='时间轴图表的轨迹数、负载大小和构建耗时')
+    render_parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    render_parser.add_argument('--legacy-max', type=int, default=1000, help='逐条轨迹对照的最大条目数')
+    render_parser.set_defaults(func=bench_render)
+
+    records_parser = subparsers.add_parser('records', help='字典记录与 __slots__ 记录的内存占用')
+    records_parser.add_argument('--rows', type=int, default=1_000_000)
+    records_parser.add_argument('--work-dir', default=None)
+    records_parser.set_defaults(func=bench_records)
+
+    records_worker_parser = subparsers.add_parser('records-worker')
+    records_worker_parser.add_argument('--mode', choices=['dicts', 'records'], required=True)
+    records_worker_parser.add_argument('--data-dir', required=True)
+    records_worker_parser.set_defaults(func=bench_records_worker)
+
+    figures_parser = subparsers.add_parser('figures', help='图表字典与 graph_objects 的构建和序列化耗时')
+    figures_parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    figures_parser.add_argument('--repeat', type=int, default=5)
+    figures_parser.set_defaults(func=bench_figures)
+
+    layers_parser = subparsers.add_parser('layers', help='按依赖拆分的时间轴回调在脚本化会话中的开销')
+    layers_parser.add_argument('--rows', type=int, default=20000)
+    layers_parser.add_argument('--repeat', type=int, default=5)
+    layers_parser.set_defaults(func=bench_layers)
+
+    density_parser = subparsers.add_parser('density', help='前缀和与掩码扫描的范围计数耗时')
+    density_parser.add_argument('--rows', type=int, default=10_000_000)
+    density_parser.add_argument('--queries', type=int, default=10000)
+    density_parser.set_defaults(func=bench_density)
+
+    suggest_parser = subparsers.add_parser('suggest', help='搜索联想的建索引和查询耗时')
+    suggest_parser.add_argument('--rows', type=int, default=1_000_000)
+    suggest_parser.add_argument('--repeat', type=int, default=1000)
+    suggest_parser.set_defaults(func=bench_suggest)
+
+    reigns_parser = subparsers.add_parser('reigns', help='年份到朝代编号的批量换算吞吐量')
+    reigns_parser.add_argument('--rows', type=int, default=10_000_000)
+    reigns_parser.add_argument('--naive-rows', type=int, default=200_000, help='逐条遍历对照的记录数')
+    reigns_parser.set_defaults(func=bench_reigns)
+
+    related_parser = subparsers.add_parser('related', help='相关条目的离线计算和取出耗时')
+    related_parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    related_parser.add_argument('--repeat', type=int, default=10000)
+    related_parser.set_defaults(func=bench_related)
+
+    export_parser = subparsers.add_parser('export', help='导出接口的吞吐量和常驻内存上限')
+    export_parser.add_argument('--rows', type=int, default=1_000_000)
+    export_parser.add_argument('--formats', nargs='+', default=['csv', 'ndjson', 'xlsx'])
+    export_parser.add_argument('--start', type=int, default=None, help='导出的起始年份，默认全部')
+    export_parser.add_argument('--end', type=int, default=None)
+    export_parser.add_argument('--max-rss-mb', type=float, default=64, help='流式导出允许的内存增加上限')
+    export_parser.add_argument('--compare', action='store_true', help='同时测量一次性生成整个CSV的内存')
+    export_parser.add_argument('--work-dir', default=None, help='生成临时数据的目录')
+    export_parser.set_defaults(func=bench_export)
+
+    export_worker_parser = subparsers.add_parser('export-worker')
+    export_worker_parser.add_argument('--data-dir', required=True)
+    export_worker_parser.add_argument('--format', required=True)
+    export_worker_parser.add_argument('--start', type=int, default=None)
+    export_worker_parser.add_argument('--end', type=int, default=None)
+    export_worker_parser.add_argument('--buffered', action='store_true')
+    export_worker_parser.set_defaults(func=bench_export_worker)
+
+    images_parser = subparsers.add_parser('images', help='缩略图生成耗时和详情面板图片的传输量')
+    images_parser.add_argument('--images', type=int, default=48, help='合成原图的数量')
+    images_parser.add_argument('--mbps', type=float, default=1.6, help='估计显示耗时所用的带宽')
+    images_parser.add_argument('--rtt-ms', type=float, default=150, help='估计显示耗时所用的往返延迟')
+    images_parser.add_argument('--work-dir', default=None, help='生成临时数据的目录')
+    images_parser.set_defaults(func=bench_images)
+
+    binary_parser = subparsers.add_parser('binary', help='JSON与列式二进制编码的大小和解析耗时')
+    binary_parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    binary_parser.add_argument('--repeat', type=int, default=7)
+    binary_parser.set_defaults(func=bench_binary)
+
+    admission_parser = subparsers.add_parser('admission', help='多会话同时平移时准入控制对 p99 延迟的影响')
+    admission_parser.add_argument('--loads', type=float, nargs='+', default=[1, 2, 4, 8, 16],
+                                  help='施加的平移负载，为顺序平移速率的倍数')
+    admission_parser.add_argument('--rows', type=int, default=100000, help='合成事件数，0 为使用真实数据')
+    admission_parser.add_argument('--sessions', type=int, default=30)
+    admission_parser.add_argument('--click-rate', type=float, default=2, help='详情面板点击（次/秒）')
+    admission_parser.add_argument('--seconds', type=float, default=5, help='每级负载的持续时间')
+    admission_parser.add_argument('--threads', type=int, default=24, help='服务端线程数（与 Procfile 一致）')
+    admission_parser.add_argument('--clients', type=int, default=400, help='客户端并发连接上限')
+    admission_parser.add_argument('--calibrate', type=int, default=30)
+    admission_parser.set_defaults(func=bench_admission)
+
+    admission_server_parser = subparsers.add_parser('admission-server')
+    admission_server_parser.add_argument('--threads', type=int, default=24)
+    admission_server_parser.add_argument('--rows', type=int, default=0)
+    admission_server_parser.set_defaults(func=bench_admission_server)
+
+    coalesce_parser = subparsers.add_parser('coalesce', help='回放交互记录，统计实际执行的回调次数')
+    coalesce_parser.set_defaults(func=bench_coalesce)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 回调请求合并
+同一会话对同一回调的新请求到达后，放弃仍在计算的旧请求，只计算最新状态
+"""
+
+import uuid
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import request
+from dash.exceptions import PreventUpdate
+
+SESSION_COOKIE = 'timeline_session'
+
+
+def init_session_cookie(server):
+    """为每个浏览器会话分配一个ID，保存在Cookie中"""
+    @server.after_request
+    def set_session_cookie(response):
+        if SESSION_COOKIE not in request.cookies:
+            response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+        return response
+
+
+def current_session_id():
+    """返回当前请求所属的会话ID；没有Cookie时返回 None
+    （部署在反向代理之后时客户端地址都是代理的地址，不能用来区分会话）"""
+    return request.cookies.get(SESSION_COOKIE)
+
+
+class CallbackCoalescer:
+    """按 (回调名, 会话ID) 记录最新请求的序号，过期的请求在检查点处放弃；
+    无法确定会话的请求不参与合并，总是完整计算"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._seq = itertools.count(1)
+        self.stats = Counter()
+
+    def begin(self, name, session_id=None):
+        """登记一次新请求，返回用于后续检查的令牌；没有会话ID时返回 None"""
+        session_id = session_id or current_session_id()
+        if session_id is None:
+            return None
+        key = (name, session_id)
+        with self._lock:
+            seq = next(self._seq)
+            self._latest[key] = seq
+            self.stats['started'] += 1
+        return key, seq
+
+    def is_stale(self, token):
+        """同一会话是否已有更新的请求"""
+        if token is None:
+            return False
+        key, seq = token
+        with self._lock:
+            return self._latest.get(key) != seq
+
+    def check(self, token):
+        """检查点：请求已过期时放弃计算，Dash 会把它当作不更新处理"""
+        if self.is_stale(token):
+            with self._lock:
+                self.stats['dropped'] += 1
+            raise PreventUpdate
+
+    def finish(self, token):
+        """请求结束（无论是否完成），最新请求结束后清除该会话的记录"""
+        if token is None:
+            return
+        key, seq = token
+        with self._lock:
+            if self._latest.get(key) == seq:
+                del self._latest[key]
+
+    @contextmanager
+    def track(self, name):
+        """登记请求并在结束时清除记录（包括放弃和出错的情况）：
+            with coalescer.track('update_events_timeline') as token:
+                ...
+                coalescer.check(token)
+        """
+        token = self.begin(name)
+        try:
+            yield token
+            with self._lock:
+                self.stats['completed'] += 1
+        finally:
+            self.finish(token)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 列式二进制编码
+把事件和人物按列编码为定长类型数组，重复的朝代、分类等字符串用字典编码，
+浏览器端用 static_version/columnar.js 直接在 ArrayBuffer 上解码
+
+格式（小端序）：
+    'TLC1' | uint32 头部长度 | 头部JSON（UTF-8，补齐到8字节） | 各列缓冲区（每个都从8字节边界开始）
+头部记录每张表的行数、各列的类型和字典，以及全部缓冲区的字节数；缓冲区按表、列的顺序依次排列，
+每列占用的缓冲区个数由类型决定，因此不必逐个记录偏移。
+
+列类型：
+    int   整数，按取值范围选用最窄的 int8/uint8/int16/uint16/int32
+    id    event_12 形式的ID，只保存序号，头部记录前缀
+    dict  字典编码的字符串，字典（可含 null）在头部，数据为编号
+    utf8  字符串，依次为 n+1 个偏移和拼接后的UTF-8字节；偏移以UTF-16码元计，
+          浏览器整体解码一次后按偏移截取子串；含 None 时（nullable 为真）最前面另有一列 0/1 标记
+    list  整数列表（如 dynasty_ids），依次为 n+1 个偏移和拼接后的元素
+"""
+
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'TLC1'
+ALIGNMENT = 8
+
+# 各表的列：(字段名, 类型)
+EVENT_SCHEMA = [
+    ('id', 'id'), ('year', 'int'), ('title', 'utf8'), ('description', 'utf8'), ('dynasty', 'dict'),
+    ('importance', 'int'), ('category', 'dict'), ('image_url', 'utf8'), ('dynasty_ids', 'list'),
+]
+FIGURE_SCHEMA = [
+    ('id', 'id'), ('name', 'utf8'), ('birth_year', 'int'), ('death_year', 'int'), ('dynasty', 'dict'),
+    ('description', 'utf8'), ('importance', 'int'), ('image_url', 'utf8'), ('dynasty_ids', 'list'),
+]
+SCHEMAS = {'events': EVENT_SCHEMA, 'figures': FIGURE_SCHEMA}
+
+# 各表记录的 type 字段（与 timeline_data.json 一致）
+RECORD_TYPES = {'events': 'event', 'figures': 'figure'}
+
+# 整数列可选的类型，按宽度从窄到宽
+INT_DTYPES = ['int8', 'uint8', 'int16', 'uint16', 'int32']
+
+
+def narrowest_dtype(values):
+    """能容纳全部取值的最窄整数类型"""
+    if len(values) == 0:
+        return 'uint8'
+    low, high = int(values.min()), int(values.max())
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    raise ValueError(f"整数超出 int32 范围: {low}..{high}")
+
+
+class _Body:
+    """按8字节对齐依次追加缓冲区，记录每个缓冲区的字节数"""
+
+    def __init__(self):
+        self.parts = []
+        self.lengths = []
+
+    def append(self, data):
+        data = data.astype(data.dtype.newbyteorder('<'), copy=False).tobytes() \
+            if isinstance(data, np.ndarray) else bytes(data)
+        self.lengths.append(len(data))
+        self.parts.append(data + b'\0' * (-len(data) % ALIGNMENT))
+
+
+def _encode_column(body, kind, values):
+    """追加一列的缓冲区，返回写入头部的列说明（缓冲区位置不记录）"""
+    if kind == 'int':
+        array = np.asarray(values, dtype=np.int64)
+        dtype = narrowest_dtype(array)
+        body.append(array.astype(dtype))
+        return {'dtype': dtype}
+
+    if kind == 'id':
+        prefix = values[0].rsplit('_', 1)[0] + '_' if values else ''
+        body.append(np.array([int(value[len(prefix):]) for value in values], dtype=np.int32))
+        return {'prefix': prefix}
+
+    if kind == 'dict':
+        dictionary = list(dict.fromkeys(values))
+        positions = {value: i for i, value in enumerate(dictionary)}
+        dtype = narrowest_dtype(np.array([0, max(len(dictionary) - 1, 0)]))
+        body.append(np.array([positions[value] for value in values], dtype=dtype))
+        return {'dtype': dtype, 'dictionary': dictionary}
+
+    if kind == 'utf8':
+        column = {}
+        if any(value is None for value in values):
+            column['nullable'] = True
+            body.append(np.array([value is None for value in values], dtype=np.uint8))
+            values = ['' if value is None else value for value in values]
+        offsets = np.zeros(len(values) + 1, dtype=np.uint32)
+        # 以 UTF-16 码元计：基本多文种平面以外的字符占两个
+        np.cumsum([len(value.encode('utf-16-le')) // 2 for value in values], out=offsets[1:])
+        body.append(offsets)
+        body.append(''.join(values).encode('utf-8'))
+        return column
+
+    if kind == 'list':
+        offsets = np.zeros(len(values) + 1, dtype=np.uint32)
+        np.cumsum([len(value) for value in values], out=offsets[1:])
+        flat = np.array([item for value in values for item in value], dtype=np.int64)
+        dtype = narrowest_dtype(flat)
+        body.append(offsets)
+        body.append(flat.astype(dtype))
+        return {'dtype': dtype}
+
+    raise ValueError(f"未知的列类型: {kind}")
+
+
+def encode_tables(tables):
+    """tables 为 表名 -> 记录序列（字典或记录对象），表名须在 SCHEMAS 中；返回编码后的字节串"""
+    body = _Body()
+    header = {'tables': {}}
+    for name, records in tables.items():
+        records = list(records)
+        columns = []
+        for field, kind in SCHEMAS[name]:
+            column = {'name': field, 'type': kind}
+            column.update(_encode_column(body, kind, [record[field] for record in records]))
+            columns.append(column)
+        header['tables'][name] = {'rows': len(records), 'type': RECORD_TYPES[name], 'columns': columns}
+    header['buffers'] = body.lengths
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header_bytes += b' ' * (-(len(MAGIC) + 4 + len(header_bytes)) % ALIGNMENT)
+    return b''.join([MAGIC, struct.pack('<I', len(header_bytes)), header_bytes] + body.parts)
+
+
+def decode_tables(payload):
+    """encode_tables 的逆过程，返回 表名 -> 字典列表（用于校验和基准测试）"""
+    if payload[:4] != MAGIC:
+        raise ValueError("不是列式编码的数据")
+    header_length = struct.unpack_from('<I', payload, 4)[0]
+    header = json.loads(payload[8:8 + header_length])
+    buffers = iter(header['buffers'])
+    position = 8 + header_length
+
+    def buffer(dtype=np.uint8):
+        """按顺序取出下一个缓冲区"""
+        nonlocal position
+        length = next(buffers)
+        array = np.frombuffer(payload, dtype=np.dtype(dtype).newbyteorder('<'),
+                              count=length // np.dtype(dtype).itemsize, offset=position)
+        position += length + (-length % ALIGNMENT)
+        return array
+
+    result = {}
+    for name, table in header['tables'].items():
+        decoded = {}
+        for column in table['columns']:
+            kind = column['type']
+            if kind == 'int':
+                values = buffer(column['dtype']).tolist()
+            elif kind == 'id':
+                values = [column['prefix'] + str(num) for num in buffer(np.int32).tolist()]
+            elif kind == 'dict':
+                dictionary = column['dictionary']
+                values = [dictionary[code] for code in buffer(column['dtype']).tolist()]
+            elif kind == 'utf8':
+                nulls = buffer().tolist() if column.get('nullable') else None
+                offsets = buffer(np.uint32).tolist()
+                text = bytes(buffer()).decode('utf-8').encode('utf-16-le')
+                values = [text[offsets[i] * 2:offsets[i + 1] * 2].decode('utf-16-le') for i in range(table['rows'])]
+                if nulls:
+                    values = [None if null else value for null, value in zip(nulls, values)]
+            else:
+                offsets = buffer(np.uint32).tolist()
+                items = buffer(column['dtype']).tolist()
+                values = [items[offsets[i]:offsets[i + 1]] for i in range(table['rows'])]
+            decoded[column['name']] = values
+        decoded['type'] = [table['type']] * table['rows']
+        result[name] = [dict(zip(decoded, row)) for row in zip(*decoded.values())]
+    return result
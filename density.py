@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 条目密度前缀和
+按年份预先累计事件和人物数量，任意时间范围内的条目数只需两次数组取值
+"""
+
+import os
+import math
+
+import numpy as np
+
+# 重要性等级上限，累计数组的第二维按“重要性 >= k”存放，k = 0 表示不限
+MAX_IMPORTANCE = 5
+
+
+def cumulative_counts(years, importance, groups, n_groups, min_year, n_years):
+    """返回形状为 (分组数, MAX_IMPORTANCE + 1, 年数 + 1) 的累计数组
+
+    result[g, k, i] 为分组 g 中重要性不低于 k、年份早于 min_year + i 的条目数
+    """
+    year_index = np.clip(np.asarray(years, dtype=np.int64) - min_year, 0, n_years - 1)
+    importance = np.clip(np.asarray(importance, dtype=np.int64), 0, MAX_IMPORTANCE)
+    levels = MAX_IMPORTANCE + 1
+
+    # 一次 bincount 统计每个 (分组, 重要性, 年份) 的条目数
+    flat = (np.asarray(groups, dtype=np.int64) * levels + importance) * n_years + year_index
+    counts = np.bincount(flat, minlength=n_groups * levels * n_years).reshape(n_groups, levels, n_years)
+
+    # 重要性方向从高到低累加得到“>= k”，年份方向累加得到前缀和
+    counts = np.flip(np.flip(counts, axis=1).cumsum(axis=1), axis=1)
+    result = np.zeros((n_groups, levels, n_years + 1), dtype=np.int64)
+    np.cumsum(counts, axis=2, out=result[:, :, 1:])
+    return result
+
+
+def build_density_arrays(events, figures, time_range):
+    """根据事件和人物（字典或记录）生成密度前缀和数组，供 DensityIndex 使用"""
+    min_year, max_year = time_range['min_year'], time_range['max_year']
+    n_years = max_year - min_year + 1
+
+    # 分类按首次出现的顺序编号，0 号分组为全部分类
+    categories = list(dict.fromkeys(event['category'] for event in events))
+    category_ids = {category: i + 1 for i, category in enumerate(categories)}
+    event_counts = cumulative_counts(
+        [event['year'] for event in events], [event['importance'] for event in events],
+        [category_ids[event['category']] for event in events], len(categories) + 1, min_year, n_years
+    )
+    event_counts[0] = event_counts[1:].sum(axis=0)
+
+    # 人物按生卒年与时间范围重叠计数：出生不晚于终点的人数减去在起点之前已去世的人数
+    figure_importance = [figure['importance'] for figure in figures]
+    no_groups = np.zeros(len(figures), dtype=np.int64)
+    births = cumulative_counts([figure['birth_year'] for figure in figures], figure_importance,
+                               no_groups, 1, min_year, n_years)[0]
+    deaths = cumulative_counts([figure['death_year'] for figure in figures], figure_importance,
+                               no_groups, 1, min_year, n_years)[0]
+
+    return {
+        'min_year': np.int64(min_year),
+        'categories': np.array(categories, dtype=str),
+        'events': event_counts,
+        'figure_births': births,
+        'figure_deaths': deaths
+    }
+
+
+class DensityIndex:
+    """基于前缀和数组回答“时间范围内有多少条目”，并生成缩略图所需的分段计数"""
+
+    def __init__(self, arrays):
+        self.min_year = int(arrays['min_year'])
+        self.categories = [str(category) for category in arrays['categories']]
+        self._category_ids = {category: i + 1 for i, category in enumerate(self.categories)}
+        self._events = arrays['events']
+        self._figure_births = arrays['figure_births']
+        self._figure_deaths = arrays['figure_deaths']
+        self.n_years = self._events.shape[2] - 1
+
+    @classmethod
+    def from_file(cls, npz_path):
+        """载入 process_data.py 生成的 density.npz"""
+        with np.load(npz_path) as arrays:
+            return cls({key: arrays[key] for key in arrays.files})
+
+    @classmethod
+    def from_store(cls, store):
+        """没有预先生成的文件时，由数据后端中的全部条目现场生成"""
+        return cls(build_density_arrays(store.query_events(), store.query_figures(), store.time_range))
+
+    def _position(self, year, side):
+        """年份对应的前缀和下标；side 为 left 时包含该年，为 right 时包含到该年为止"""
+        year = math.ceil(year) if side == 'left' else math.floor(year) + 1
+        return min(max(year - self.min_year, 0), self.n_years)
+
+    def _event_row(self, category, min_importance):
+        group = 0 if not category or category == 'all' else self._category_ids.get(category)
+        if group is None:
+            return None
+        level = min(max(int(min_importance or 0), 0), MAX_IMPORTANCE)
+        return self._events[group, level]
+
+    def _figure_rows(self, min_importance):
+        level = min(max(int(min_importance or 0), 0), MAX_IMPORTANCE)
+        return self._figure_births[level], self._figure_deaths[level]
+
+    def count_events(self, year_range, category=None, min_importance=None):
+        """时间范围内（含两端）满足分类和重要性条件的事件数"""
+        row = self._event_row(category, min_importance)
+        if row is None:
+            return 0
+        lo, hi = self._position(year_range[0], 'left'), self._position(year_range[1], 'right')
+        return int(row[hi] - row[lo]) if hi > lo else 0
+
+    def count_figures(self, year_range, min_importance=None):
+        """生卒年与时间范围有重叠、满足重要性条件的人物数"""
+        births, deaths = self._figure_rows(min_importance)
+        if year_range[1] < year_range[0]:
+            return 0
+        return int(births[self._position(year_range[1], 'right')] - deaths[self._position(year_range[0], 'left')])
+
+    def histogram(self, bin_size, category=None, min_importance=None):
+        """按 bin_size 年分段统计，返回 (各段起始年份, 事件数, 人物数)"""
+        edges = np.arange(0, self.n_years, bin_size)
+        upper = np.minimum(edges + bin_size, self.n_years)
+        row = self._event_row(category, min_importance)
+        events = np.zeros(len(edges), dtype=np.int64) if row is None else row[upper] - row[edges]
+        births, deaths = self._figure_rows(min_importance)
+        figures = births[upper] - deaths[edges]
+        return (edges + self.min_year).tolist(), events.tolist(), figures.tolist()
+
+
+def load_density(data_dir, store):
+    """优先载入 process_data.py 生成的 data/density.npz，不存在时由数据后端现场生成"""
+    npz_path = os.path.join(data_dir, 'density.npz')
+    if os.path.exists(npz_path):
+        return DensityIndex.from_file(npz_path)
+    return DensityIndex.from_store(store)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 导出当前筛选结果
+按 CSV、NDJSON、Excel 格式逐批生成响应内容，数据后端逐条读取记录，内存占用与结果条数无关
+"""
+
+import io
+import os
+import csv
+import json
+import tempfile
+
+# Excel 导出需要 xlsxwriter，未安装时该格式不可用（pip install xlsxwriter）
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# 每攒够多少行输出一次
+BATCH_ROWS = 1000
+
+# Excel 临时文件每次读出的字节数
+CHUNK_BYTES = 64 * 1024
+
+# 单个工作表最多 1048576 行，去掉表头
+XLSX_MAX_ROWS = 1048575
+
+# 导出的列：(英文键, 中文表头)；事件的标题和人物的姓名都放在 name 列，年份为事件年份或生卒年
+COLUMNS = [
+    ('type', '类型'),
+    ('id', 'ID'),
+    ('name', '名称'),
+    ('start_year', '起始年份'),
+    ('end_year', '结束年份'),
+    ('dynasty', '朝代'),
+    ('category', '分类'),
+    ('importance', '重要性'),
+    ('description', '描述'),
+]
+
+# 格式 -> (MIME 类型, 文件扩展名)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def format_available(export_format):
+    """该格式在当前环境中能否导出"""
+    return export_format in EXPORT_FORMATS and (export_format != 'xlsx' or xlsxwriter is not None)
+
+
+def export_rows(store, year_range=None, search_term=None, category=None, min_importance=None):
+    """与时间轴相同的筛选条件，先事件后人物逐条生成导出行（按 COLUMNS 顺序的元组）
+
+    人物时间轴不按事件分类筛选，导出时同样只对事件应用分类条件
+    """
+    for event in store.iter_events(year_range, search_term, category, min_importance):
+        yield ('event', event.id, event.title, event.year, event.year, event.dynasty,
+               event.category, event.importance, event.description)
+    for figure in store.iter_figures(year_range, search_term, min_importance):
+        yield ('figure', figure.id, figure.name, figure.birth_year, figure.death_year, figure.dynasty,
+               '', figure.importance, figure.description)
+
+
+def iter_csv(rows):
+    """CSV：中文表头，带 BOM 以便 Excel 正确识别 UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for _, header in COLUMNS])
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % BATCH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(rows):
+    """NDJSON：每行一个 JSON 对象，键为英文列名"""
+    keys = [key for key, _ in COLUMNS]
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(dict(zip(keys, row)), ensure_ascii=False))
+        if len(batch) >= BATCH_ROWS:
+            batch.append('')
+            yield '\n'.join(batch).encode('utf-8')
+            batch = []
+    if batch:
+        batch.append('')
+        yield '\n'.join(batch).encode('utf-8')
+
+
+def iter_xlsx(rows):
+    """Excel：xlsx 是 zip 包，必须写完才能发送。
+
+    constant_memory 模式下每写完一行即刷到临时文件，写完后分块读出，读完删除临时文件；
+    超出单表行数上限的部分不导出
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('导出')
+        worksheet.write_row(0, 0, [header for _, header in COLUMNS])
+        for count, row in enumerate(rows, 1):
+            if count > XLSX_MAX_ROWS:
+                break
+            worksheet.write_row(count, 0, row)
+        workbook.close()
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def iter_export(export_format, rows):
+    """按格式生成响应内容的字节块"""
+    writers = {'csv': iter_csv, 'ndjson': iter_ndjson, 'xlsx': iter_xlsx}
+    return writers[export_format](rows)
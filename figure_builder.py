@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 时间轴图表构建
+直接生成与 plotly.graph_objects 输出一致的图表字典，回调中不再经过逐属性校验；
+结构的正确性由 tests/test_figure_builder.py 用 go.Figure 统一校验
+"""
+
+import os
+
+import plotly.io as pio
+
+# plotly 在第一次序列化时才惰性导入 orjson，多个线程同时首次序列化会拿到未初始化完成的模块
+# （partially initialized module 'orjson'），因此在加载本模块时先导入并序列化一次
+try:
+    import orjson  # noqa: F401
+except ImportError:
+    orjson = None
+pio.to_json({'data': [], 'layout': {}}, validate=False)
+
+# 定义颜色
+colors = {
+    'background': '#111111',
+    'text': '#FFFFFF',
+    'primary': '#375A7F',
+    'secondary': '#444444',
+    'accent': '#00bc8c',
+    'danger': '#E74C3C'
+}
+
+# 事件分类颜色
+category_colors = {
+    '政治': '#FF5733',  # 红色
+    '军事': '#C70039',  # 深红色
+    '文化': '#FFC300',  # 黄色
+    '经济': '#DAF7A6',  # 浅绿色
+    '科技': '#3498DB',  # 蓝色
+    '其他': '#9B59B6'   # 紫色
+}
+
+# 可见条目超过该数量时改用WebGL渲染（Scattergl），SVG在数千个点时平移会卡顿
+WEBGL_THRESHOLD = int(os.environ.get('TIMELINE_WEBGL_THRESHOLD', 1000))
+
+FONT_FAMILY = '"ZCOOL XiaoWei", serif'
+
+# go.Figure 会把默认模板写入 layout.template，直接生成字典时需要同样带上
+_template = pio.templates[pio.templates.default].to_plotly_json()
+
+
+def scatter_trace_type(item_count):
+    """根据可见条目数选择SVG或WebGL散点图"""
+    return 'scattergl' if item_count > WEBGL_THRESHOLD else 'scatter'
+
+
+def hoverlabel(bgcolor, font_size):
+    """悬停提示样式"""
+    return {'bgcolor': bgcolor, 'font': {'family': FONT_FAMILY, 'size': font_size}}
+
+
+def timeline_layout(xaxis_range, height, **xaxis):
+    """时间轴的公共布局"""
+    return {
+        'font': {'color': colors['text'], 'family': FONT_FAMILY, 'size': 14},
+        'height': height,
+        'hovermode': 'closest',
+        'margin': {'b': 20, 'l': 20, 'r': 20, 't': 0},
+        'paper_bgcolor': colors['background'],
+        'plot_bgcolor': colors['background'],
+        'template': _template,
+        'xaxis': {
+            **xaxis,
+            'gridcolor': 'rgba(255, 255, 255, 0.1)',
+            'linecolor': 'rgba(255, 255, 255, 0.5)',
+            'range': list(xaxis_range),
+            'showgrid': True,
+            'showline': True,
+            'tickfont': {'size': 12},
+            'tickformat': '.0f',  # 显示整数年份
+            'zeroline': False
+        },
+        'yaxis': {'range': [-0.1, 1.1], 'showgrid': False, 'showticklabels': False, 'zeroline': False}
+    }
+
+
+def build_dynasty_figure(dynasties, full_range, xaxis_range=None):
+    """构建朝代时间轴图表"""
+    data = []
+
+    # 添加朝代条带
+    for dynasty in dynasties:
+        data.append({
+            'fill': 'toself',
+            'fillcolor': dynasty['color'],
+            'hoverinfo': 'text',
+            'hoverlabel': hoverlabel(dynasty['color'], 16),
+            'line': {'width': 0},
+            'name': dynasty['id'],
+            'showlegend': False,
+            'text': f"{dynasty['id']} ({dynasty['start_year']}年 - {dynasty['end_year']}年)",
+            'x': [dynasty['start_year'], dynasty['end_year'], dynasty['end_year'],
+                  dynasty['start_year'], dynasty['start_year']],
+            'y': [0, 0, 1, 1, 0],
+            'type': 'scatter'
+        })
+
+    # 只为持续时间较长的朝代添加标签，标签位于朝代中间位置
+    annotations = [{
+        'align': 'center',
+        'bgcolor': 'rgba(255, 255, 255, 0.7)',
+        'bordercolor': 'black',
+        'borderpad': 4,
+        'borderwidth': 1,
+        'font': {'color': 'black', 'family': FONT_FAMILY, 'size': 14},
+        'opacity': 0.8,
+        'showarrow': False,
+        'text': dynasty['id'],
+        'x': (dynasty['start_year'] + dynasty['end_year']) / 2,
+        'y': 0.5
+    } for dynasty in dynasties if dynasty['duration'] > 50]
+
+    # 每100年添加一条垂直标记线，公元元年特殊标记
+    shapes = [{
+        'line': {'color': 'red', 'dash': 'dash', 'width': 2} if year == 0 else
+                {'color': 'rgba(255, 255, 255, 0.2)', 'width': 1},
+        'type': 'line',
+        'x0': year,
+        'x1': year,
+        'y0': 0,
+        'y1': 1
+    } for year in range(full_range[0], full_range[1] + 1, 100)]
+
+    layout = timeline_layout(xaxis_range or full_range, 250, title={'text': '年份'})
+    layout.update(annotations=annotations, dragmode='pan', shapes=shapes)
+    return {'data': data, 'layout': layout}
+
+
+def build_events_figure(events, xaxis_range):
+    """构建历史事件时间轴图表，每个分类合并为一条轨迹"""
+    trace_type = scatter_trace_type(len(events))
+
+    # 按重要性排序后按分类分组，保持重要性顺序
+    events_by_category = {}
+    for event in sorted(events, key=lambda x: x['importance'], reverse=True):
+        events_by_category.setdefault(event['category'], []).append(event)
+
+    data = [{
+        'customdata': [[event['id']] for event in category_events],  # 存储事件ID用于回调
+        'hoverinfo': 'text',
+        'hoverlabel': hoverlabel(colors['secondary'], 14),
+        'marker': {
+            'color': category_colors.get(category, colors['danger']),
+            'line': {'color': 'white', 'width': 2},
+            'opacity': 0.8,
+            'size': [event['importance'] * 8 for event in category_events],  # 根据重要性调整大小
+            'symbol': 'diamond'
+        },
+        'mode': 'markers',
+        'name': category,
+        'showlegend': False,
+        'text': [f"{event['title']} ({event['year']}年)<br>{event['description']}<br>分类: {event['category']}"
+                 for event in category_events],
+        'x': [event['year'] for event in category_events],
+        'y': [0.5] * len(category_events),
+        'type': trace_type
+    } for category, category_events in events_by_category.items()]
+
+    return {'data': data, 'layout': timeline_layout(xaxis_range, 150)}
+
+
+def build_figures_figure(figures, xaxis_range):
+    """构建历史人物时间轴图表，相同重要性的生命线合并为一条轨迹"""
+    trace_type = scatter_trace_type(len(figures))
+    sorted_figures = sorted(figures, key=lambda x: x['importance'], reverse=True)
+
+    # 计算y位置，使人物分布在不同高度，分成3层显示
+    y_positions = [0.2 + (i % 3) * 0.3 for i in range(len(sorted_figures))]
+
+    # 生命线宽度由重要性决定，同一条轨迹只能有一种线宽，因此按重要性分组；
+    # 组内各条生命线之间用 None 断开
+    lifelines = {}
+    for figure, y_pos in zip(sorted_figures, y_positions):
+        line = lifelines.setdefault(figure['importance'], {'x': [], 'y': [], 'text': [], 'customdata': []})
+        text = f"{figure['name']} ({figure['birth_year']}年 - {figure['death_year']}年)<br>{figure['description']}"
+        line['x'].extend([figure['birth_year'], figure['death_year'], None])
+        line['y'].extend([y_pos, y_pos, None])
+        line['text'].extend([text, text, None])
+        line['customdata'].extend([[figure['id']], [figure['id']], None])  # 存储人物ID用于回调
+
+    data = [{
+        'customdata': line['customdata'],
+        'hoverinfo': 'text',
+        'hoverlabel': hoverlabel(colors['secondary'], 14),
+        'line': {'color': colors['primary'], 'dash': 'solid', 'width': importance * 1.5},
+        'mode': 'lines',
+        'showlegend': False,
+        'text': line['text'],
+        'x': line['x'],
+        'y': line['y'],
+        'type': trace_type
+    } for importance, line in lifelines.items()]
+
+    # 添加人物标记点
+    if sorted_figures:
+        data.append({
+            'hoverinfo': 'skip',
+            'marker': {
+                'color': colors['primary'],
+                'line': {'color': 'white', 'width': 1},
+                'size': [figure['importance'] * 4 for figure in sorted_figures],
+                'symbol': 'circle'
+            },
+            'mode': 'markers',
+            'showlegend': False,
+            'x': [figure['birth_year'] for figure in sorted_figures],
+            'y': y_positions,
+            'type': trace_type
+        })
+
+    return {'data': data, 'layout': timeline_layout(xaxis_range, 200)}
+
+
+def with_xaxis_range(fig, xaxis_range):
+    """返回只修改了横轴范围的图表，数据部分与原图表共享"""
+    layout = dict(fig['layout'], xaxis=dict(fig['layout']['xaxis'], range=list(xaxis_range)))
+    return {'data': fig['data'], 'layout': layout}
+
+
+def build_density_figure(bin_starts, bin_size, event_counts, figure_counts, selected_range):
+    """构建时间范围滑块上方的密度缩略图，当前选中范围以半透明矩形标出"""
+    centers = [start + bin_size / 2 for start in bin_starts]
+    data = [{
+        'hoverinfo': 'skip',
+        'marker': {'color': color, 'line': {'width': 0}},
+        'name': name,
+        'opacity': 0.8,
+        'showlegend': False,
+        'width': bin_size,
+        'x': centers,
+        'y': counts,
+        'type': 'bar'
+    } for name, color, counts in (('事件', colors['accent'], event_counts),
+                                  ('人物', colors['primary'], figure_counts))]
+
+    layout = {
+        'bargap': 0,
+        'barmode': 'stack',
+        'height': 60,
+        'margin': {'b': 0, 'l': 10, 'r': 10, 't': 0},
+        'paper_bgcolor': colors['background'],
+        'plot_bgcolor': colors['background'],
+        'shapes': [selection_shape(selected_range)],
+        'template': _template,
+        'xaxis': {'fixedrange': True, 'range': [bin_starts[0], bin_starts[-1] + bin_size],
+                  'showgrid': False, 'showticklabels': False, 'zeroline': False},
+        'yaxis': {'fixedrange': True, 'showgrid': False, 'showticklabels': False, 'zeroline': False}
+    }
+    return {'data': data, 'layout': layout}
+
+
+def selection_shape(selected_range):
+    """缩略图上标出选中范围的矩形"""
+    return {
+        'fillcolor': 'rgba(255, 255, 255, 0.15)',
+        'line': {'color': colors['accent'], 'width': 1},
+        'type': 'rect',
+        'x0': selected_range[0],
+        'x1': selected_range[1],
+        'xref': 'x',
+        'y0': 0,
+        'y1': 1,
+        'yref': 'paper'
+    }
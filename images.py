@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 响应式图片
+读取 process_images.py 生成的缩略图清单，为详情面板生成 WebP/JPEG 两种格式的 srcset
+"""
+
+import os
+import json
+
+# 缩略图宽度（像素），原图更窄时只生成不超过原图宽度的尺寸
+THUMBNAIL_WIDTHS = (160, 320, 640, 960)
+
+# 缩略图的访问路径前缀（app.py 中的 /images/<文件名> 路由）
+IMAGE_ROUTE = '/images/'
+
+# 详情面板中图片的显示宽度，浏览器据此从 srcset 中挑选尺寸；预取时使用同一个值，保证命中缓存
+DETAIL_IMAGE_SIZES = '(max-width: 576px) 100vw, 480px'
+
+# 每次预取的图片数上限
+PREFETCH_LIMIT = 6
+
+# 预取候选的重要性等级，从高到低逐级查询
+PREFETCH_IMPORTANCE_LEVELS = (5, 4)
+
+
+def load_image_manifest(data_dir):
+    """载入 data/image_manifest.json（原图文件名 -> 尺寸和缩略图列表），未生成时返回空字典"""
+    manifest_path = os.path.join(data_dir, 'image_manifest.json')
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def srcset(entry, image_format):
+    """某种格式的 srcset：'/images/a-1f2e-160.webp 160w, ...'"""
+    return ', '.join(f"{IMAGE_ROUTE}{variant[image_format]} {variant['width']}w" for variant in entry['variants'])
+
+
+def fallback_src(entry):
+    """不支持 srcset 时使用的图片：不小于 320 像素的最窄 JPEG"""
+    variants = entry['variants']
+    variant = next((variant for variant in variants if variant['width'] >= 320), variants[-1])
+    return IMAGE_ROUTE + variant['jpeg']
+
+
+def image_attributes(entry):
+    """assets/images.js 延迟加载和预取所需的 data-* 属性"""
+    return {
+        'data-webp': srcset(entry, 'webp'),
+        'data-jpeg': srcset(entry, 'jpeg'),
+        'data-src': fallback_src(entry),
+        'data-sizes': DETAIL_IMAGE_SIZES,
+    }
@@ -8,9 +8,20 @@
 
 import os
 import json
+import glob
+import sqlite3
 import pandas as pd
 import numpy as np
 
+from density import build_density_arrays
+from reigns import ReignIndex
+from related import build_related_arrays
+from columnar import encode_tables
+from suggest import build_pinyin_keys
+
+# 静态版本数据分片的时间跨度（年），默认按世纪切分
+SHARD_SPAN = 100
+
 def load_data():
     """加载CSV数据文件"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -143,18 +154,237 @@ def create_timeline_data(dynasties_list, events_list, figures_list):
         'max_year': max(all_years)
     }
     
+    assign_dynasty_ids(timeline_data)
+    
     return timeline_data
 
+def assign_dynasty_ids(timeline_data):
+    """按年份为事件、按生卒年为人物换算所属朝代编号（朝代在 dynasties 列表中的位置）
+    
+    数据中的 dynasty 字段是自由文本（如“周朝”），与朝代列表的名称不一定一致；
+    政权并立的年份（如宋/辽/金）同时属于多个朝代
+    """
+    reigns = ReignIndex(timeline_data['dynasties'])
+    events, figures = timeline_data['events'], timeline_data['figures']
+    
+    event_masks = reigns.resolve_years([event['year'] for event in events])
+    figure_masks = reigns.resolve_spans([figure['birth_year'] for figure in figures],
+                                        [figure['death_year'] for figure in figures])
+    
+    for item, mask in zip(events + figures, np.concatenate([event_masks, figure_masks])):
+        item['dynasty_ids'] = reigns.mask_to_ids(mask)
+
 def save_processed_data(timeline_data):
     """保存处理后的数据为JSON文件"""
     current_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(current_dir, 'data')
     
     with open(os.path.join(data_dir, 'timeline_data.json'), 'w', encoding='utf-8') as f:
-        json.dump(timeline_data, f, ensure_ascii=False, indent=2)
+        json.dump(timeline_data, f, ensure_ascii=False, separators=(',', ':'))
     
     print("数据处理完成，已保存到 timeline_data.json")
 
+def save_sqlite_database(timeline_data, db_path=None):
+    """将时间轴数据写入SQLite数据库，供SQLite存储后端按需查询"""
+    if db_path is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        db_path = os.path.join(current_dir, 'data', 'timeline.db')
+    
+    # 先写入临时文件再替换，避免运行中的应用读到不完整的数据库
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE dynasties (
+            id TEXT PRIMARY KEY, start_year INTEGER, end_year INTEGER, duration INTEGER,
+            description TEXT, color TEXT
+        );
+        CREATE TABLE events (
+            rowid INTEGER PRIMARY KEY, id TEXT UNIQUE, year INTEGER, title TEXT, description TEXT,
+            dynasty TEXT, importance INTEGER, category TEXT, image_url TEXT, dynasty_ids TEXT
+        );
+        CREATE TABLE figures (
+            rowid INTEGER PRIMARY KEY, id TEXT UNIQUE, name TEXT, birth_year INTEGER, death_year INTEGER,
+            dynasty TEXT, description TEXT, importance INTEGER, image_url TEXT, dynasty_ids TEXT
+        );
+    """)
+    
+    conn.execute("INSERT INTO meta VALUES ('time_range', ?)", (json.dumps(timeline_data['time_range']),))
+    conn.executemany(
+        "INSERT INTO dynasties VALUES (:id, :start_year, :end_year, :duration, :description, :color)",
+        timeline_data['dynasties']
+    )
+    # 所属朝代编号以JSON数组文本保存
+    def with_dynasty_ids_text(items):
+        for item in items:
+            yield dict(item, dynasty_ids=json.dumps(item['dynasty_ids'], separators=(',', ':')))
+    
+    conn.executemany(
+        "INSERT INTO events (id, year, title, description, dynasty, importance, category, image_url, dynasty_ids) "
+        "VALUES (:id, :year, :title, :description, :dynasty, :importance, :category, :image_url, :dynasty_ids)",
+        with_dynasty_ids_text(timeline_data['events'])
+    )
+    conn.executemany(
+        "INSERT INTO figures (id, name, birth_year, death_year, dynasty, description, importance, image_url, "
+        "dynasty_ids) "
+        "VALUES (:id, :name, :birth_year, :death_year, :dynasty, :description, :importance, :image_url, "
+        ":dynasty_ids)",
+        with_dynasty_ids_text(timeline_data['figures'])
+    )
+    
+    # 记录人物的最长寿命，用于把时间范围查询限定在出生年份索引的一段区间内
+    conn.execute(
+        "INSERT INTO meta SELECT 'max_figure_span', COALESCE(MAX(death_year - birth_year), 0) FROM figures"
+    )
+    
+    # 数据写入完成后再建索引，比逐行维护索引快得多
+    conn.executescript("""
+        CREATE INDEX idx_events_year ON events (year);
+        CREATE INDEX idx_events_dynasty_year ON events (dynasty, year);
+        CREATE INDEX idx_events_importance ON events (importance);
+        CREATE INDEX idx_events_category ON events (category);
+        CREATE INDEX idx_figures_birth_year ON figures (birth_year);
+        CREATE INDEX idx_figures_dynasty_birth_year ON figures (dynasty, birth_year);
+        CREATE INDEX idx_figures_importance ON figures (importance);
+        
+        -- trigram分词支持中文任意子串检索（至少3个字符）
+        CREATE VIRTUAL TABLE events_fts USING fts5(
+            title, description, dynasty, content='events', content_rowid='rowid', tokenize='trigram'
+        );
+        CREATE VIRTUAL TABLE figures_fts USING fts5(
+            name, description, dynasty, content='figures', content_rowid='rowid', tokenize='trigram'
+        );
+        INSERT INTO events_fts (events_fts) VALUES ('rebuild');
+        INSERT INTO figures_fts (figures_fts) VALUES ('rebuild');
+        
+        ANALYZE;
+    """)
+    conn.commit()
+    conn.close()
+    
+    os.replace(tmp_path, db_path)
+    print(f"SQLite数据库已保存到 {os.path.basename(db_path)}")
+
+def save_density_arrays(timeline_data, npz_path=None):
+    """按年份累计各分类、各重要性等级的事件和人物数量，供范围计数和密度缩略图使用"""
+    if npz_path is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        npz_path = os.path.join(current_dir, 'data', 'density.npz')
+    
+    arrays = build_density_arrays(timeline_data['events'], timeline_data['figures'], timeline_data['time_range'])
+    
+    # 同样先写临时文件再替换（np.savez 会自动补全 .npz 后缀）
+    tmp_path = npz_path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, npz_path)
+    print(f"密度前缀和已保存到 {os.path.basename(npz_path)}")
+
+def save_related_arrays(timeline_data, npz_path=None):
+    """为每个事件和人物计算相关条目，供详情面板直接读取"""
+    if npz_path is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        npz_path = os.path.join(current_dir, 'data', 'related.npz')
+    
+    arrays = build_related_arrays(timeline_data['events'], timeline_data['figures'])
+    
+    tmp_path = npz_path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, npz_path)
+    print(f"相关条目已保存到 {os.path.basename(npz_path)}")
+
+def create_search_keys(timeline_data):
+    """为朝代名称、事件标题和人物姓名（含括号中的别名）生成拼音全拼和首字母联想键"""
+    texts = [dynasty['id'] for dynasty in timeline_data['dynasties']]
+    texts.extend(event['title'] for event in timeline_data['events'])
+    texts.extend(figure['name'] for figure in timeline_data['figures'])
+    return build_pinyin_keys(texts)
+
+def save_search_keys(timeline_data):
+    """保存搜索联想使用的拼音键（先写临时文件再替换）"""
+    search_keys = create_search_keys(timeline_data)
+    if search_keys is None:
+        print("未安装 pypinyin，跳过拼音联想键的生成")
+        return
+    
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    keys_path = os.path.join(current_dir, 'data', 'search_keys.json')
+    with open(keys_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(search_keys, f, ensure_ascii=False, indent=2)
+    os.replace(keys_path + '.tmp', keys_path)
+    
+    print("拼音联想键已保存到 search_keys.json")
+
+def create_static_shards(timeline_data, span=SHARD_SPAN):
+    """按世纪切分事件和人物数据，生成静态版本按需加载的分片及清单"""
+    shards = {}
+    
+    # 事件按发生年份、人物按出生年份归入分片
+    for event in timeline_data['events']:
+        start = event['year'] // span * span
+        shards.setdefault(start, {'events': [], 'figures': []})['events'].append(event)
+    
+    for figure in timeline_data['figures']:
+        start = figure['birth_year'] // span * span
+        shards.setdefault(start, {'events': [], 'figures': []})['figures'].append(figure)
+    
+    # 清单记录每个分片的条目数和实际覆盖的年份范围（人物的卒年可能超出分片）
+    shard_list = []
+    for start in sorted(shards):
+        shard = shards[start]
+        years = [event['year'] for event in shard['events']]
+        for figure in shard['figures']:
+            years.extend([figure['birth_year'], figure['death_year']])
+        
+        shard_list.append({
+            'file': f"shard_{start}.json",
+            'start': start,
+            'end': start + span,
+            'min_year': min(years),
+            'max_year': max(years),
+            'events': len(shard['events']),
+            'figures': len(shard['figures'])
+        })
+    
+    # 朝代数据量小且每次渲染都需要，直接放在清单中
+    manifest = {
+        'span': span,
+        'time_range': timeline_data['time_range'],
+        'dynasties': timeline_data['dynasties'],
+        'shards': shard_list
+    }
+    
+    return manifest, shards
+
+def save_static_shards(manifest, shards):
+    """保存静态版本的数据分片和清单文件"""
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    shard_dir = os.path.join(current_dir, 'static_version', 'shards')
+    os.makedirs(shard_dir, exist_ok=True)
+    
+    # 清除旧的分片，避免残留已不存在的世纪
+    for path in glob.glob(os.path.join(shard_dir, 'shard_*.json')) + glob.glob(os.path.join(shard_dir, 'shard_*.bin')):
+        os.remove(path)
+    
+    # 每个分片同时生成 JSON 和列式二进制（columnar.py）两种格式，页面优先加载二进制，
+    # 不支持 TextDecoder 的浏览器退回 JSON
+    for info in manifest['shards']:
+        with open(os.path.join(shard_dir, info['file']), 'w', encoding='utf-8') as f:
+            json.dump(shards[info['start']], f, ensure_ascii=False, separators=(',', ':'))
+        info['binary'] = f"shard_{info['start']}.bin"
+        with open(os.path.join(shard_dir, info['binary']), 'wb') as f:
+            f.write(encode_tables(shards[info['start']]))
+    
+    with open(os.path.join(shard_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    
+    print(f"静态数据分片完成，共 {len(manifest['shards'])} 个分片，已保存到 static_version/shards")
+
 def main():
     """主函数"""
     print("开始处理中国历史年表数据...")
@@ -172,6 +402,14 @@ def main():
     
     # 保存处理后的数据
     save_processed_data(timeline_data)
+    save_sqlite_database(timeline_data)
+    save_density_arrays(timeline_data)
+    save_related_arrays(timeline_data)
+    save_search_keys(timeline_data)
+    
+    # 生成静态版本的按需加载分片
+    manifest, shards = create_static_shards(timeline_data)
+    save_static_shards(manifest, shards)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 图片处理脚本
+把 data/images 中事件和人物引用的原图缩放为多种宽度的 WebP 和 JPEG，保存到 data/thumbs，
+文件名包含内容哈希（内容不变则文件名不变，可以长期缓存），宽高写入 data/image_manifest.json
+
+用法：python process_images.py [--workers N] [--prune]
+"""
+
+import io
+import os
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# 图片缩放需要 Pillow（pip install Pillow），未安装时无法生成缩略图
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+from images import THUMBNAIL_WIDTHS
+
+# 编码参数，参与文件名哈希：参数变化后生成新文件名，旧缓存自然失效
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+data_dir = os.path.join(current_dir, 'data')
+
+
+def referenced_images(timeline_data):
+    """事件和人物引用的原图文件名（去重，保持首次出现的顺序）"""
+    names = {}
+    for item in timeline_data['events'] + timeline_data['figures']:
+        if item.get('image_url'):
+            names.setdefault(item['image_url'], None)
+    return list(names)
+
+
+def make_thumbnails(name, source_dir, output_dir, widths=THUMBNAIL_WIDTHS):
+    """为一张原图生成各宽度的缩略图，返回 (原图文件名, 清单条目)；在进程池中执行"""
+    with open(os.path.join(source_dir, name), 'rb') as f:
+        content = f.read()
+
+    settings = f"{widths}|{WEBP_QUALITY}|{JPEG_QUALITY}".encode()
+    digest = hashlib.sha256(content + settings).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(name))[0]
+
+    with Image.open(io.BytesIO(content)) as source:
+        # 按 EXIF 方向旋转，透明背景统一转为 RGB
+        image = ImageOps.exif_transpose(source).convert('RGB')
+    width, height = image.size
+
+    # 不放大：比原图宽的尺寸用原图宽度代替
+    targets = sorted({min(target, width) for target in widths})
+
+    variants = []
+    for target in targets:
+        target_height = max(round(height * target / width), 1)
+        resized = None
+        variant = {'width': target, 'height': target_height}
+        for image_format, extension, options in (
+            ('webp', 'webp', {'format': 'WEBP', 'quality': WEBP_QUALITY, 'method': 6}),
+            ('jpeg', 'jpg', {'format': 'JPEG', 'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}),
+        ):
+            file_name = f"{stem}-{digest}-{target}.{extension}"
+            path = os.path.join(output_dir, file_name)
+            # 文件名由内容决定，已存在即说明无需重新生成
+            if not os.path.exists(path):
+                if resized is None:
+                    resized = image if target == width else image.resize((target, target_height), Image.LANCZOS)
+                tmp_path = path + '.tmp'
+                resized.save(tmp_path, **options)
+                os.replace(tmp_path, path)
+            variant[image_format] = file_name
+            variant[f'{image_format}_bytes'] = os.path.getsize(path)
+        variants.append(variant)
+
+    return name, {'width': width, 'height': height, 'bytes': len(content), 'variants': variants}
+
+
+def build_image_manifest(names, source_dir, output_dir, workers=None):
+    """用进程池并行处理全部原图；缺失的原图跳过并返回其文件名"""
+    os.makedirs(output_dir, exist_ok=True)
+    present, missing = [], []
+    for name in names:
+        (present if os.path.exists(os.path.join(source_dir, name)) else missing).append(name)
+
+    manifest = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(make_thumbnails, name, source_dir, output_dir) for name in present]
+        for future in futures:
+            name, entry = future.result()
+            manifest[name] = entry
+    return manifest, missing
+
+
+def save_image_manifest(manifest, manifest_path):
+    """先写临时文件再替换"""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def prune_thumbnails(manifest, output_dir):
+    """删除清单中不再引用的旧缩略图，返回删除的文件数"""
+    keep = {variant[image_format] for entry in manifest.values()
+            for variant in entry['variants'] for image_format in ('webp', 'jpeg')}
+    removed = 0
+    for file_name in os.listdir(output_dir):
+        if file_name not in keep:
+            os.remove(os.path.join(output_dir, file_name))
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成事件和人物图片的多尺寸缩略图')
+    parser.add_argument('--source', default=os.path.join(data_dir, 'images'), help='原图目录')
+    parser.add_argument('--output', default=os.path.join(data_dir, 'thumbs'), help='缩略图目录')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--prune', action='store_true', help='删除不再引用的旧缩略图')
+    args = parser.parse_args()
+
+    if Image is None:
+        print("未安装 Pillow，无法生成缩略图（pip install Pillow）")
+        return
+
+    with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+        timeline_data = json.load(f)
+
+    manifest, missing = build_image_manifest(referenced_images(timeline_data), args.source, args.output,
+                                             args.workers)
+    save_image_manifest(manifest, os.path.join(data_dir, 'image_manifest.json'))
+    print(f"已处理 {len(manifest)} 张图片，缩略图清单已保存到 image_manifest.json")
+    if missing:
+        print(f"{len(missing)} 张图片在 {args.source} 中不存在: {', '.join(missing[:10])}")
+    if args.prune:
+        print(f"已删除 {prune_thumbnails(manifest, args.output)} 个旧缩略图")
+
+
+if __name__ == "__main__":
+    main()
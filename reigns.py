@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 年份与朝代的对应
+把各朝代的起止年份切分为互不重叠的基本区间，每个区间用位掩码记录同时存在的朝代，
+年份和生卒年区间都可以用 np.searchsorted 批量换算为朝代编号
+"""
+
+import numpy as np
+
+# 位掩码为 uint64，最多支持 64 个朝代
+MAX_DYNASTIES = 64
+
+
+class ReignIndex:
+    """朝代编号即其在朝代列表中的位置（与 timeline_data.json 的 dynasties 顺序一致）"""
+
+    def __init__(self, dynasties):
+        if len(dynasties) > MAX_DYNASTIES:
+            raise ValueError(f"朝代数量 {len(dynasties)} 超过位掩码上限 {MAX_DYNASTIES}")
+
+        self.dynasties = dynasties
+        self._positions = {dynasty['id']: i for i, dynasty in enumerate(dynasties)}
+        starts = np.array([dynasty['start_year'] for dynasty in dynasties], dtype=np.int64)
+        ends = np.array([dynasty['end_year'] for dynasty in dynasties], dtype=np.int64)
+
+        # 基本区间的分界：第 i 个区间为 [bounds[i - 1], bounds[i])，首尾两个区间不属于任何朝代
+        self._bounds = np.unique(np.concatenate([starts, ends + 1]))
+        masks = np.zeros(len(self._bounds) + 1, dtype=np.uint64)
+        for i, (start, end) in enumerate(zip(starts, ends)):
+            lo = np.searchsorted(self._bounds, start, side='right')
+            hi = np.searchsorted(self._bounds, end + 1, side='right')
+            masks[lo:hi] |= np.uint64(1 << i)
+        self._masks = masks
+
+        # 区间按位或的稀疏表：_sparse[k, i] 为第 i 个区间起连续 2^k 个区间的并集（越界部分补0）
+        levels = int(np.log2(len(masks))) + 1
+        self._sparse = np.zeros((levels, len(masks)), dtype=np.uint64)
+        self._sparse[0] = masks
+        for k in range(1, levels):
+            step = 1 << (k - 1)
+            self._sparse[k, :-step] = self._sparse[k - 1, :-step] | self._sparse[k - 1, step:]
+
+    def _segments(self, years):
+        return np.searchsorted(self._bounds, np.asarray(years, dtype=np.int64), side='right')
+
+    def resolve_years(self, years):
+        """每个年份所属朝代的位掩码（政权并立时有多位）"""
+        return self._masks[self._segments(years)]
+
+    def resolve_spans(self, starts, ends):
+        """每个 [起, 止] 区间（如人物生卒年）所跨越朝代的位掩码"""
+        lo = self._segments(starts)
+        hi = np.maximum(self._segments(ends), lo)
+
+        # 区间 [lo, hi] 的并集由两段长度为 2^k 的稀疏表区间拼成，2^k 不超过区间个数
+        level = np.log2(hi - lo + 1).astype(np.int64)
+        return self._sparse[level, lo] | self._sparse[level, hi - (1 << level) + 1]
+
+    def mask_to_ids(self, mask):
+        """位掩码转换为朝代编号列表"""
+        mask = int(mask)
+        return [i for i in range(len(self.dynasties)) if mask >> i & 1]
+
+    def position(self, dynasty):
+        """朝代编号；dynasty 可以是编号或朝代名称，不存在时返回None"""
+        if isinstance(dynasty, (int, np.integer)):
+            return int(dynasty) if 0 <= dynasty < len(self.dynasties) else None
+        return self._positions.get(dynasty)
+
+    def reign_range(self, dynasty, year_range=None):
+        """朝代的起止年份与 year_range 的交集；朝代不存在或没有交集时返回None
+
+        朝代编号由年份换算而来，“某朝代的事件”就是这段年份内的事件，
+        在按年份排序的数据上只需一次二分查找即可取出
+        """
+        i = self.position(dynasty)
+        if i is None:
+            return None
+
+        start, end = self.dynasties[i]['start_year'], self.dynasties[i]['end_year']
+        if year_range:
+            start, end = max(start, year_range[0]), min(end, year_range[1])
+        return (start, end) if start <= end else None
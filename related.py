@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 相关条目
+离线为每个事件和人物计算最相关的若干条目（时间接近、同属一个朝代、描述相似），
+保存为定长的近邻数组，详情面板按ID取出即可
+"""
+
+import os
+import re
+
+import numpy as np
+
+# 每条记录保存的相关条目数
+RELATED_K = 5
+
+# 按年份排序后分块计算，每块只与前后相邻的块比较
+BLOCK_SIZE = 512
+
+# 出现在超过该比例记录中的字组合过于常见，不参与描述相似度
+MAX_DF = 0.1
+
+# 时间接近度按相隔年数指数衰减的尺度（年），相隔超过 TIME_SCALE * 20 年视为0
+TIME_SCALE = 50
+TIME_DECAY = np.exp(-np.arange(TIME_SCALE * 20 + 1) / TIME_SCALE).astype(np.float32)
+TIME_DECAY[-1] = 0
+
+# 描述相似度、时间接近度、同属朝代三项的权重
+TEXT_WEIGHT, TIME_WEIGHT, DYNASTY_WEIGHT = 0.6, 0.25, 0.15
+
+# 计算字组合前去掉标点和空白
+NON_WORD = re.compile(r'\W+')
+
+# 记录类型编码
+KINDS = ('event', 'figure')
+
+
+def tfidf_rows(texts):
+    """按字二元组计算TF-IDF，返回按行压缩的稀疏矩阵 (indptr, terms, weights)，每行已归一化"""
+    texts = [NON_WORD.sub('', text) for text in texts]
+    n_rows = len(texts)
+
+    # 全部文本以 \0 连接后转换为码位数组，相邻两个码位拼成一个字二元组，跨越分隔符的丢弃
+    codes = np.frombuffer('\0'.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    separators = codes == 0
+    valid = ~(separators[:-1] | separators[1:])
+    rows = np.cumsum(separators)[:-1][valid]
+    grams, terms = np.unique((codes[:-1] << np.uint64(21) | codes[1:])[valid], return_inverse=True)
+    n_terms = max(len(grams), 1)
+    del codes, separators, valid, grams
+
+    # 同一行内相同字组合合并计数，结果按 (行, 字组合) 排序
+    keys, counts = np.unique(rows * n_terms + terms, return_counts=True)
+    rows, terms = keys // n_terms, keys % n_terms
+
+    # 只出现在一条记录中的字组合不会产生相似度，过于常见的字组合区分度低
+    df = np.bincount(terms, minlength=n_terms)
+    keep = (df[terms] > 1) & (df[terms] <= max(MAX_DF * n_rows, 2))
+    rows, terms, counts = rows[keep], terms[keep], counts[keep]
+
+    weights = (1 + np.log(counts)) * (np.log((1 + n_rows) / (1 + df[terms])) + 1)
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_rows))
+    weights /= norms[rows]
+
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, terms, weights
+
+
+def _gather(indptr, rows):
+    """取出若干行的全部非零项，返回 (所在行在 rows 中的位置, 非零项下标)"""
+    lengths = indptr[rows + 1] - indptr[rows]
+    local_rows = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return local_rows, np.repeat(indptr[rows], lengths) + offsets
+
+
+def _sparse_dot(matrix, query_rows, candidate_rows):
+    """稀疏矩阵中 query_rows 与 candidate_rows 两两的点积（余弦相似度），返回稠密矩阵
+
+    候选行的非零项按字组合排序，查询行的每个非零项二分查找到相同字组合的候选项，
+    展开成 (查询行, 候选行, 乘积) 后用 bincount 累加
+    """
+    indptr, terms, weights = matrix
+    q_rows, q_entries = _gather(indptr, query_rows)
+    c_rows, c_entries = _gather(indptr, candidate_rows)
+    by_term = np.argsort(terms[c_entries], kind='stable')
+    c_rows, c_entries = c_rows[by_term], c_entries[by_term]
+    c_terms = terms[c_entries]
+
+    q_terms = terms[q_entries]
+    lo = np.searchsorted(c_terms, q_terms, side='left')
+    counts = np.searchsorted(c_terms, q_terms, side='right') - lo
+    q_index = np.repeat(np.arange(len(q_entries)), counts)
+    c_index = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    pairs = q_rows[q_index] * len(candidate_rows) + c_rows[c_index]
+    products = weights[q_entries[q_index]] * weights[c_entries[c_index]]
+    return np.bincount(pairs, weights=products,
+                       minlength=len(query_rows) * len(candidate_rows)).reshape(len(query_rows), -1)
+
+
+def build_related_arrays(events, figures, k=RELATED_K, block_size=BLOCK_SIZE):
+    """为事件和人物（字典或记录）计算相关条目，返回可保存为 npz 的数组
+
+    条目下标按先事件后人物排列；neighbors[i] 为第 i 条的相关条目下标（按相关度降序，不足时为 -1）
+    """
+    items = [(0, event['id'], event['year'], event['year'], event['dynasty_ids'],
+              f"{event['title']}{event['description']}") for event in events]
+    items.extend((1, figure['id'], figure['birth_year'], figure['death_year'], figure['dynasty_ids'],
+                  f"{figure['name']}{figure['description']}") for figure in figures)
+    n_items = len(items)
+
+    kinds = np.array([item[0] for item in items], dtype=np.uint8)
+    nums = np.array([int(item[1].rsplit('_', 1)[1]) for item in items], dtype=np.int64)
+    starts = np.array([item[2] for item in items], dtype=np.int64)
+    ends = np.array([item[3] for item in items], dtype=np.int64)
+    masks = np.array([sum(1 << i for i in item[4]) for item in items], dtype=np.uint64)
+    matrix = tfidf_rows(item[5] for item in items)
+
+    k = max(min(k, n_items - 1), 0)
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+
+    # 按起始年份排序分块，候选为本块及前后各一块，即时间上最接近的约 3 * block_size 条
+    order = np.argsort(starts, kind='stable')
+    for block_start in range(0, n_items, block_size):
+        query_rows = order[block_start:block_start + block_size]
+        candidate_rows = order[max(block_start - block_size, 0):block_start + 2 * block_size]
+
+        score = _sparse_dot(matrix, query_rows, candidate_rows).astype(np.float32)
+        score *= TEXT_WEIGHT
+        gap = np.maximum(starts[candidate_rows][None, :] - ends[query_rows][:, None],
+                         starts[query_rows][:, None] - ends[candidate_rows][None, :])
+        score += TIME_WEIGHT * TIME_DECAY[np.clip(gap, 0, len(TIME_DECAY) - 1)]
+        score += DYNASTY_WEIGHT * ((masks[query_rows][:, None] & masks[candidate_rows][None, :]) != 0)
+        score[query_rows[:, None] == candidate_rows[None, :]] = -np.inf
+
+        block_k = min(k, len(candidate_rows) - 1)
+        if block_k <= 0:
+            continue
+        top = np.argpartition(-score, block_k - 1, axis=1)[:, :block_k]
+        top_scores = np.take_along_axis(score, top, axis=1)
+        ranked = np.argsort(-top_scores, axis=1, kind='stable')
+        neighbors[query_rows, :block_k] = candidate_rows[np.take_along_axis(top, ranked, axis=1)]
+        scores[query_rows, :block_k] = np.take_along_axis(top_scores, ranked, axis=1)
+
+    return {'kinds': kinds, 'nums': nums, 'neighbors': neighbors, 'scores': scores}
+
+
+class RelatedIndex:
+    """按记录ID取出预先计算的相关条目"""
+
+    def __init__(self, arrays):
+        self._kinds = arrays['kinds']
+        self._nums = arrays['nums']
+        self._neighbors = arrays['neighbors']
+        self._scores = arrays['scores']
+
+        # (类型, 序号) 合成一个整数键，排序后二分查找
+        keys = self._kinds.astype(np.int64) << 32 | self._nums
+        self._order = np.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    @classmethod
+    def from_file(cls, npz_path):
+        """载入 process_data.py 生成的 related.npz"""
+        with np.load(npz_path) as arrays:
+            return cls({key: arrays[key] for key in arrays.files})
+
+    @classmethod
+    def from_store(cls, store):
+        """没有预先生成的文件时，由数据后端中的全部条目现场计算"""
+        return cls(build_related_arrays(store.query_events(), store.query_figures()))
+
+    def _position(self, record_id):
+        try:
+            kind, num = record_id.rsplit('_', 1)
+            key = KINDS.index(kind) << 32 | int(num)
+        except ValueError:
+            return None
+        i = np.searchsorted(self._keys, key)
+        return self._order[i] if i < len(self._keys) and self._keys[i] == key else None
+
+    def related(self, record_id):
+        """返回 [(记录ID, 相关度), ...]，按相关度降序；未知ID返回空列表"""
+        position = self._position(record_id)
+        if position is None:
+            return []
+        return [(f"{KINDS[self._kinds[i]]}_{self._nums[i]}", float(score))
+                for i, score in zip(self._neighbors[position], self._scores[position]) if i >= 0]
+
+
+def load_related(data_dir, store):
+    """优先载入 process_data.py 生成的 data/related.npz，不存在时由数据后端现场计算"""
+    npz_path = os.path.join(data_dir, 'related.npz')
+    if os.path.exists(npz_path):
+        return RelatedIndex.from_file(npz_path)
+    return RelatedIndex.from_store(store)
@@ -0,0 +1,77 @@
+// 列式二进制数据的解码（格式说明见 columnar.py），输出与 JSON 分片相同结构的记录数组
+// 整数列直接在 ArrayBuffer 上建立类型化数组视图；字符串列整体解码一次，再按 UTF-16 偏移截取
+
+(function(root) {
+    const TYPED_ARRAYS = {
+        int8: Int8Array, uint8: Uint8Array, int16: Int16Array, uint16: Uint16Array,
+        int32: Int32Array, uint32: Uint32Array
+    };
+    const utf8 = new TextDecoder('utf-8');
+
+    function decodeColumnar(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        if (magic !== 'TLC1') {
+            throw new Error('不是列式编码的数据');
+        }
+        const headerLength = view.getUint32(4, true);
+        const header = JSON.parse(utf8.decode(new Uint8Array(buffer, 8, headerLength)));
+        let position = 8 + headerLength;
+        let bufferIndex = 0;
+
+        // 按顺序取出下一个缓冲区；缓冲区都从8字节边界开始，可以直接建立视图（格式为小端序，与常见浏览器平台一致）
+        function next(dtype) {
+            const Type = TYPED_ARRAYS[dtype];
+            const length = header.buffers[bufferIndex++];
+            const array = new Type(buffer, position, length / Type.BYTES_PER_ELEMENT);
+            position += Math.ceil(length / 8) * 8;
+            return array;
+        }
+
+        function decodeColumn(column, rows) {
+            const values = new Array(rows);
+            if (column.type === 'int') {
+                const data = next(column.dtype);
+                for (let i = 0; i < rows; i++) values[i] = data[i];
+            } else if (column.type === 'id') {
+                const data = next('int32');
+                for (let i = 0; i < rows; i++) values[i] = column.prefix + data[i];
+            } else if (column.type === 'dict') {
+                const data = next(column.dtype);
+                for (let i = 0; i < rows; i++) values[i] = column.dictionary[data[i]];
+            } else if (column.type === 'utf8') {
+                const nulls = column.nullable ? next('uint8') : null;
+                const offsets = next('uint32');
+                const text = utf8.decode(next('uint8'));
+                for (let i = 0; i < rows; i++) values[i] = nulls && nulls[i] ? null : text.slice(offsets[i], offsets[i + 1]);
+            } else if (column.type === 'list') {
+                const offsets = next('uint32');
+                const data = next(column.dtype);
+                for (let i = 0; i < rows; i++) values[i] = Array.from(data.subarray(offsets[i], offsets[i + 1]));
+            } else {
+                throw new Error(`未知的列类型: ${column.type}`);
+            }
+            return values;
+        }
+
+        const result = {};
+        Object.entries(header.tables).forEach(([name, table]) => {
+            const names = table.columns.map(column => column.name);
+            const columns = table.columns.map(column => decodeColumn(column, table.rows));
+            const records = new Array(table.rows);
+            for (let i = 0; i < table.rows; i++) {
+                const record = {};
+                for (let c = 0; c < columns.length; c++) record[names[c]] = columns[c][i];
+                record.type = table.type;
+                records[i] = record;
+            }
+            result[name] = records;
+        });
+        return result;
+    }
+
+    root.decodeColumnar = decodeColumnar;
+    if (typeof module !== 'undefined') {
+        module.exports = {decodeColumnar};
+    }
+})(typeof window !== 'undefined' ? window : globalThis);
@@ -5,26 +5,152 @@ let searchTerm = '';
 let selectedCategory = 'all';
 let minImportance = 1;
 
+// 数据分片
+let manifest = null;
+let apiBase = null; // 通过 ?api= 指定的服务器地址，设置后直接从 /api/timeline.bin 加载可见范围
+const shardCache = new Map(); // 已请求的分片：文件名 -> Promise
+let loadGeneration = 0; // 用于丢弃过期的分片加载结果
+let updateScheduled = false;
+let firstRenderDone = false;
+
 // 初始化页面
 document.addEventListener('DOMContentLoaded', function() {
-    // 加载数据
-    fetch('timeline_data.json')
+    readInitialRange();
+    
+    // 先加载分片清单，再按可见范围加载分片
+    fetch('shards/manifest.json')
         .then(response => response.json())
         .then(data => {
-            timelineData = data;
+            manifest = data;
+            return loadVisibleShards();
+        })
+        .then(() => {
             initializeTimeRangeSlider();
             updateTimelines();
+            reportFirstRender();
             setupEventListeners();
         })
         .catch(error => console.error('加载数据失败:', error));
 });
 
+// 从URL参数读取初始时间范围，例如 ?start=-300&end=-200
+function readInitialRange() {
+    const params = new URLSearchParams(window.location.search);
+    if (params.get('api') && window.decodeColumnar) {
+        apiBase = params.get('api').replace(/\/$/, '');
+    }
+    const start = parseInt(params.get('start'));
+    const end = parseInt(params.get('end'));
+    
+    if (!isNaN(start) && !isNaN(end) && start <= end) {
+        timeRange = [start, end];
+    }
+}
+
+// 加载单个分片（同一分片只请求一次）；优先加载列式二进制版本（解码见 columnar.js）
+function loadShard(shard) {
+    if (!shardCache.has(shard.file)) {
+        const binary = shard.binary && window.decodeColumnar;
+        const request = fetch(`shards/${binary ? shard.binary : shard.file}`)
+            .then(response => binary ? response.arrayBuffer().then(decodeColumnar) : response.json())
+            .catch(error => {
+                shardCache.delete(shard.file);
+                throw error;
+            });
+        shardCache.set(shard.file, request);
+    }
+    return shardCache.get(shard.file);
+}
+
+// 从服务器按当前时间范围加载筛选后的事件和人物（列式二进制）
+function loadRangeFromApi(generation) {
+    return fetch(`${apiBase}/api/timeline.bin?start=${timeRange[0]}&end=${timeRange[1]}`)
+        .then(response => {
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            return response.arrayBuffer();
+        })
+        .then(buffer => {
+            if (generation !== loadGeneration) return false;
+            
+            const data = decodeColumnar(buffer);
+            timelineData = {dynasties: manifest.dynasties, events: data.events, figures: data.figures};
+            return true;
+        });
+}
+
+// 加载与当前时间范围重叠的分片，并预取相邻分片
+function loadVisibleShards() {
+    const generation = ++loadGeneration;
+    if (apiBase) return loadRangeFromApi(generation);
+    
+    const visible = [];
+    
+    manifest.shards.forEach((shard, index) => {
+        if (shard.min_year <= timeRange[1] && shard.max_year >= timeRange[0]) {
+            visible.push(index);
+        }
+    });
+    
+    return Promise.all(visible.map(index => loadShard(manifest.shards[index])))
+        .then(loaded => {
+            // 期间时间范围已变化，由更新的请求负责渲染
+            if (generation !== loadGeneration) return false;
+            
+            timelineData = {
+                dynasties: manifest.dynasties,
+                events: [].concat(...loaded.map(shard => shard.events)),
+                figures: [].concat(...loaded.map(shard => shard.figures))
+            };
+            prefetchNeighbors(visible);
+            return true;
+        });
+}
+
+// 空闲时预取可见分片两侧的相邻分片，平移时无需等待网络
+function prefetchNeighbors(visible) {
+    if (visible.length === 0) return;
+    
+    const neighbors = [visible[0] - 1, visible[visible.length - 1] + 1]
+        .filter(index => index >= 0 && index < manifest.shards.length);
+    const idle = window.requestIdleCallback || (callback => setTimeout(callback, 200));
+    
+    idle(() => neighbors.forEach(index => loadShard(manifest.shards[index]).catch(() => {})));
+}
+
+// 记录首次渲染耗时和数据传输量，便于与单一JSON文件对比
+function reportFirstRender() {
+    if (firstRenderDone) return;
+    firstRenderDone = true;
+    
+    performance.mark('timeline-first-render');
+    const bytes = performance.getEntriesByType('resource')
+        .filter(entry => entry.name.includes('/shards/') || entry.name.includes('/api/timeline.bin'))
+        .reduce((total, entry) => total + (entry.transferSize || entry.encodedBodySize || 0), 0);
+    
+    console.info(`首次渲染: ${Math.round(performance.now())}ms, 数据传输: ${bytes} 字节`);
+}
+
+// 合并同一帧内的多次更新，加载所需分片后再渲染
+function scheduleUpdate() {
+    if (updateScheduled) return;
+    updateScheduled = true;
+    
+    requestAnimationFrame(() => {
+        updateScheduled = false;
+        loadVisibleShards()
+            .then(current => {
+                if (current) updateTimelines();
+            })
+            .catch(error => console.error('加载数据失败:', error));
+    });
+}
+
 // 初始化时间范围滑块
 function initializeTimeRangeSlider() {
     const slider = document.getElementById('time-range-slider');
     
     noUiSlider.create(slider, {
-        start: [-2100, 2025],
+        start: timeRange,
         connect: true,
         range: {
             'min': -2100,
@@ -36,7 +162,7 @@ function initializeTimeRangeSlider() {
     slider.noUiSlider.on('update', function(values, handle) {
         timeRange = [parseInt(values[0]), parseInt(values[1])];
         updateTimeRangeDisplay();
-        updateTimelines();
+        scheduleUpdate();
     });
 }
 
@@ -60,19 +186,19 @@ function setupEventListeners() {
     // 搜索框
     document.getElementById('search-input').addEventListener('input', function(e) {
         searchTerm = e.target.value.trim();
-        updateTimelines();
+        scheduleUpdate();
     });
     
     // 分类筛选
     document.getElementById('category-dropdown').addEventListener('change', function(e) {
         selectedCategory = e.target.value;
-        updateTimelines();
+        scheduleUpdate();
     });
     
     // 重要性筛选
     document.getElementById('importance-slider').addEventListener('input', function(e) {
         minImportance = parseInt(e.target.value);
-        updateTimelines();
+        scheduleUpdate();
     });
 }
 
@@ -0,0 +1,492 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 数据存储后端
+提供基于JSON（全部载入内存）和SQLite（按需查询）两种可替换的数据后端
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, fields
+from typing import ClassVar, Optional
+
+import numpy as np
+
+from reigns import ReignIndex
+
+# 所属朝代编号的组合只有几十种，相同组合的记录共享同一个元组
+_dynasty_ids_cache = {}
+
+
+class Record:
+    """记录的公共接口：兼容原来按字典键取值的写法，并可转换回字典"""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        """转换为与 timeline_data.json 相同结构的字典"""
+        result = {'id': self.id}
+        result.update((field.name, getattr(self, field.name)) for field in fields(self) if field.name != 'num')
+        result['type'] = self.type
+        return result
+
+    @staticmethod
+    def parse_num(record_id):
+        """从 event_12 / figure_12 形式的ID中取出序号"""
+        return int(record_id.rsplit('_', 1)[1])
+
+    @staticmethod
+    def parse_dynasty_ids(value):
+        """所属朝代编号：JSON中为数组，SQLite中为数组文本"""
+        key = value if isinstance(value, str) else tuple(value)
+        dynasty_ids = _dynasty_ids_cache.get(key)
+        if dynasty_ids is None:
+            dynasty_ids = tuple(json.loads(value)) if isinstance(value, str) else key
+            _dynasty_ids_cache[key] = dynasty_ids
+        return dynasty_ids
+
+
+@dataclass(slots=True)
+class EventRecord(Record):
+    """历史事件：ID由序号推导，朝代和分类字符串驻留共享，dynasty_ids 为按年份换算的朝代编号"""
+
+    type: ClassVar[str] = 'event'
+
+    num: int
+    year: int
+    title: str
+    description: str
+    dynasty: str
+    importance: int
+    category: str
+    image_url: Optional[str]
+    dynasty_ids: tuple
+
+    @property
+    def id(self):
+        return f'event_{self.num}'
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(cls.parse_num(data['id']), data['year'], data['title'], data['description'],
+                   sys.intern(data['dynasty']), data['importance'], sys.intern(data['category']),
+                   data['image_url'], cls.parse_dynasty_ids(data['dynasty_ids']))
+
+
+@dataclass(slots=True)
+class FigureRecord(Record):
+    """历史人物：ID由序号推导，朝代字符串驻留共享，dynasty_ids 为生卒年跨越的朝代编号"""
+
+    type: ClassVar[str] = 'figure'
+
+    num: int
+    name: str
+    birth_year: int
+    death_year: int
+    dynasty: str
+    description: str
+    importance: int
+    image_url: Optional[str]
+    dynasty_ids: tuple
+
+    @property
+    def id(self):
+        return f'figure_{self.num}'
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(cls.parse_num(data['id']), data['name'], data['birth_year'], data['death_year'],
+                   sys.intern(data['dynasty']), data['description'], data['importance'],
+                   data['image_url'], cls.parse_dynasty_ids(data['dynasty_ids']))
+
+
+class JsonStore:
+    """从 timeline_data.json 载入全部数据，在内存中筛选
+
+    启动时把事件和人物按年份排序，并为每个分类和重要性等级预先计算布尔掩码，
+    任意筛选组合只需要一次二分查找确定年份区间，再对区间内的掩码做按位与。
+    朝代编号由年份换算而来，按朝代筛选即与该朝代的起止年份取交集，不需要掩码。
+    """
+
+    # 重要性等级范围，掩码按“重要性 >= k”预先计算
+    IMPORTANCE_LEVELS = range(1, 6)
+
+    def __init__(self, timeline_data):
+        self.dynasties = timeline_data['dynasties']
+        self.events = [event if isinstance(event, EventRecord) else EventRecord.from_dict(event)
+                       for event in timeline_data['events']]
+        self.figures = [figure if isinstance(figure, FigureRecord) else FigureRecord.from_dict(figure)
+                        for figure in timeline_data['figures']]
+        self.time_range = timeline_data['time_range']
+        self._reigns = ReignIndex(self.dynasties)
+
+        # 按序号查找：排序后的序号数组加二分查找，避免为每条记录保存ID字符串或字典项
+        self._event_nums = self._build_num_index(self.events)
+        self._figure_nums = self._build_num_index(self.figures)
+
+        self._build_event_index()
+        self._build_figure_index()
+
+    @classmethod
+    def from_file(cls, json_path):
+        """从JSON文件载入，解析时直接把事件和人物转换为记录，不保留中间字典"""
+        def to_record(data):
+            record_type = data.get('type')
+            if record_type == 'event':
+                return EventRecord.from_dict(data)
+            if record_type == 'figure':
+                return FigureRecord.from_dict(data)
+            return data
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f, object_hook=to_record))
+
+    @staticmethod
+    def _build_num_index(records):
+        """返回 (排序后的序号, 对应的记录下标)"""
+        nums = np.fromiter((record.num for record in records), dtype=np.int64, count=len(records))
+        order = np.argsort(nums, kind='stable')
+        return nums[order], order
+
+    def _build_masks(self, records, order, field):
+        """按字段取值为排序后的记录生成布尔掩码"""
+        values = np.array([getattr(records[i], field) for i in order], dtype=object)
+        return {value: values == value for value in set(values)}
+
+    def _build_importance_masks(self, records, order):
+        """生成“重要性 >= k”的掩码"""
+        importance = np.fromiter((records[i].importance for i in order), dtype=np.int8, count=len(order))
+        return {level: importance >= level for level in self.IMPORTANCE_LEVELS}
+
+    def _build_event_index(self):
+        years = np.fromiter((event.year for event in self.events), dtype=np.int32, count=len(self.events))
+        self._event_order = np.argsort(years, kind='stable')
+        self._event_years = years[self._event_order]
+        self._event_category_masks = self._build_masks(self.events, self._event_order, 'category')
+        self._event_importance_masks = self._build_importance_masks(self.events, self._event_order)
+
+    def _build_figure_index(self):
+        births = np.fromiter((figure.birth_year for figure in self.figures), dtype=np.int32,
+                             count=len(self.figures))
+        deaths = np.fromiter((figure.death_year for figure in self.figures), dtype=np.int32,
+                             count=len(self.figures))
+        self._figure_order = np.argsort(births, kind='stable')
+        self._figure_births = births[self._figure_order]
+        self._figure_deaths = deaths[self._figure_order]
+        self._max_figure_span = int((deaths - births).max()) if len(self.figures) else 0
+        self._figure_importance_masks = self._build_importance_masks(self.figures, self._figure_order)
+
+    @staticmethod
+    def _combine(mask, masks, key, lo, hi):
+        """把指定取值的掩码区间与已有掩码做按位与，取值不存在时结果为空"""
+        selected = masks.get(key)
+        if selected is None:
+            return np.zeros(max(hi - lo, 0), dtype=bool)
+        return selected[lo:hi] if mask is None else mask & selected[lo:hi]
+
+    @staticmethod
+    def _search(records, search_term, columns):
+        """在候选记录中按关键词做子串匹配"""
+        search_term = search_term.lower()
+        return [record for record in records
+                if any(search_term in getattr(record, column).lower() for column in columns)]
+
+    @staticmethod
+    def _iter_matches(records, indices, search_term, columns):
+        """按下标逐条取出记录，有关键词时只返回匹配的记录"""
+        search_term = search_term.lower() if search_term else None
+        for i in indices:
+            record = records[i]
+            if search_term is None or any(search_term in getattr(record, column).lower() for column in columns):
+                yield record
+
+    def _event_indices(self, year_range, category, min_importance, dynasty):
+        """满足时间范围、分类、重要性和朝代条件的事件下标（按原始数据顺序）"""
+        if dynasty is not None:
+            year_range = self._reigns.reign_range(dynasty, year_range)
+            if year_range is None:
+                return np.zeros(0, dtype=np.int64)
+
+        lo, hi = 0, len(self._event_years)
+        if year_range:
+            lo = np.searchsorted(self._event_years, year_range[0], side='left')
+            # 起始年份晚于结束年份时区间为空
+            hi = max(np.searchsorted(self._event_years, year_range[1], side='right'), lo)
+
+        mask = None
+        if category and category != 'all':
+            mask = self._combine(mask, self._event_category_masks, category, lo, hi)
+        if min_importance:
+            mask = self._combine(mask, self._event_importance_masks, max(int(min_importance), 1), lo, hi)
+
+        indices = self._event_order[lo:hi]
+        if mask is not None:
+            indices = indices[mask]
+
+        # 保持原始数据顺序
+        return np.sort(indices)
+
+    def query_events(self, year_range=None, search_term=None, category=None, min_importance=None,
+                     dynasty=None):
+        """按时间范围、关键词、分类、重要性和朝代（名称或编号）筛选事件"""
+        result = [self.events[i] for i in self._event_indices(year_range, category, min_importance, dynasty)]
+
+        # 子串匹配无法预先计算，放在最后只扫描剩余的候选记录
+        if search_term:
+            result = self._search(result, search_term, ('title', 'description', 'dynasty'))
+
+        return result
+
+    def iter_events(self, year_range=None, search_term=None, category=None, min_importance=None,
+                    dynasty=None):
+        """与 query_events 条件相同，逐条返回，不生成结果列表"""
+        indices = self._event_indices(year_range, category, min_importance, dynasty)
+        return self._iter_matches(self.events, indices, search_term, ('title', 'description', 'dynasty'))
+
+    def _figure_indices(self, year_range, min_importance, dynasty):
+        """满足时间范围、重要性和朝代条件的人物下标（按原始数据顺序）"""
+        # 生卒年与时间范围、朝代起止年份都有重叠，等价于与两者的交集有重叠
+        if dynasty is not None:
+            year_range = self._reigns.reign_range(dynasty, year_range)
+            if year_range is None:
+                return np.zeros(0, dtype=np.int64)
+
+        lo, hi = 0, len(self._figure_births)
+        mask = None
+        if year_range:
+            # 出生年份不早于 起始年份 - 最长寿命，才可能与时间范围重叠
+            lo = np.searchsorted(self._figure_births, year_range[0] - self._max_figure_span, side='left')
+            hi = max(np.searchsorted(self._figure_births, year_range[1], side='right'), lo)
+            mask = self._figure_deaths[lo:hi] >= year_range[0]
+
+        if min_importance:
+            mask = self._combine(mask, self._figure_importance_masks, max(int(min_importance), 1), lo, hi)
+
+        indices = self._figure_order[lo:hi]
+        if mask is not None:
+            indices = indices[mask]
+
+        return np.sort(indices)
+
+    def query_figures(self, year_range=None, search_term=None, min_importance=None, dynasty=None):
+        """按时间范围（与生卒年有重叠）、关键词、重要性和朝代（名称或编号）筛选人物"""
+        result = [self.figures[i] for i in self._figure_indices(year_range, min_importance, dynasty)]
+
+        if search_term:
+            result = self._search(result, search_term, ('name', 'description', 'dynasty'))
+
+        return result
+
+    def iter_figures(self, year_range=None, search_term=None, min_importance=None, dynasty=None):
+        """与 query_figures 条件相同，逐条返回，不生成结果列表"""
+        indices = self._figure_indices(year_range, min_importance, dynasty)
+        return self._iter_matches(self.figures, indices, search_term, ('name', 'description', 'dynasty'))
+
+    def iter_labels(self):
+        """逐条返回 (事件标题或人物姓名, 类型, 重要性)，供搜索联想建立索引"""
+        for event in self.events:
+            yield event.title, 'event', event.importance
+        for figure in self.figures:
+            yield figure.name, 'figure', figure.importance
+
+    @staticmethod
+    def _lookup(records, num_index, record_id):
+        try:
+            num = Record.parse_num(record_id)
+        except (ValueError, IndexError):
+            return None
+
+        nums, order = num_index
+        i = np.searchsorted(nums, num)
+        if i < len(nums) and nums[i] == num:
+            return records[order[i]]
+        return None
+
+    def get_event(self, event_id):
+        """按ID查找事件，不存在时返回None"""
+        return self._lookup(self.events, self._event_nums, event_id)
+
+    def get_figure(self, figure_id):
+        """按ID查找人物，不存在时返回None"""
+        return self._lookup(self.figures, self._figure_nums, figure_id)
+
+
+class SqliteStore:
+    """从 process_data.py 生成的 timeline.db 按需查询，只在内存中保留朝代数据"""
+
+    # FTS5 trigram 分词只能匹配至少3个字符的关键词，更短的关键词退回 LIKE 扫描
+    MIN_FTS_LENGTH = 3
+
+    EVENT_COLUMNS = 'id, year, title, description, dynasty, importance, category, image_url, dynasty_ids'
+    FIGURE_COLUMNS = 'id, name, birth_year, death_year, dynasty, description, importance, image_url, dynasty_ids'
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        conn = self._connection()
+        # 朝代编号是朝代在列表中的位置，保持与 timeline_data.json 相同的写入顺序
+        self.dynasties = [
+            dict(row, type='dynasty')
+            for row in conn.execute('SELECT * FROM dynasties ORDER BY rowid')
+        ]
+        self._reigns = ReignIndex(self.dynasties)
+        self.time_range = json.loads(
+            conn.execute("SELECT value FROM meta WHERE key = 'time_range'").fetchone()[0]
+        )
+        self.max_figure_span = int(
+            conn.execute("SELECT value FROM meta WHERE key = 'max_figure_span'").fetchone()[0]
+        )
+
+    def _connection(self):
+        """返回当前线程的只读连接，每个工作进程的每个线程各自复用一个连接"""
+        conn = getattr(self._local, 'conn', None)
+        # gunicorn 预加载后 fork 出的工作进程不能沿用父进程的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA query_only = ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _search_clause(self, table, columns, search_term, params):
+        """生成关键词检索的SQL条件"""
+        if len(search_term) >= self.MIN_FTS_LENGTH:
+            # 短语查询，双引号需要转义
+            params.append('"' + search_term.replace('"', '""') + '"')
+            return f'rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)'
+
+        pattern = '%' + search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        params.extend([pattern] * len(columns))
+        return '(' + ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns) + ')'
+
+    def _event_query(self, year_range, search_term, category, min_importance, dynasty):
+        """拼出事件筛选的 SQL 和参数；朝代与时间范围没有交集时返回None"""
+        if dynasty is not None:
+            year_range = self._reigns.reign_range(dynasty, year_range)
+            if year_range is None:
+                return None
+
+        clauses, params = [], []
+
+        if year_range:
+            clauses.append('year BETWEEN ? AND ?')
+            params.extend(year_range)
+
+        if search_term:
+            clauses.append(self._search_clause('events', ('title', 'description', 'dynasty'),
+                                               search_term.lower(), params))
+
+        if category and category != 'all':
+            clauses.append('category = ?')
+            params.append(category)
+
+        if min_importance:
+            clauses.append('importance >= ?')
+            params.append(min_importance)
+
+        sql = f'SELECT {self.EVENT_COLUMNS} FROM events'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return sql + ' ORDER BY rowid', params
+
+    def query_events(self, year_range=None, search_term=None, category=None, min_importance=None,
+                     dynasty=None):
+        """按时间范围、关键词、分类、重要性和朝代（名称或编号）筛选事件"""
+        return list(self.iter_events(year_range, search_term, category, min_importance, dynasty))
+
+    def iter_events(self, year_range=None, search_term=None, category=None, min_importance=None,
+                    dynasty=None):
+        """与 query_events 条件相同，从游标逐行读取，不生成结果列表"""
+        query = self._event_query(year_range, search_term, category, min_importance, dynasty)
+        if query is None:
+            return
+        for row in self._connection().execute(*query):
+            yield EventRecord.from_dict(row)
+
+    def _figure_query(self, year_range, search_term, min_importance, dynasty):
+        """拼出人物筛选的 SQL 和参数；朝代与时间范围没有交集时返回None"""
+        if dynasty is not None:
+            year_range = self._reigns.reign_range(dynasty, year_range)
+            if year_range is None:
+                return None
+
+        clauses, params = [], []
+
+        if year_range:
+            # 出生年份不早于 起始年份 - 最长寿命，才可能与时间范围重叠
+            clauses.append('birth_year BETWEEN ? AND ? AND death_year >= ?')
+            params.extend([year_range[0] - self.max_figure_span, year_range[1], year_range[0]])
+
+        if search_term:
+            clauses.append(self._search_clause('figures', ('name', 'description', 'dynasty'),
+                                               search_term.lower(), params))
+
+        if min_importance:
+            clauses.append('importance >= ?')
+            params.append(min_importance)
+
+        sql = f'SELECT {self.FIGURE_COLUMNS} FROM figures'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        return sql + ' ORDER BY rowid', params
+
+    def query_figures(self, year_range=None, search_term=None, min_importance=None, dynasty=None):
+        """按时间范围（与生卒年有重叠）、关键词、重要性和朝代（名称或编号）筛选人物"""
+        return list(self.iter_figures(year_range, search_term, min_importance, dynasty))
+
+    def iter_figures(self, year_range=None, search_term=None, min_importance=None, dynasty=None):
+        """与 query_figures 条件相同，从游标逐行读取，不生成结果列表"""
+        query = self._figure_query(year_range, search_term, min_importance, dynasty)
+        if query is None:
+            return
+        for row in self._connection().execute(*query):
+            yield FigureRecord.from_dict(row)
+
+    def iter_labels(self):
+        """逐行返回 (事件标题或人物姓名, 类型, 重要性)，只读取这两列"""
+        conn = self._connection()
+        for title, importance in conn.execute('SELECT title, importance FROM events ORDER BY rowid'):
+            yield title, 'event', importance
+        for name, importance in conn.execute('SELECT name, importance FROM figures ORDER BY rowid'):
+            yield name, 'figure', importance
+
+    def get_event(self, event_id):
+        """按ID查找事件，不存在时返回None"""
+        row = self._connection().execute(
+            f'SELECT {self.EVENT_COLUMNS} FROM events WHERE id = ?', (event_id,)
+        ).fetchone()
+        return EventRecord.from_dict(row) if row else None
+
+    def get_figure(self, figure_id):
+        """按ID查找人物，不存在时返回None"""
+        row = self._connection().execute(
+            f'SELECT {self.FIGURE_COLUMNS} FROM figures WHERE id = ?', (figure_id,)
+        ).fetchone()
+        return FigureRecord.from_dict(row) if row else None
+
+
+def load_store(data_dir, backend=None):
+    """根据 TIMELINE_BACKEND 环境变量（json 或 sqlite，默认 json）创建数据后端"""
+    backend = backend or os.environ.get('TIMELINE_BACKEND', 'json')
+
+    if backend == 'json':
+        return JsonStore.from_file(os.path.join(data_dir, 'timeline_data.json'))
+    if backend == 'sqlite':
+        return SqliteStore(os.path.join(data_dir, 'timeline.db'))
+
+    raise ValueError(f"未知的数据后端: {backend}（可选 json 或 sqlite）")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+中国历史年表 - 搜索联想
+按前缀匹配事件标题、人物姓名和朝代名称，支持拼音全拼和首字母
+（由 process_data.py 离线生成 data/search_keys.json，文件不存在时启动时现场生成）
+"""
+
+import os
+import re
+import json
+from array import array
+from bisect import bisect_left
+
+# 拼音联想键需要 pypinyin，未安装时只能按汉字前缀联想
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 每次最多返回的联想条数
+SUGGEST_LIMIT = 8
+
+# 重要性等级上限；朝代没有重要性，按最高等级排在前面
+MAX_IMPORTANCE = 5
+
+# 括号中的别名，例如 嬴政（秦始皇）
+ALIAS_PATTERN = re.compile(r'[（(]([^（）()]+)[）)]')
+
+
+def split_terms(text):
+    """拆分出主名称和括号中的别名：嬴政（秦始皇） -> ['嬴政', '秦始皇']"""
+    main = ALIAS_PATTERN.sub('', text).strip()
+    terms = [main] if main else []
+    terms.extend(alias.strip() for alias in ALIAS_PATTERN.findall(text) if alias.strip())
+    return terms
+
+
+def build_pinyin_keys(texts):
+    """为每个词（含括号中的别名）生成拼音全拼和首字母联想键，未安装 pypinyin 时返回 None"""
+    if lazy_pinyin is None:
+        return None
+
+    pinyin_keys = {}
+    for text in texts:
+        for term in split_terms(text):
+            if term not in pinyin_keys:
+                # 例如 秦始皇 -> ['qinshihuang', 'qsh']
+                pinyin_keys[term] = [''.join(lazy_pinyin(term)),
+                                     ''.join(lazy_pinyin(term, style=Style.FIRST_LETTER))]
+    return pinyin_keys
+
+
+def normalize(text):
+    """联想键统一为小写并去掉空白"""
+    return ''.join(text.lower().split())
+
+
+class SuggestIndex:
+    """按重要性分层的有序键数组，每层用二分查找定位前缀
+
+    同一层内按键的字典序返回，从最高重要性的层开始取，凑满 limit 条即停止，
+    因此单次查询只需要 (重要性等级数) 次二分查找加上最多 limit 条的顺序读取。
+    """
+
+    def __init__(self, entries, pinyin_keys=None):
+        """entries 为 (显示文本, 类型, 重要性) 序列；pinyin_keys 为 词 -> [全拼, 首字母] 的映射"""
+        pinyin_keys = pinyin_keys or {}
+
+        # 相同文本只保留一条，取最高重要性
+        importance_by_label = {}
+        for label, item_type, importance in entries:
+            current = importance_by_label.get(label)
+            if current is None or importance > current[1]:
+                importance_by_label[label] = (item_type, importance)
+
+        self.labels = list(importance_by_label)
+        self.types = [importance_by_label[label][0] for label in self.labels]
+
+        levels = {}
+        # 拼音键 -> 对应的中文词，同一拼音对应多个词时取重要性最高的（见 resolve）
+        pinyin_candidates = {}
+        for i, label in enumerate(self.labels):
+            level = min(max(int(importance_by_label[label][1]), 0), MAX_IMPORTANCE)
+            keys = {normalize(label)}
+            for term in split_terms(label):
+                keys.add(normalize(term))
+                for key in pinyin_keys.get(term, ()):
+                    key = normalize(key)
+                    keys.add(key)
+                    if key not in pinyin_candidates or level > pinyin_candidates[key][0]:
+                        pinyin_candidates[key] = (level, term)
+            level_keys, level_items = levels.setdefault(level, ([], array('i')))
+            for key in keys:
+                if key:
+                    level_keys.append(key)
+                    level_items.append(i)
+
+        # 从高到低排列的 (有序键, 对应条目) 数组，条目下标用紧凑的整数数组保存
+        self._levels = []
+        for level in sorted(levels, reverse=True):
+            level_keys, level_items = levels[level]
+            order = sorted(range(len(level_keys)), key=level_keys.__getitem__)
+            self._levels.append(([level_keys[j] for j in order], array('i', (level_items[j] for j in order))))
+        self._pinyin_terms = {key: term for key, (_, term) in pinyin_candidates.items()}
+
+    @classmethod
+    def from_store(cls, store, keys_path=None):
+        """从数据后端的事件、人物和朝代建立索引；keys_path 存在时载入拼音键，不存在时现场生成"""
+        def entries():
+            # 只读取显示文本和重要性，SQLite 后端逐行读取，不载入完整记录
+            for dynasty in store.dynasties:
+                yield dynasty['id'], 'dynasty', MAX_IMPORTANCE
+            yield from store.iter_labels()
+
+        pinyin_keys = None
+        if keys_path and os.path.exists(keys_path):
+            with open(keys_path, 'r', encoding='utf-8') as f:
+                pinyin_keys = json.load(f)
+        elif keys_path:
+            pinyin_keys = build_pinyin_keys(label for label, _, _ in entries())
+        return cls(entries(), pinyin_keys)
+
+    def resolve(self, text):
+        """把完整的拼音或首字母（如 qsh）换成对应的中文词（秦始皇），供时间轴按关键词筛选；
+        不是拼音键的输入原样返回"""
+        key = normalize(text or '')
+        if key and key.isascii():
+            return self._pinyin_terms.get(key, text)
+        return text
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        """返回以 prefix 开头的联想，按重要性从高到低排列"""
+        prefix = normalize(prefix or '')
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        for keys, items in self._levels:
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and keys[i].startswith(prefix):
+                item = items[i]
+                if item not in seen:
+                    seen.add(item)
+                    results.append({'label': self.labels[item], 'type': self.types[item]})
+                    if len(results) >= limit:
+                        return results
+                i += 1
+        return results
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+"""回调请求的准入控制：只跳过被更新请求取代的重绘，队列满或等待超时时返回 429，可见范围等回调不受限"""
+
+import os
+import json
+import time
+import shutil
+import threading
+import subprocess
+
+import pytest
+from werkzeug.test import Client
+
+from admission import DASH_UPDATE_PATH, AdmissionMiddleware, TokenBuckets
+from coalesce import SESSION_COOKIE
+
+EVENTS_OUTPUT = '..events-timeline.figure...events-timeline-state.data..'
+
+
+def update_body(output, value=None):
+    return json.dumps({'output': output, 'inputs': [{'id': 'view-range-store', 'property': 'data',
+                                                     'value': value}]}).encode('utf-8')
+
+
+class BlockingApp:
+    """记录收到的请求体，每个请求等到 release() 后才返回"""
+
+    def __init__(self):
+        self.started = []
+        self.gates = []
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        gate = threading.Event()
+        with self._lock:
+            self.started.append(json.loads(environ['wsgi.input'].read()))
+            self.gates.append(gate)
+        gate.wait(5)
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{}']
+
+    def wait_started(self, count):
+        deadline = time.monotonic() + 5
+        while len(self.started) < count:
+            assert time.monotonic() < deadline, '请求没有开始执行'
+            time.sleep(0.01)
+
+    def release(self, index):
+        self.gates[index].set()
+
+
+def post(client, body, session_id='s1'):
+    if session_id:
+        client.set_cookie(SESSION_COOKIE, session_id)
+    response = client.post(DASH_UPDATE_PATH, data=body, content_type='application/json')
+    status = response.status_code
+    response.close()
+    return status
+
+
+def post_in_thread(middleware, body, results, key, session_id='s1'):
+    thread = threading.Thread(target=lambda: results.__setitem__(key, post(Client(middleware), body, session_id)))
+    thread.start()
+    return thread
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_waiting_request_superseded_by_newer_one():
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1)
+    results = {}
+
+    first = post_in_thread(middleware, update_body(EVENTS_OUTPUT, [0, 100]), results, 'first')
+    backend.wait_started(1)
+    second = post_in_thread(middleware, update_body(EVENTS_OUTPUT, [0, 200]), results, 'second')
+    wait_for(lambda: len(middleware._queue) == 1)
+    third = post_in_thread(middleware, update_body(EVENTS_OUTPUT, [0, 300]), results, 'third')
+
+    # 第二个请求还在等待名额时已被第三个取代
+    second.join(5)
+    assert results['second'] == 204
+    backend.release(0)
+    first.join(5)
+    backend.wait_started(2)
+    backend.release(1)
+    third.join(5)
+
+    assert results == {'first': 200, 'second': 204, 'third': 200}
+    assert [request['inputs'][0]['value'] for request in backend.started] == [[0, 100], [0, 300]]
+    assert middleware.stats == {'admitted': 2, 'superseded': 1}
+    assert middleware._in_flight == 0
+
+
+def test_newer_request_keeps_queue_position():
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1)
+    results = {}
+
+    threads = [post_in_thread(middleware, update_body(EVENTS_OUTPUT, 'busy'), results, 'busy', 's0')]
+    backend.wait_started(1)
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT, 's1-old'), results, 's1-old', 's1'))
+    wait_for(lambda: len(middleware._queue) == 1)
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT, 's2'), results, 's2', 's2'))
+    wait_for(lambda: len(middleware._queue) == 2)
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT, 's1-new'), results, 's1-new', 's1'))
+    wait_for(lambda: results.get('s1-old') == 204)
+
+    # s1 的新请求排在 s2 之前，而不是队尾
+    for index in range(3):
+        backend.release(index)
+        backend.wait_started(min(index + 2, 3))
+    for thread in threads:
+        thread.join(5)
+    assert [request['inputs'][0]['value'] for request in backend.started] == ['busy', 's1-new', 's2']
+    assert results == {'busy': 200, 's1-old': 204, 's2': 200, 's1-new': 200}
+
+
+def test_full_queue_answers_429_immediately():
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1, max_queued=1)
+    results = {}
+
+    busy = post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'busy', 's0')
+    backend.wait_started(1)
+    queued = post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'queued', 's1')
+    wait_for(lambda: len(middleware._queue) == 1)
+
+    client = Client(middleware)
+    client.set_cookie(SESSION_COOKIE, 's2')
+    start = time.perf_counter()
+    response = client.post(DASH_UPDATE_PATH, data=update_body(EVENTS_OUTPUT), content_type='application/json')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert time.perf_counter() - start < 0.5
+
+    backend.release(0)
+    backend.wait_started(2)
+    backend.release(1)
+    for thread in (busy, queued):
+        thread.join(5)
+    assert results == {'busy': 200, 'queued': 200}
+    assert middleware.stats == {'admitted': 2, 'overloaded': 1}
+
+
+def test_rejected_requests_retry_in_order():
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1, max_queued=1)
+    results = {}
+
+    threads = [post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'busy', 's0')]
+    backend.wait_started(1)
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'queued', 's1'))
+    wait_for(lambda: len(middleware._queue) == 1)
+    assert post(Client(middleware), update_body(EVENTS_OUTPUT), 's2') == 429
+    assert post(Client(middleware), update_body(EVENTS_OUTPUT), 's3') == 429
+
+    # 队列空出一个位置后，先被拒绝的 s2 优先，s3 先到也要继续等
+    backend.release(0)
+    backend.wait_started(2)
+    assert post(Client(middleware), update_body(EVENTS_OUTPUT), 's3') == 429
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT, 's2'), results, 's2', 's2'))
+    wait_for(lambda: len(middleware._queue) == 1)
+    backend.release(1)
+    backend.wait_started(3)
+    assert backend.started[2]['inputs'][0]['value'] == 's2'
+    backend.release(2)
+    for thread in threads:
+        thread.join(5)
+    assert results == {'busy': 200, 'queued': 200, 's2': 200}
+
+
+def test_wait_longer_than_limit_answers_429():
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1, max_wait=0.2)
+    results = {}
+
+    busy = post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'busy', 's0')
+    backend.wait_started(1)
+    start = time.perf_counter()
+    assert post(Client(middleware), update_body(EVENTS_OUTPUT), 's1') == 429
+    assert 0.2 <= time.perf_counter() - start < 1
+    assert not middleware._queue
+
+    backend.release(0)
+    busy.join(5)
+    assert middleware._in_flight == 0
+
+
+def test_session_without_tokens_does_not_block_queue():
+    def backend(environ, start_response):
+        start_response('200 OK', [])
+        return [b'{}']
+
+    middleware = AdmissionMiddleware(backend, max_wait=5, buckets=TokenBuckets(rate=1, burst=1))
+    results = {}
+    assert post(Client(middleware), update_body(EVENTS_OUTPUT), 's1') == 200
+
+    # s1 的令牌已用完，在队列中等待补充；后到的 s2 不必等它
+    waiting = post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 's1', 's1')
+    wait_for(lambda: len(middleware._queue) == 1)
+    start = time.perf_counter()
+    assert post(Client(middleware), update_body(EVENTS_OUTPUT), 's2') == 200
+    assert time.perf_counter() - start < 0.3
+    waiting.join(5)
+    assert results == {'s1': 200}
+
+
+def test_other_sessions_and_cookieless_requests_are_not_superseded():
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1)
+    results = {}
+
+    threads = [post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'first')]
+    backend.wait_started(1)
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'other', 's2'))
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'anonymous', None))
+    threads.append(post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'anonymous2', None))
+    for index in range(4):
+        backend.wait_started(index + 1)
+        backend.release(index)
+    for thread in threads:
+        thread.join(5)
+    assert set(results.values()) == {200}
+
+
+@pytest.mark.parametrize('output', ['view-range-store.data', '..dynasty-timeline.figure...dynasty-timeline-state.data..',
+                                    '..detail-content.children...selected-item-store.data..'])
+def test_cheap_callbacks_bypass_limits(output):
+    backend = BlockingApp()
+    middleware = AdmissionMiddleware(backend, max_in_flight=1, buckets=TokenBuckets(rate=0.01, burst=1))
+    results = {}
+
+    # 时间轴重绘占满名额时，其余回调照常执行，也不消耗令牌
+    busy = post_in_thread(middleware, update_body(EVENTS_OUTPUT), results, 'busy')
+    backend.wait_started(1)
+    threads = [post_in_thread(middleware, update_body(output, i), results, i) for i in range(5)]
+    backend.wait_started(6)
+    for index in range(6):
+        backend.release(index)
+    for thread in threads + [busy]:
+        thread.join(5)
+    assert set(results.values()) == {200}
+
+
+def test_rate_limit_delays_instead_of_dropping():
+    def backend(environ, start_response):
+        start_response('200 OK', [])
+        return [b'{}']
+
+    middleware = AdmissionMiddleware(backend, buckets=TokenBuckets(rate=20, burst=2))
+    client = Client(middleware)
+    start = time.perf_counter()
+    statuses = [post(client, update_body(EVENTS_OUTPUT, i)) for i in range(6)]
+    elapsed = time.perf_counter() - start
+
+    # 超出桶容量的 4 个请求各等待约 1/20 秒，全部执行
+    assert statuses == [200] * 6
+    assert elapsed >= 0.15
+
+
+def test_burst_of_zooms_through_app_ends_on_latest_state():
+    import app as timeline_app
+
+    flask_app = timeline_app.admission.app if timeline_app.admission else timeline_app.server.wsgi_app
+    middleware = AdmissionMiddleware(flask_app, buckets=TokenBuckets(rate=50, burst=2))
+    client = Client(middleware)
+    client.set_cookie(SESSION_COOKIE, 'zoom')
+
+    spec = timeline_app.app.callback_map[EVENTS_OUTPUT]
+    defaults = {'view-range-store.data': None, 'search-input.value': '', 'event-category-filter.value': 'all',
+                'importance-filter.value': 1, 'display-options.value': ['dynasties', 'events', 'figures']}
+
+    last = None
+    for end in range(-360, 40, 20):
+        defaults['view-range-store.data'] = [-600, end]
+        body = {
+            'output': EVENTS_OUTPUT,
+            'outputs': [{'id': 'events-timeline', 'property': 'figure'},
+                        {'id': 'events-timeline-state', 'property': 'data'}],
+            'inputs': [{'id': item['id'], 'property': item['property'],
+                        'value': defaults[f"{item['id']}.{item['property']}"]} for item in spec['inputs']],
+            'changedPropIds': ['view-range-store.data'],
+            'state': [{'id': 'events-timeline-state', 'property': 'data', 'value': None}],
+        }
+        response = client.post(DASH_UPDATE_PATH, json=body)
+        assert response.status_code == 200
+        last = response.json
+        response.close()
+
+    # 超出会话速率的缩放依次等待执行，最后显示的是最后一次缩放的范围
+    assert last['response']['events-timeline-state']['data'][1] == [-600, 20]
+
+
+# 在 node 中加载 assets/admission.js，假的 fetch 记录发送的请求，由脚本逐个给出响应
+NODE_CLIENT_SCRIPT = """
+globalThis.window = globalThis;
+const calls = [];
+const replies = [];
+globalThis.fetch = (url, init) => {
+    calls.push(JSON.parse(init.body).inputs);
+    return new Promise(resolve => replies.push(resolve));
+};
+require(process.argv[1]);
+const busy = () => new Response(null, {status: 429, headers: {'Retry-After': '0.01'}});
+const ok = () => new Response('{}', {status: 200});
+const tick = () => new Promise(resolve => setTimeout(resolve, 30));
+const request = value => fetch('/_dash-update-component',
+    {method: 'POST', body: JSON.stringify({output: '..events-timeline.figure...events-timeline-state.data..', inputs: value})});
+(async () => {
+    const statuses = [];
+    const first = request(1);
+    replies.shift()(busy());
+    await tick();
+    replies.shift()(ok());
+    statuses.push((await first).status);
+
+    const second = request(2), third = request(3), fourth = request(4);
+    statuses.push((await third).status);
+    replies.shift()(ok());
+    statuses.push((await second).status);
+    await tick();
+
+    const fifth = request(5);
+    replies.shift()(busy());
+    statuses.push((await fourth).status);
+    await tick();
+    replies.shift()(ok());
+    statuses.push((await fifth).status);
+    console.log(JSON.stringify({statuses, calls}));
+})();
+"""
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node')
+def test_client_sends_one_request_per_timeline():
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'admission.js')
+    proc = subprocess.run(['node', '-e', NODE_CLIENT_SCRIPT, script], capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout)
+
+    # 1 收到 429 后重试；2 发送期间 3 被 4 取代，不发送；4 收到 429 时已有 5，不再重试
+    assert result['calls'] == [1, 1, 2, 4, 5]
+    assert result['statuses'] == [200, 204, 200, 204, 200]
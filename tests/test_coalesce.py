@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+"""回调请求合并：会话识别和记录清除"""
+
+import pytest
+from flask import Flask
+from dash.exceptions import PreventUpdate
+
+from coalesce import SESSION_COOKIE, CallbackCoalescer
+
+
+@pytest.fixture
+def flask_app():
+    return Flask(__name__)
+
+
+def test_requests_without_cookie_are_not_coalesced(flask_app):
+    coalescer = CallbackCoalescer()
+    # 同一代理地址后的两个客户端不能互相取消
+    with flask_app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        first = coalescer.begin('update_events_timeline')
+        second = coalescer.begin('update_events_timeline')
+        assert first is None and second is None
+        coalescer.check(first)
+        coalescer.finish(first)
+
+
+def test_newer_request_supersedes_older(flask_app):
+    coalescer = CallbackCoalescer()
+    headers = {'Cookie': f'{SESSION_COOKIE}=abc'}
+    with flask_app.test_request_context(headers=headers):
+        first = coalescer.begin('update_events_timeline')
+        second = coalescer.begin('update_events_timeline')
+        with pytest.raises(PreventUpdate):
+            coalescer.check(first)
+        coalescer.check(second)
+        coalescer.finish(second)
+    assert coalescer.stats['dropped'] == 1
+
+
+def test_track_clears_entry_when_callback_raises(flask_app):
+    coalescer = CallbackCoalescer()
+    headers = {'Cookie': f'{SESSION_COOKIE}=abc'}
+    with flask_app.test_request_context(headers=headers):
+        with pytest.raises(RuntimeError):
+            with coalescer.track('update_events_timeline'):
+                raise RuntimeError('查询失败')
+        with pytest.raises(PreventUpdate):
+            with coalescer.track('update_figures_timeline'):
+                raise PreventUpdate
+    assert coalescer._latest == {}
+    assert coalescer.stats['completed'] == 0
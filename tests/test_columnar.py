@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+"""列式二进制编码：Python 和浏览器端解码都还原为与 JSON 相同的记录，接口返回筛选后的结果"""
+
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from columnar import encode_tables, decode_tables
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data_dir = os.path.join(root_dir, 'data')
+shard_dir = os.path.join(root_dir, 'static_version', 'shards')
+
+# 在 node 中解码一个二进制分片，输出 JSON
+NODE_DECODE_SCRIPT = """
+const {decodeColumnar} = require(process.argv[1]);
+const data = require('fs').readFileSync(process.argv[2]);
+console.log(JSON.stringify(decodeColumnar(data.buffer.slice(data.byteOffset, data.byteOffset + data.length))));
+"""
+
+
+@pytest.fixture(scope='module')
+def sample():
+    with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+    return app.server.test_client()
+
+
+def test_round_trip(sample):
+    tables = {'events': sample['events'], 'figures': sample['figures']}
+    assert decode_tables(encode_tables(tables)) == tables
+
+
+def test_nulls_and_astral_characters():
+    event = {'id': 'event_1', 'year': -221, 'title': '𠀀统一', 'description': None, 'dynasty': None,
+             'importance': 5, 'category': '政治', 'image_url': None, 'dynasty_ids': [], 'type': 'event'}
+    assert decode_tables(encode_tables({'events': [event]})) == {'events': [event]}
+
+
+def test_shards_have_matching_binary():
+    with open(os.path.join(shard_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for info in manifest['shards']:
+        with open(os.path.join(shard_dir, info['file']), 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        with open(os.path.join(shard_dir, info['binary']), 'rb') as f:
+            assert decode_tables(f.read()) == shard
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要 node')
+def test_browser_decoder_matches_json():
+    with open(os.path.join(shard_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+        info = max(json.load(f)['shards'], key=lambda shard: os.path.getsize(os.path.join(shard_dir, shard['file'])))
+    with open(os.path.join(shard_dir, info['file']), 'r', encoding='utf-8') as f:
+        shard = json.load(f)
+
+    proc = subprocess.run(['node', '-e', NODE_DECODE_SCRIPT, os.path.join(root_dir, 'static_version', 'columnar.js'),
+                           os.path.join(shard_dir, info['binary'])], capture_output=True, text=True, check=True)
+    assert json.loads(proc.stdout) == shard
+
+
+def test_endpoint_returns_filtered_view(client):
+    import app
+
+    response = client.get('/api/timeline.bin?start=-500&end=0&importance=4')
+    assert response.status_code == 200
+    assert response.headers['Access-Control-Allow-Origin'] == '*'
+    decoded = decode_tables(response.data)
+
+    def as_dicts(records):
+        return [dict(record.to_dict(), dynasty_ids=list(record.dynasty_ids)) for record in records]
+
+    assert decoded['events'] == as_dicts(app.store.query_events([-500, 0], None, None, 4))
+    assert decoded['figures'] == as_dicts(app.store.query_figures([-500, 0], None, 4))
+    assert decoded['events']
+
+
+def test_endpoint_rejects_invalid_range(client):
+    assert client.get('/api/timeline.bin?start=100&end=0').status_code == 400
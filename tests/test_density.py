@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+"""密度前缀和：随仓库发布的 data/density.npz 与数据一致"""
+
+import os
+import json
+
+import numpy as np
+
+from density import build_density_arrays
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+def test_committed_density_arrays_are_current():
+    # 部署时不运行 process_data.py，数据更新后需重新生成并提交 density.npz
+    with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+        timeline_data = json.load(f)
+    expected = build_density_arrays(timeline_data['events'], timeline_data['figures'], timeline_data['time_range'])
+    with np.load(os.path.join(data_dir, 'density.npz')) as arrays:
+        assert set(arrays.files) == set(expected)
+        for key in arrays.files:
+            np.testing.assert_array_equal(arrays[key], expected[key])
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""导出接口：各格式的内容，以及流式导出的内存占用与结果条数无关"""
+
+import io
+import os
+import csv
+import json
+import itertools
+import tracemalloc
+
+import pytest
+
+import process_data
+from export import COLUMNS, format_available
+from storage import SqliteStore
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+# 内存测试的两种规模：结果条数相差 8 倍，内存峰值不应随之增长
+SMALL_ROWS = 2000
+LARGE_ROWS = 16000
+MAX_PEAK_MB = 4
+
+
+@pytest.fixture(scope='module')
+def timeline_app():
+    import app
+    return app
+
+
+@pytest.fixture(scope='module')
+def sample():
+    with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope='module')
+def sized_stores(sample, tmp_path_factory):
+    """以真实事件为模板、编号递增的两个 SQLite 数据库（生成器写入，不在内存中保留全部记录）"""
+    stores = {}
+    for rows in (SMALL_ROWS, LARGE_ROWS):
+        events = ({**event, 'id': f'event_{i}'}
+                  for i, event in zip(range(rows), itertools.cycle(sample['events'])))
+        db_path = str(tmp_path_factory.mktemp('export') / 'timeline.db')
+        process_data.save_sqlite_database({'dynasties': sample['dynasties'], 'events': events,
+                                           'figures': sample['figures'], 'time_range': sample['time_range']},
+                                          db_path)
+        stores[rows] = SqliteStore(db_path)
+    return stores
+
+
+def export_peak(client, export_format):
+    """下载一次导出，返回 (内容字节数, Python 内存分配峰值)"""
+    tracemalloc.start()
+    try:
+        response = client.get('/api/export', query_string={'format': export_format}, buffered=False)
+        total_bytes = sum(len(chunk) for chunk in response.response)
+        response.close()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return total_bytes, peak
+
+
+def download(client, **params):
+    response = client.get('/api/export', query_string=params)
+    assert response.status_code == 200, response.data
+    return response
+
+
+def test_csv_export_matches_filters(timeline_app, sample):
+    client = timeline_app.server.test_client()
+    response = download(client, format='csv', start=-500, end=0, category='军事')
+    rows = list(csv.reader(io.StringIO(response.data.decode('utf-8-sig'))))
+
+    assert rows[0] == [header for _, header in COLUMNS]
+    expected_events = [event['id'] for event in sample['events']
+                       if -500 <= event['year'] <= 0 and event['category'] == '军事']
+    assert [row[1] for row in rows[1:] if row[0] == 'event'] == expected_events
+
+
+def test_ndjson_export(timeline_app, sample):
+    client = timeline_app.server.test_client()
+    lines = download(client, format='ndjson').data.decode('utf-8').splitlines()
+    records = [json.loads(line) for line in lines]
+    assert len(records) == len(sample['events']) + len(sample['figures'])
+    assert set(records[0]) == {key for key, _ in COLUMNS}
+
+
+def test_xlsx_export(timeline_app, sample):
+    pytest.importorskip('xlsxwriter')
+    assert format_available('xlsx')
+    client = timeline_app.server.test_client()
+    response = download(client, format='xlsx')
+    assert response.headers['Content-Disposition'].endswith('.xlsx')
+
+    # xlsx 是 zip 包，工作表中每条记录占一行
+    import zipfile
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert sheet.count('<row ') == 1 + len(sample['events']) + len(sample['figures'])
+
+
+def test_invalid_arguments(timeline_app):
+    client = timeline_app.server.test_client()
+    assert client.get('/api/export?format=pdf').status_code == 400
+    assert client.get('/api/export?start=abc&end=0').status_code == 400
+    # 起始年份晚于结束年份：在开始发送内容之前就拒绝
+    assert client.get('/api/export?format=csv&start=100&end=0&category=foo').status_code == 400
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'ndjson', 'xlsx'])
+def test_streaming_export_memory_is_bounded(timeline_app, sized_stores, monkeypatch, export_format):
+    if not format_available(export_format):
+        pytest.skip('缺少 xlsxwriter')
+    client = timeline_app.server.test_client()
+
+    results = {}
+    for rows, store in sized_stores.items():
+        monkeypatch.setattr(timeline_app, 'store', store)
+        results[rows] = export_peak(client, export_format)
+
+    (small_bytes, small_peak), (large_bytes, large_peak) = results[SMALL_ROWS], results[LARGE_ROWS]
+    assert large_bytes > 4 * small_bytes
+    message = f"{SMALL_ROWS} 条峰值 {small_peak / 2**20:.2f}MB，{LARGE_ROWS} 条峰值 {large_peak / 2**20:.2f}MB"
+    assert large_peak < small_peak * 1.25 + 256 * 1024, message
+    assert large_peak < MAX_PEAK_MB * 2**20, message
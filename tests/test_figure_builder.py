@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""图表字典与 go.Figure 的输出一致，以及序列化模块的预先加载"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+import plotly.io as pio
+import plotly.graph_objects as go
+
+import figure_builder
+from storage import load_store
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+@pytest.fixture(scope='module')
+def store():
+    return load_store(data_dir, 'json')
+
+
+def roundtrip(fig):
+    return json.loads(pio.to_json(fig, validate=False))
+
+
+@pytest.mark.parametrize('threshold', [figure_builder.WEBGL_THRESHOLD, 0], ids=['svg', 'webgl'])
+def test_figures_match_graph_objects(store, monkeypatch, threshold):
+    # go.Figure 会逐属性校验并补全默认值，结果必须与直接生成的字典完全一致
+    monkeypatch.setattr(figure_builder, 'WEBGL_THRESHOLD', threshold)
+    full_range = [store.time_range['min_year'], store.time_range['max_year']]
+    for fig in (
+        figure_builder.build_dynasty_figure(store.dynasties, full_range, [-500, 300]),
+        figure_builder.build_events_figure(store.query_events(), full_range),
+        figure_builder.build_figures_figure(store.query_figures(), full_range),
+        figure_builder.build_events_figure([], full_range),
+        figure_builder.build_figures_figure([], full_range),
+    ):
+        assert roundtrip(go.Figure(fig)) == roundtrip(fig)
+
+
+def test_concurrent_first_serialization():
+    # 新进程中多个线程同时第一次序列化，不能拿到未初始化完成的 orjson 模块
+    script = '''
+import threading
+from plotly.io.json import to_json_plotly
+import figure_builder
+
+errors = []
+barrier = threading.Barrier(8)
+
+def serialize():
+    barrier.wait()
+    try:
+        to_json_plotly({'data': [{'x': [1, 2], 'y': [3, 4]}]})
+    except Exception as error:
+        errors.append(repr(error))
+
+threads = [threading.Thread(target=serialize) for _ in range(8)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert not errors, errors
+'''
+    repo_dir = os.path.dirname(data_dir)
+    result = subprocess.run([sys.executable, '-c', script], cwd=repo_dir, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""详情面板图片：预取回调只在有缩略图清单时注册"""
+
+import pytest
+
+from images import DETAIL_IMAGE_SIZES, IMAGE_ROUTE
+
+
+@pytest.fixture(scope='module')
+def timeline_app():
+    import app
+    return app
+
+
+def test_prefetch_callback_registered_only_with_manifest(timeline_app):
+    registered = any('image-prefetch.children' in key for key in timeline_app.app.callback_map)
+    assert registered == bool(timeline_app.image_manifest)
+
+
+def test_prefetch_picks_most_important_images(timeline_app, monkeypatch):
+    events = [event for event in timeline_app.store.query_events() if event['image_url']]
+    event = max(events, key=lambda item: item['importance'])
+    entry = {'width': 800, 'height': 600, 'variants': [
+        {'width': 160, 'height': 120, 'webp': 'a-1-160.webp', 'jpeg': 'a-1-160.jpg'},
+        {'width': 320, 'height': 240, 'webp': 'a-1-320.webp', 'jpeg': 'a-1-320.jpg'},
+    ]}
+    monkeypatch.setattr(timeline_app, 'image_manifest', {event['image_url']: entry})
+
+    spans = timeline_app.update_image_prefetch(None, None, None, None, ['events'])
+    assert len(spans) == 1
+    attributes = spans[0].to_plotly_json()['props']
+    assert attributes['data-src'] == IMAGE_ROUTE + 'a-1-320.jpg'
+    assert attributes['data-sizes'] == DETAIL_IMAGE_SIZES
+
+
+def test_prefetch_stops_reading_once_limit_reached(timeline_app, monkeypatch):
+    from images import PREFETCH_LIMIT
+
+    read = []
+
+    class CountingStore:
+        def iter_events(self, year_range, search_term, category, min_importance):
+            for index in range(1000):
+                read.append(index)
+                yield {'importance': 5, 'image_url': f'img-{index}'}
+
+    entry = {'width': 320, 'height': 240,
+             'variants': [{'width': 320, 'height': 240, 'webp': 'a.webp', 'jpeg': 'a.jpg'}]}
+    monkeypatch.setattr(timeline_app, 'store', CountingStore())
+    monkeypatch.setattr(timeline_app, 'image_manifest', {f'img-{index}': entry for index in range(1000)})
+
+    spans = timeline_app.update_image_prefetch(None, None, None, None, ['events'])
+    assert len(spans) == PREFETCH_LIMIT
+    assert len(read) == PREFETCH_LIMIT
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+"""数据后端的筛选：边界条件"""
+
+import os
+
+import pytest
+
+from storage import load_store
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+@pytest.fixture(scope='module')
+def store():
+    return load_store(data_dir, 'json')
+
+
+@pytest.mark.parametrize('category, min_importance', [('foo', None), ('军事', 3), ('all', 9), (None, None)])
+def test_reversed_year_range_is_empty(store, category, min_importance):
+    assert store.query_events([100, 0], None, category, min_importance) == []
+    assert list(store.iter_events([100, 0], None, category, min_importance)) == []
+    assert store.query_figures([2000, -2000], None, min_importance) == []
+
+
+def test_unknown_category_is_empty(store):
+    assert store.query_events([-3000, 2000], None, 'foo') == []
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""搜索联想：拼音键的生成和 /api/suggest 的拼音查询"""
+
+import os
+import json
+
+import pytest
+
+pytest.importorskip('pypinyin')
+
+import process_data
+from suggest import SuggestIndex
+from storage import load_store
+
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+@pytest.fixture(scope='module')
+def timeline_data():
+    with open(os.path.join(data_dir, 'timeline_data.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_create_search_keys_covers_aliases(timeline_data):
+    search_keys = process_data.create_search_keys(timeline_data)
+    assert search_keys['秦始皇'] == ['qinshihuang', 'qsh']
+    assert search_keys['孔子'] == ['kongzi', 'kz']
+
+
+def test_committed_search_keys_are_current(timeline_data):
+    # data/search_keys.json 随仓库发布，数据更新后需重新运行 process_data.py
+    with open(os.path.join(data_dir, 'search_keys.json'), 'r', encoding='utf-8') as f:
+        assert json.load(f) == process_data.create_search_keys(timeline_data)
+
+
+def test_keys_built_at_startup_when_file_missing(tmp_path):
+    store = load_store(data_dir, 'json')
+    index = SuggestIndex.from_store(store, str(tmp_path / 'search_keys.json'))
+    assert {'label': '嬴政（秦始皇）', 'type': 'figure'} in index.suggest('qsh')
+
+
+def test_api_suggest_pinyin_query():
+    import app as timeline_app
+    client = timeline_app.server.test_client()
+
+    response = client.get('/api/suggest', query_string={'q': 'qsh'})
+    assert response.status_code == 200
+    assert response.json[0] == {'label': '嬴政（秦始皇）', 'type': 'figure'}
+
+    labels = [item['label'] for item in client.get('/api/suggest', query_string={'q': 'kongzi'}).json]
+    assert '孔子' in labels
+
+
+def test_resolve_maps_pinyin_to_terms(timeline_data):
+    store = load_store(data_dir, 'json')
+    index = SuggestIndex.from_store(store, os.path.join(data_dir, 'search_keys.json'))
+    assert index.resolve('qsh') == '秦始皇'
+    assert index.resolve('KongZi') == '孔子'
+    # 中文关键词和不是拼音键的输入原样返回
+    assert index.resolve('秦') == '秦'
+    assert index.resolve('xyz') == 'xyz'
+
+
+def test_pinyin_search_filters_timelines():
+    import app as timeline_app
+
+    # 搜索框输入 qsh 后时间轴按“秦始皇”筛选，而不是清空
+    events = timeline_app.store.query_events(None, timeline_app.search_keyword('qsh'))
+    assert events and all('秦始皇' in event['title'] + event['description'] + event['dynasty'] for event in events)
+    assert timeline_app.store.query_figures(None, timeline_app.search_keyword('qsh'))
+
+
+def test_from_store_reads_only_labels_from_sqlite(timeline_data, tmp_path, monkeypatch):
+    from storage import SqliteStore
+
+    db_path = str(tmp_path / 'timeline.db')
+    process_data.save_sqlite_database(timeline_data, db_path)
+    store = SqliteStore(db_path)
+
+    def full_records(*args, **kwargs):
+        raise AssertionError('不应载入完整记录')
+    monkeypatch.setattr(store, 'query_events', full_records)
+    monkeypatch.setattr(store, 'query_figures', full_records)
+
+    index = SuggestIndex.from_store(store, os.path.join(data_dir, 'search_keys.json'))
+    assert {'label': '嬴政（秦始皇）', 'type': 'figure'} in index.suggest('qsh')
+    assert len(index.labels) == len({dynasty['id'] for dynasty in timeline_data['dynasties']} |
+                                    {event['title'] for event in timeline_data['events']} |
+                                    {figure['name'] for figure in timeline_data['figures']})